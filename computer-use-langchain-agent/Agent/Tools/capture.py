@@ -0,0 +1,207 @@
+"""
+Screen capture backends.
+
+A backend grabs the primary display into a Frame. Frames keep the buffer the
+backend produced and only convert it to a PIL image when it is first needed,
+which for a raw buffer backend is when the screenshot is encoded.
+"""
+
+import os
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from dataclasses import dataclass, field
+from typing import ClassVar
+
+from PIL import Image, ImageDraw
+
+from .base import ToolError
+
+try:
+    import pyautogui
+except Exception:  # pyautogui needs a display to import on Linux
+    pyautogui = None
+
+try:
+    import mss
+except ImportError:
+    mss = None
+
+# overrides the backend picked by default_backend_name
+BACKEND_ENV_VAR = "COMPUTER_USE_CAPTURE_BACKEND"
+
+SYNTHETIC_SIZE = (1920, 1080)
+
+
+@dataclass
+class Frame:
+    """A captured frame, as the raw buffer of the backend that captured it."""
+
+    data: bytes
+    size: tuple[int, int]
+    # the PIL raw decoder mode of `data`, e.g. "BGRX" for 32 bit Windows bitmaps
+    raw_mode: str = "RGB"
+    _image: Image.Image | None = field(default=None, repr=False)
+
+    @classmethod
+    def from_image(cls, image: Image.Image) -> "Frame":
+        image = image.convert("RGB")
+        return cls(data=b"", size=image.size, _image=image)
+
+    def image(self) -> Image.Image:
+        """The frame as an RGB image, converted from the raw buffer on first use."""
+        if self._image is None:
+            self._image = Image.frombuffer(
+                "RGB", self.size, self.data, "raw", self.raw_mode, 0, 1
+            )
+        return self._image
+
+
+@dataclass
+class CaptureStats:
+    """Latency of the captures made by one backend."""
+
+    captures: int = 0
+    total_seconds: float = 0.0
+    fastest: float = float("inf")
+    slowest: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total_seconds / self.captures if self.captures else 0.0
+
+    def record(self, seconds: float):
+        self.captures += 1
+        self.total_seconds += seconds
+        self.fastest = min(self.fastest, seconds)
+        self.slowest = max(self.slowest, seconds)
+
+
+class CaptureBackend(metaclass=ABCMeta):
+    """Grabs the primary display. Captures block, so call them from a worker thread."""
+
+    name: ClassVar[str]
+
+    def __init__(self):
+        self.stats = CaptureStats()
+        self._stats_lock = threading.Lock()
+
+    @abstractmethod
+    def size(self) -> tuple[int, int]:
+        """Width and height of the display in pixels."""
+        ...
+
+    @abstractmethod
+    def _grab(self) -> Frame: ...
+
+    def capture(self) -> Frame:
+        """Grab the display, recording how long it took in `stats`."""
+        start = time.perf_counter()
+        frame = self._grab()
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.stats.record(elapsed)
+        return frame
+
+
+class PyAutoGuiBackend(CaptureBackend):
+    """Full screen grabs through pyautogui, which returns a converted PIL image."""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        if pyautogui is None:
+            raise ToolError("pyautogui is not available to capture the screen")
+        super().__init__()
+
+    def size(self) -> tuple[int, int]:
+        width, height = pyautogui.size()
+        return width, height
+
+    def _grab(self) -> Frame:
+        return Frame.from_image(pyautogui.screenshot())
+
+
+class MssBackend(CaptureBackend):
+    """
+    Raw BGRA grabs through mss. The buffer is kept as it is until the frame is
+    encoded, instead of being converted to an image on every capture.
+    """
+
+    name = "mss"
+
+    def __init__(self):
+        if mss is None:
+            raise ToolError("mss is not installed, run `pip install mss`")
+        super().__init__()
+        # mss instances hold per-thread device contexts
+        self._local = threading.local()
+
+    def _screen(self):
+        if not hasattr(self._local, "screen"):
+            self._local.screen = mss.mss()
+        return self._local.screen
+
+    def size(self) -> tuple[int, int]:
+        monitor = self._screen().monitors[1]
+        return monitor["width"], monitor["height"]
+
+    def _grab(self) -> Frame:
+        screen = self._screen()
+        shot = screen.grab(screen.monitors[1])
+        return Frame(data=bytes(shot.raw), size=shot.size, raw_mode="BGRX")
+
+
+class SyntheticBackend(CaptureBackend):
+    """
+    A deterministic in-memory framebuffer showing a plain desktop, for running
+    without a display.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, size: tuple[int, int] = SYNTHETIC_SIZE):
+        super().__init__()
+        self._size = size
+        self.framebuffer = Image.linear_gradient("L").resize(size).convert("RGB")
+        width, height = size
+        ImageDraw.Draw(self.framebuffer).rectangle(
+            (0, height - height // 20, width, height), fill=(32, 32, 40)
+        )
+
+    def size(self) -> tuple[int, int]:
+        return self._size
+
+    def _grab(self) -> Frame:
+        return Frame(data=self.framebuffer.tobytes(), size=self._size)
+
+
+CAPTURE_BACKENDS: dict[str, type[CaptureBackend]] = {
+    backend.name: backend for backend in (PyAutoGuiBackend, MssBackend, SyntheticBackend)
+}
+
+_backends: dict[str, CaptureBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def default_backend_name() -> str:
+    """The backend named by COMPUTER_USE_CAPTURE_BACKEND, else mss if installed."""
+    if name := os.environ.get(BACKEND_ENV_VAR):
+        return name
+    return MssBackend.name if mss is not None else PyAutoGuiBackend.name
+
+
+def get_capture_backend(name: str | None = None) -> CaptureBackend:
+    """
+    The process-wide instance of the named backend, so that its latency stats cover
+    every tool that captured with it.
+    """
+    name = name or default_backend_name()
+    if name not in CAPTURE_BACKENDS:
+        raise ToolError(
+            f"Unknown capture backend {name}, expected one of {', '.join(CAPTURE_BACKENDS)}"
+        )
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = CAPTURE_BACKENDS[name]()
+        return _backends[name]
@@ -1,15 +1,15 @@
 import base64
 import io
 from enum import StrEnum
-from typing import Literal, TypedDict, Optional
+from typing import Any, Literal, TypedDict, Optional
 from uuid import uuid4
 
 import pyautogui
-from PIL import ImageGrab
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 
 from .base import ToolResult
+from .capture import get_capture_backend
 
 Action = Literal[
     "key",
@@ -45,11 +45,15 @@ class ComputerTool(BaseTool):
     screen_width: int = Field(default=0)
     screen_height: int = Field(default=0)
     screenshot_delay: float = Field(default=0.5)
+    # a CaptureBackend from .capture, the process-wide default one if not given
+    capture_backend: Any = Field(default=None, exclude=True)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        if self.capture_backend is None:
+            self.capture_backend = get_capture_backend()
         # Get screen resolution
-        self.screen_width, self.screen_height = pyautogui.size()
+        self.screen_width, self.screen_height = self.capture_backend.size()
 
     def _run(self, action: Action, text: Optional[str] = None, coordinate: Optional[tuple[int, int]] = None) -> ToolResult:
         try:
@@ -128,10 +132,10 @@ class ComputerTool(BaseTool):
         return self._run(action, text, coordinate)
 
     def take_screenshot(self) -> ToolResult:
-        """Take a screenshot using PIL's ImageGrab."""
+        """Take a screenshot using the capture backend."""
         try:
-            # Capture the screen
-            screenshot = ImageGrab.grab()
+            # Capture the screen, raw buffers are converted to an image only here
+            screenshot = self.capture_backend.capture().image()
             
             # Convert to base64
             img_byte_arr = io.BytesIO()
@@ -0,0 +1,46 @@
+"""
+Capture latency of each screen capture backend on this machine.
+
+Backends that cannot run here, e.g. mss when it is not installed or pyautogui
+without a display, are reported as unavailable. Set COMPUTER_USE_CAPTURE_BACKEND
+to the fastest one for the deployment.
+
+Run from the computer-use-windows-streamlit directory:
+    python -m benchmarks.capture_backends
+"""
+
+import time
+
+from computer_use.tools.capture import CAPTURE_BACKENDS, CaptureStats
+from computer_use.tools.encoding import encode_png
+
+CAPTURES = 20
+
+
+def main():
+    print(f"{'backend':<12}{'size':>12}{'capture':>12}{'slowest':>12}{'+ encode':>12}")
+    for name, backend_class in CAPTURE_BACKENDS.items():
+        try:
+            backend = backend_class()
+            width, height = backend.size()
+            backend.capture()
+        except Exception as e:
+            print(f"{name:<12}  unavailable: {e}")
+            continue
+        # leave the first capture, which opens the device, out of the stats
+        backend.stats = CaptureStats()
+        encode = 0.0
+        for _ in range(CAPTURES):
+            frame = backend.capture()
+            start = time.perf_counter()
+            encode_png(frame.image())
+            encode += time.perf_counter() - start
+        stats = backend.stats
+        print(
+            f"{name:<12}{f'{width}x{height}':>12}{stats.mean * 1000:>10.1f}ms"
+            f"{stats.slowest * 1000:>10.1f}ms{(stats.mean + encode / CAPTURES) * 1000:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Bytes and image tokens sent for scripted UI changes, with full screenshots and
+with delta screenshots, which crop small changes and send unchanged screens as text.
+
+The sequences run on the synthetic backend, so they measure what each mode sends
+rather than capture speed. Image tokens are estimated as width * height / 750.
+
+Run from the computer-use-windows-streamlit directory:
+    python -m benchmarks.delta_screenshots
+"""
+
+import asyncio
+import base64
+import io
+
+from PIL import Image
+
+from computer_use.tools.capture import SyntheticBackend
+from computer_use.tools.computer import ComputerTool
+
+Box = tuple[int, int, int, int]
+
+# each step paints these boxes, then takes a screenshot
+SEQUENCES: dict[str, list[list[Box]]] = {
+    "checkbox toggle": [[(400, 300, 416, 316)] for _ in range(6)],
+    "typing": [[(300, 500, 300 + 12 * (i + 1), 520)] for i in range(8)],
+    "dialog open": [[(460, 240, 1460, 840)], [(900, 780, 1000, 810)]],
+    "unchanged": [[] for _ in range(4)],
+}
+
+COLOURS = [(0, 120, 215), (240, 240, 240)]
+
+
+def image_tokens(base64_image: str) -> int:
+    with Image.open(io.BytesIO(base64.b64decode(base64_image))) as image:
+        return image.width * image.height // 750
+
+
+async def run(steps: list[list[Box]], delta: bool) -> tuple[int, int]:
+    """Bytes and image tokens sent for the screenshots after the first one."""
+    desktop = SyntheticBackend()
+    tool = ComputerTool(capture_backend=desktop, delta_screenshots=delta)
+    tool._settle_window = 0
+    await tool.screenshot()
+    sent = tokens = 0
+    for i, boxes in enumerate(steps):
+        for box in boxes:
+            desktop.paint(box, COLOURS[i % len(COLOURS)])
+        result = await tool.screenshot()
+        sent += len(result.output or "")
+        if result.base64_image:
+            sent += len(result.base64_image)
+            tokens += image_tokens(result.base64_image)
+    return sent, tokens
+
+
+async def main():
+    print(f"{'sequence':<18}{'full':>12}{'delta':>12}{'full tok':>10}{'delta tok':>11}")
+    for name, steps in SEQUENCES.items():
+        full_bytes, full_tokens = await run(steps, delta=False)
+        delta_bytes, delta_tokens = await run(steps, delta=True)
+        print(
+            f"{name:<18}{full_bytes:>12,}{delta_bytes:>12,}"
+            f"{full_tokens:>10,}{delta_tokens:>11,}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
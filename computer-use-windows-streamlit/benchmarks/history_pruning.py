@@ -0,0 +1,113 @@
+"""
+Cost of screenshot pruning over a long session.
+
+Replays a synthetic 500-turn history, pruning to the N most recent images before
+every step like sampling_loop does, once with the previous full-rescan filter and
+once with the incremental ImageIndex.
+
+Run from the computer-use-windows-streamlit directory:
+    python -m benchmarks.history_pruning
+"""
+
+import time
+
+from computer_use.history import ImageIndex
+
+TURNS = 500
+IMAGES_TO_KEEP = 10
+MIN_REMOVAL_THRESHOLD = 10
+
+
+def _turns():
+    for n in range(TURNS):
+        yield {
+            "role": "assistant",
+            "content": [
+                {"type": "text", "text": "Taking an action"},
+                {"type": "tool_use", "id": str(n), "name": "computer", "input": {}},
+            ],
+        }
+        yield {
+            "role": "user",
+            "content": [
+                {
+                    "type": "tool_result",
+                    "tool_use_id": str(n),
+                    "content": [
+                        {
+                            "type": "image",
+                            "source": {
+                                "type": "base64",
+                                "media_type": "image/png",
+                                "data": "iVBORw0KGgo=",
+                            },
+                        }
+                    ],
+                }
+            ],
+        }
+
+
+def _full_rescan(messages, images_to_keep, min_removal_threshold):
+    """The filter sampling_loop used before the index, kept here for comparison."""
+    tool_result_blocks = [
+        item
+        for message in messages
+        for item in (message["content"] if isinstance(message["content"], list) else [])
+        if isinstance(item, dict) and item.get("type") == "tool_result"
+    ]
+    total_images = sum(
+        1
+        for tool_result in tool_result_blocks
+        for content in tool_result.get("content", [])
+        if isinstance(content, dict) and content.get("type") == "image"
+    )
+    images_to_remove = total_images - images_to_keep
+    images_to_remove -= images_to_remove % min_removal_threshold
+    for tool_result in tool_result_blocks:
+        if isinstance(tool_result.get("content"), list):
+            new_content = []
+            for content in tool_result.get("content", []):
+                if isinstance(content, dict) and content.get("type") == "image":
+                    if images_to_remove > 0:
+                        images_to_remove -= 1
+                        continue
+                new_content.append(content)
+            tool_result["content"] = new_content
+
+
+def _replay(prune) -> float:
+    messages = [{"role": "user", "content": "Start the task"}]
+    elapsed = 0.0
+    for message in _turns():
+        messages.append(message)
+        if message["role"] == "user":
+            start = time.perf_counter()
+            prune(messages)
+            elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def main():
+    rescan = _replay(
+        lambda messages: _full_rescan(
+            messages, IMAGES_TO_KEEP, MIN_REMOVAL_THRESHOLD
+        )
+    )
+    index: ImageIndex | None = None
+
+    def prune_indexed(messages):
+        nonlocal index
+        if index is None:
+            index = ImageIndex(messages)
+        index.remove_oldest_images(IMAGES_TO_KEEP, MIN_REMOVAL_THRESHOLD)
+
+    indexed = _replay(prune_indexed)
+
+    print(f"{TURNS} turns, keeping {IMAGES_TO_KEEP} images")
+    print(f"{'full rescan':<14}{rescan * 1000:>10.2f}ms total{rescan / TURNS * 1e6:>10.1f}us/step")
+    print(f"{'image index':<14}{indexed * 1000:>10.2f}ms total{indexed / TURNS * 1e6:>10.1f}us/step")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Latency of finding a template on a 1920x1080 synthetic framebuffer.
+
+Compares correlating the template at every full resolution position, which is
+what a plain sliding search costs, with the pyramid search of TemplateLocator at
+one scale and at its default scales, for a cold and a cached template.
+
+Run from the computer-use-windows-streamlit directory:
+    python -m benchmarks.locate_template
+"""
+
+import asyncio
+import time
+
+import numpy as np
+from PIL import Image
+
+from computer_use.tools.capture import SyntheticBackend
+from computer_use.tools.locate import TemplateLocator, correlate, pyramid
+
+RUNS = 10
+ICON_SIZE = 48
+
+
+def icon(seed: int) -> Image.Image:
+    cells = np.random.default_rng(seed).integers(0, 255, (12, 12, 3), dtype=np.uint8)
+    return Image.fromarray(cells).resize(
+        (ICON_SIZE, ICON_SIZE), Image.Resampling.BILINEAR
+    )
+
+
+def timed(run) -> float:
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        run()
+    return (time.perf_counter() - start) / RUNS
+
+
+async def timed_async(run) -> float:
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        await run()
+    return (time.perf_counter() - start) / RUNS
+
+
+async def main():
+    desktop = SyntheticBackend()
+    for seed, position in enumerate([(300, 200), (1200, 640), (1700, 90), (860, 940)]):
+        desktop.paste(icon(seed), position)
+    screen = desktop.capture().image()
+    template = icon(1)
+
+    full = timed(lambda: correlate(pyramid(screen, 0)[0], pyramid(template, 0)[0]))
+    print(f"{'full resolution, 1 scale':<34}{full * 1000:>8.1f}ms")
+
+    for scales in [(1.0,), None]:
+        label = "1 scale" if scales else "default scales"
+        kwargs = {"scales": scales} if scales else {}
+
+        async def cold():
+            locator = TemplateLocator()
+            await locator.locate(screen, locator.add_image(template), **kwargs)
+            locator.close()
+
+        locator = TemplateLocator()
+        cached = locator.add_image(template)
+        matches = await locator.locate(screen, cached, **kwargs)
+
+        cold_seconds = await timed_async(cold)
+        print(f"{'pyramid, ' + label + ', cold':<34}{cold_seconds * 1000:>8.1f}ms")
+        warm = await timed_async(lambda: locator.locate(screen, cached, **kwargs))
+        print(f"{'pyramid, ' + label + ', cached':<34}{warm * 1000:>8.1f}ms")
+        assert [match.center for match in matches] == [(1224, 664)]
+        locator.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Event-loop responsiveness while an API request is in flight.
+
+Compares the synchronous client (the old sampling loop behaviour) against the
+async client used by sampling_loop, both talking to a local fake server that
+takes REQUEST_DELAY seconds to answer. A ticker task records how late each of
+its wake-ups is; with the sync client the loop is frozen for the whole request.
+
+Run from the computer-use-windows-streamlit directory:
+    python -m benchmarks.loop_responsiveness
+"""
+
+import asyncio
+import os
+import statistics
+import time
+
+from anthropic import Anthropic
+
+from computer_use.clients import APIProvider, ClientRegistry
+from tests.fake_api import FakeAnthropicServer, make_message
+
+REQUEST_DELAY = 1.0
+TICK_INTERVAL = 0.01
+REQUESTS = 3
+
+
+async def _ticker(lags: list[float], stop: asyncio.Event):
+    while not stop.is_set():
+        expected = time.perf_counter() + TICK_INTERVAL
+        await asyncio.sleep(TICK_INTERVAL)
+        lags.append(max(time.perf_counter() - expected, 0.0))
+
+
+async def _measure(request) -> list[float]:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    await asyncio.sleep(TICK_INTERVAL)
+    for _ in range(REQUESTS):
+        await request()
+    stop.set()
+    await ticker
+    return lags
+
+
+def _request_params():
+    return dict(
+        max_tokens=16,
+        messages=[{"role": "user", "content": "ping"}],
+        model="fake-model",
+    )
+
+
+async def main():
+    responses = [make_message([{"type": "text", "text": "pong"}])] * (REQUESTS * 2)
+    with FakeAnthropicServer(responses, delay=REQUEST_DELAY) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+
+        sync_client = Anthropic(api_key="benchmark")
+
+        async def sync_request():
+            sync_client.beta.messages.with_raw_response.create(**_request_params())
+
+        registry = ClientRegistry()
+        async_client = registry.get(APIProvider.ANTHROPIC, "benchmark")
+
+        async def async_request():
+            await async_client.beta.messages.with_raw_response.create(
+                **_request_params()
+            )
+
+        results = {
+            "sync client": await _measure(sync_request),
+            "async client": await _measure(async_request),
+        }
+        await registry.aclose()
+
+    print(f"{REQUESTS} requests, {REQUEST_DELAY:.1f}s server delay each")
+    print(f"{'path':<14}{'ticks':>8}{'median lag':>14}{'max lag':>12}")
+    for name, lags in results.items():
+        print(
+            f"{name:<14}{len(lags):>8}{statistics.median(lags) * 1000:>12.1f}ms"
+            f"{max(lags) * 1000:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
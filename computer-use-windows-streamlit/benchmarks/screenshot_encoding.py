@@ -0,0 +1,98 @@
+"""
+Capture-to-base64 latency and payload size of screenshot encoding.
+
+Encodes synthetic desktop-like 1920x1080 frames down to the 1366x768 the API sees,
+once through the previous temp file round trip and then in memory with a range
+of PNG settings.
+
+Run from the computer-use-windows-streamlit directory:
+    python -m benchmarks.screenshot_encoding
+"""
+
+import base64
+import random
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+
+from PIL import Image, ImageDraw
+
+from computer_use.tools.encoding import PngOptions, encode_png_base64
+
+FRAME_SIZE = (1920, 1080)
+SCALED_SIZE = (1366, 768)
+FRAMES = 3
+ROUNDS = 3
+SETTINGS = [
+    PngOptions(compress_level=0),
+    PngOptions(compress_level=1),
+    PngOptions(compress_level=3),
+    PngOptions(compress_level=6),
+    PngOptions(compress_level=9),
+    PngOptions(compress_level=6, optimize=True),
+]
+
+
+def desktop_frame(seed: int) -> Image.Image:
+    """A wallpaper gradient with a taskbar, windows, and rows of text-like glyphs."""
+    rng = random.Random(seed)
+    width, height = FRAME_SIZE
+    frame = Image.linear_gradient("L").resize(FRAME_SIZE).convert("RGB")
+    draw = ImageDraw.Draw(frame)
+    draw.rectangle((0, height - 48, width, height), fill=(32, 32, 40))
+    for _ in range(4):
+        left, top = rng.randrange(0, width - 700), rng.randrange(0, height - 550)
+        draw.rectangle((left, top, left + 700, top + 500), fill=(250, 250, 250))
+        draw.rectangle((left, top, left + 700, top + 32), fill=(0, 90, 160))
+        for row in range(top + 48, top + 480, 18):
+            x = left + 12
+            while x < left + 680:
+                word = rng.randrange(12, 60)
+                draw.rectangle((x, row, x + word, row + 10), fill=(20, 20, 20))
+                x += word + 8
+    return frame
+
+
+def _temp_file_round_trip(frame: Image.Image) -> str:
+    """The pipeline screenshot() used before encoding in memory."""
+    path = Path(tempfile.gettempdir()) / f"screenshot_{uuid4().hex}.png"
+    try:
+        frame.resize(SCALED_SIZE, Image.Resampling.LANCZOS).save(str(path))
+        return base64.b64encode(path.read_bytes()).decode()
+    finally:
+        path.unlink()
+
+
+def _measure(encode) -> tuple[float, int]:
+    frames = [desktop_frame(seed) for seed in range(FRAMES)]
+    best = float("inf")
+    size = 0
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        size = sum(len(encode(frame)) for frame in frames)
+        best = min(best, time.perf_counter() - start)
+    return best / FRAMES, size // FRAMES
+
+
+def main():
+    print(f"{FRAME_SIZE[0]}x{FRAME_SIZE[1]} frames scaled to {SCALED_SIZE[0]}x{SCALED_SIZE[1]}")
+    print(f"{'pipeline':<28}{'latency':>10}{'base64 size':>14}")
+    latency, _ = _measure(
+        lambda frame: frame.resize(SCALED_SIZE, Image.Resampling.LANCZOS).tobytes()
+    )
+    print(f"{'resize alone':<28}{latency * 1000:>8.1f}ms")
+    latency, size = _measure(_temp_file_round_trip)
+    print(f"{'temp file, level 6':<28}{latency * 1000:>8.1f}ms{size / 1024:>11.0f}KiB")
+    for options in SETTINGS:
+        latency, size = _measure(
+            lambda frame: encode_png_base64(frame, SCALED_SIZE, options)
+        )
+        label = f"in memory, level {options.compress_level}"
+        if options.optimize:
+            label += ", optimize"
+        print(f"{label:<28}{latency * 1000:>8.1f}ms{size / 1024:>11.0f}KiB")
+
+
+if __name__ == "__main__":
+    main()
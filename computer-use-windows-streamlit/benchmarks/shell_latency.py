@@ -0,0 +1,59 @@
+"""
+Time for the bash tool's Unix session to return a command's output: a bare echo,
+which the old session could not return in under its 200ms polling delay, and
+outputs up to 50 MB, which it never read off the pipe and so stalled on until
+its timeout. Peak memory is traced while the long outputs are read; it stays
+near the capture budget as the rest goes to a file.
+
+Run from the computer-use-windows-streamlit directory:
+    python -m benchmarks.shell_latency
+"""
+
+import asyncio
+import os
+import re
+import statistics
+import time
+import tracemalloc
+
+from computer_use.tools.bash import _UnixShellSession
+
+ECHO_RUNS = 50
+OUTPUT_SIZES = [1_000_000, 10_000_000, 50_000_000]
+
+
+async def main():
+    session = _UnixShellSession()
+    await session.start()
+    try:
+        await session.run("true")
+        latencies = []
+        for _ in range(ECHO_RUNS):
+            start = time.perf_counter()
+            await session.run("echo hello")
+            latencies.append(time.perf_counter() - start)
+        print(
+            f"echo: median {statistics.median(latencies) * 1000:.2f} ms, "
+            f"max {max(latencies) * 1000:.2f} ms over {ECHO_RUNS} runs"
+        )
+
+        print(f"{'output':>12}{'seconds':>10}{'MB/s':>10}{'peak MB':>10}")
+        for size in OUTPUT_SIZES:
+            tracemalloc.start()
+            start = time.perf_counter()
+            result = await session.run(f"head -c {size} /dev/zero | tr '\\0' x")
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert f"; {size:,} bytes of output" in result.system
+            os.remove(re.search(r"the full output is in (\S+)", result.system).group(1))
+            print(
+                f"{size:>12,}{elapsed:>10.2f}{size / elapsed / 1e6:>10.1f}"
+                f"{peak / 1e6:>10.2f}"
+            )
+    finally:
+        await session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+"""
+Image tokens for a task of screenshots and zooms, at lower screenshot scales.
+
+A lower COMPUTER_USE_SCREENSHOT_SCALE makes every screenshot cheaper, and the
+zoom action brings back the detail when small text has to be read. The task
+below takes SCREENSHOTS screenshots of a 1920x1080 display and zooms into a
+300x120 pixel (native) region ZOOMS times. Image tokens are estimated as
+width * height / 750.
+
+Run from the computer-use-windows-streamlit directory:
+    python -m benchmarks.zoom_tokens
+"""
+
+import asyncio
+import base64
+import io
+
+from PIL import Image
+
+from computer_use.tools.capture import SyntheticBackend
+from computer_use.tools.computer import ComputerTool, ScalingSource
+
+SCREENSHOTS = 10
+ZOOMS = 2
+SCALES = (1.0, 0.75, 0.5)
+# the region zoomed into, in display pixels
+ZOOM_BOX = (800, 400, 1100, 520)
+
+
+def image_tokens(base64_image: str) -> int:
+    with Image.open(io.BytesIO(base64.b64decode(base64_image))) as image:
+        return image.width * image.height // 750
+
+
+async def task_tokens(scale: float) -> tuple[int, int, int]:
+    tool = ComputerTool(capture_backend=SyntheticBackend(), screenshot_scale=scale)
+    tool._settle_window = 0
+    screenshot = image_tokens((await tool.screenshot()).base64_image)
+    left, top = tool.scale_coordinates(ScalingSource.COMPUTER, *ZOOM_BOX[:2])
+    right, bottom = tool.scale_coordinates(ScalingSource.COMPUTER, *ZOOM_BOX[2:])
+    zoom = image_tokens((await tool.zoom([left, top, right, bottom])).base64_image)
+    return screenshot, zoom, SCREENSHOTS * screenshot + ZOOMS * zoom
+
+
+async def main():
+    print(f"{'scale':<8}{'screenshot':>12}{'zoom':>8}{'task':>10}")
+    for scale in SCALES:
+        screenshot, zoom, task = await task_tokens(scale)
+        print(f"{scale:<8}{screenshot:>12,}{zoom:>8,}{task:>10,}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,198 @@
+"""
+Content-addressed store for screenshots, so message history holds digests instead of base64.
+"""
+
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, cast
+
+from anthropic.types.beta import BetaImageBlockParam
+
+# image sources of this type hold a digest into a BlobStore instead of the image
+# data, they are never sent to the API as they are
+BLOB_SOURCE_TYPE = "blob"
+
+# base64 payloads of the most recently sent images are kept, since the same few
+# screenshots are sent again on every step until they are pruned from the history
+BASE64_CACHE_SIZE = 16
+
+# in-memory bytes a store keeps by default before spilling to default_spill_dir()
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+
+
+def default_spill_dir() -> Path:
+    """A spill directory of this process, so no other process deletes its files."""
+    return Path(tempfile.gettempdir()) / f"computer_use_blobs-{os.getpid()}"
+
+
+@dataclass
+class BlobStoreStats:
+    """Counters describing what the store holds and how often frames were shared."""
+
+    blobs: int = 0
+    memory_bytes: int = 0
+    spilled_bytes: int = 0
+    duplicates: int = 0
+    evicted: int = 0
+
+
+class BlobStore:
+    """
+    Keeps image bytes keyed by their sha256 digest, so identical frames are stored
+    once. With a `spill_dir`, the least recently used blobs are written to disk
+    whenever the in-memory bytes exceed `memory_limit`.
+
+    Every `put` holds a reference to the blob until it is given back with
+    `release`, and a blob nothing refers to any more is evicted, from disk too.
+    """
+
+    def __init__(self, memory_limit: int | None = None, spill_dir: Path | None = None):
+        self.memory_limit = memory_limit
+        self.spill_dir = spill_dir
+        self.stats = BlobStoreStats()
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._spilled: set[str] = set()
+        self._base64: OrderedDict[str, str] = OrderedDict()
+        self._references: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes) -> str:
+        """Store `data` and return its digest, which holds a reference to it."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._references[digest] += 1
+            if digest in self._memory or digest in self._spilled:
+                self.stats.duplicates += 1
+                return digest
+            self._memory[digest] = data
+            self.stats.blobs += 1
+            self.stats.memory_bytes += len(data)
+            self._maybe_spill()
+        return digest
+
+    def put_base64(self, data: str) -> str:
+        """Store a base64 encoded payload and return its digest."""
+        digest = self.put(base64.b64decode(data))
+        with self._lock:
+            self._cache_base64(digest, data)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Return the bytes stored under `digest`, reading them back from disk if spilled."""
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                return self._memory[digest]
+            if digest not in self._spilled:
+                raise KeyError(digest)
+        assert self.spill_dir
+        try:
+            return (self.spill_dir / digest).read_bytes()
+        except FileNotFoundError:
+            # released by another thread since
+            raise KeyError(digest) from None
+
+    def get_base64(self, digest: str) -> str:
+        """Return the stored bytes as a base64 payload for an API request."""
+        with self._lock:
+            if digest in self._base64:
+                self._base64.move_to_end(digest)
+                return self._base64[digest]
+        data = base64.b64encode(self.get(digest)).decode()
+        with self._lock:
+            self._cache_base64(digest, data)
+        return data
+
+    def image_block(self, digest: str, media_type: str = "image/png") -> dict[str, Any]:
+        """An image block for the message history that refers to a stored blob."""
+        return {
+            "type": "image",
+            "source": {"type": BLOB_SOURCE_TYPE, "media_type": media_type, "digest": digest},
+        }
+
+    def resolve(self, block: dict[str, Any]) -> BetaImageBlockParam:
+        """Turn an image block made by `image_block` into one the API accepts."""
+        source = block["source"]
+        if source.get("type") != BLOB_SOURCE_TYPE:
+            return cast(BetaImageBlockParam, block)
+        return cast(
+            BetaImageBlockParam,
+            {
+                **block,
+                "source": {
+                    "type": "base64",
+                    "media_type": source["media_type"],
+                    "data": self.get_base64(source["digest"]),
+                },
+            },
+        )
+
+    def release(self, digest: str):
+        """Give back a reference taken by `put`, evicting the blob if it was the last."""
+        with self._lock:
+            if self._references[digest] > 1:
+                self._references[digest] -= 1
+                return
+            self._evict(digest)
+
+    def release_image_blocks(self, blocks: Iterable[dict[str, Any]]):
+        """Release the blobs of image blocks made by `image_block`, e.g. pruned ones."""
+        for block in blocks:
+            source = block["source"]
+            if source.get("type") == BLOB_SOURCE_TYPE:
+                self.release(source["digest"])
+
+    def close(self):
+        """Drop every blob and delete the spilled ones from disk."""
+        with self._lock:
+            for digest in list(self._memory) + list(self._spilled):
+                self._evict(digest)
+        if self.spill_dir:
+            try:
+                self.spill_dir.rmdir()
+            except OSError:
+                # never created, or shared with files that aren't ours
+                pass
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._memory or digest in self._spilled
+
+    def _evict(self, digest: str):
+        self._references.pop(digest, None)
+        self._base64.pop(digest, None)
+        if digest in self._memory:
+            self.stats.memory_bytes -= len(self._memory.pop(digest))
+        elif digest in self._spilled:
+            assert self.spill_dir
+            path = self.spill_dir / digest
+            self.stats.spilled_bytes -= path.stat().st_size
+            path.unlink()
+            self._spilled.remove(digest)
+        else:
+            return
+        self.stats.blobs -= 1
+        self.stats.evicted += 1
+
+    def _cache_base64(self, digest: str, data: str):
+        self._base64[digest] = data
+        self._base64.move_to_end(digest)
+        while len(self._base64) > BASE64_CACHE_SIZE:
+            self._base64.popitem(last=False)
+
+    def _maybe_spill(self):
+        if self.memory_limit is None or self.spill_dir is None:
+            return
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        while self.stats.memory_bytes > self.memory_limit and len(self._memory) > 1:
+            digest, data = self._memory.popitem(last=False)
+            (self.spill_dir / digest).write_bytes(data)
+            self._spilled.add(digest)
+            self.stats.memory_bytes -= len(data)
+            self.stats.spilled_bytes += len(data)
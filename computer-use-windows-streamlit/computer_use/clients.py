@@ -0,0 +1,155 @@
+"""
+Process-wide registry of API clients, so HTTP connections outlive a single sampling loop.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Any
+
+import anthropic
+from anthropic import (
+    AsyncAnthropic,
+    AsyncAnthropicBedrock,
+    AsyncAnthropicVertex,
+    DefaultAsyncHttpxClient,
+)
+
+# anthropic 1.x moved its transport to httpx2, whose errors and types are distinct
+# from httpx's even where both are installed
+if anthropic.__version__.startswith("0."):
+    import httpx
+else:
+    import httpx2 as httpx
+
+# httpx drops idle connections after 5 seconds by default, which is shorter than a
+# single screenshot + tool step, so most steps would otherwise pay for a new TLS handshake.
+KEEPALIVE_EXPIRY: float = 90.0
+MAX_KEEPALIVE_CONNECTIONS: int = 20
+WARM_UP_TIMEOUT: float = 5.0
+
+
+class APIProvider(StrEnum):
+    ANTHROPIC = "anthropic"
+    BEDROCK = "bedrock"
+    VERTEX = "vertex"
+
+
+ClientKey = tuple[APIProvider, str | None, str | None]
+APIClient = AsyncAnthropic | AsyncAnthropicBedrock | AsyncAnthropicVertex
+
+
+@dataclass
+class ClientStats:
+    """Counters describing how often clients and connections are reused."""
+
+    clients_created: int = 0
+    clients_reused: int = 0
+    requests: int = 0
+    connections_opened: int = 0
+    warm_ups: int = 0
+
+    @property
+    def connections_reused(self) -> int:
+        return max(self.requests - self.connections_opened, 0)
+
+
+class ClientRegistry:
+    """
+    Hands out one long-lived async client per (provider, api_key, region).
+
+    Async connection pools belong to the event loop that opened them, so clients
+    are kept per running loop and dropped together with it. A single registry
+    can be shared by every streamlit session and rerun in the process.
+    """
+
+    def __init__(self):
+        self._clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[ClientKey, tuple[APIClient, httpx.AsyncClient]]
+        ] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.stats = ClientStats()
+
+    def get(self, provider: APIProvider, api_key: str | None = None) -> APIClient:
+        """Return the shared client for the provider on the running event loop."""
+        return self._get(provider, api_key)[0]
+
+    def _get(
+        self, provider: APIProvider, api_key: str | None
+    ) -> tuple[APIClient, httpx.AsyncClient]:
+        key = self._key(provider, api_key)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._clients.setdefault(loop, {})
+            if key in clients:
+                self.stats.clients_reused += 1
+                return clients[key]
+            http_client = self._make_http_client()
+            clients[key] = self._make_client(key, http_client), http_client
+            self.stats.clients_created += 1
+            return clients[key]
+
+    async def warm_up(self, provider: APIProvider, api_key: str | None = None):
+        """
+        Open a connection to the provider ahead of the first request, so the TCP
+        and TLS handshakes are not paid for on the first step of a task.
+        """
+        client, http_client = self._get(provider, api_key)
+        try:
+            await http_client.head(str(client.base_url), timeout=WARM_UP_TIMEOUT)
+        except httpx.HTTPError:
+            # the connection is only a head start, the real request will retry
+            return
+        with self._lock:
+            self.stats.warm_ups += 1
+
+    async def aclose(self):
+        """Close the clients and connection pools of the running event loop."""
+        with self._lock:
+            clients = self._clients.pop(asyncio.get_running_loop(), {})
+        for client, _ in clients.values():
+            await client.close()
+
+    @staticmethod
+    def _key(provider: APIProvider, api_key: str | None) -> ClientKey:
+        provider = APIProvider(provider)
+        if provider == APIProvider.ANTHROPIC:
+            return provider, api_key, None
+        if provider == APIProvider.VERTEX:
+            return provider, None, os.environ.get("CLOUD_ML_REGION")
+        return provider, None, os.environ.get("AWS_REGION")
+
+    def _make_http_client(self) -> httpx.AsyncClient:
+        return DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=None,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            event_hooks={"request": [self._on_request]},
+        )
+
+    @staticmethod
+    def _make_client(key: ClientKey, http_client: httpx.AsyncClient) -> APIClient:
+        # the region in the key is read from the same environment variables the
+        # vertex and bedrock clients fall back to
+        provider, api_key, _ = key
+        if provider == APIProvider.ANTHROPIC:
+            return AsyncAnthropic(api_key=api_key, http_client=http_client)
+        if provider == APIProvider.VERTEX:
+            return AsyncAnthropicVertex(http_client=http_client)
+        return AsyncAnthropicBedrock(http_client=http_client)
+
+    async def _on_request(self, request: httpx.Request):
+        with self._lock:
+            self.stats.requests += 1
+        request.extensions["trace"] = self._on_trace
+
+    async def _on_trace(self, event_name: str, info: dict[str, Any]):
+        # a request on a pooled connection never reaches connect_tcp
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.stats.connections_opened += 1
@@ -0,0 +1,188 @@
+"""
+Message history with an index of the screenshots it holds, for cheap image pruning,
+and a deduplicator that keeps repeated screenshots out of it.
+"""
+
+import os
+from collections import deque
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Any
+
+from anthropic.types.beta import BetaMessageParam
+
+
+class ImageIndex:
+    """
+    Ordered index of the image blocks inside the tool results of a message list.
+
+    Messages are only ever appended to the history, so the index catches up by
+    scanning the messages added since it last looked, and removing the oldest
+    images costs one step per image removed rather than a pass over the history.
+    """
+
+    def __init__(self, messages: list[BetaMessageParam]):
+        self._messages = messages
+        self._scanned = 0
+        # (message position, tool result content list, image block), oldest first
+        self._images: deque[tuple[int, list[Any], dict[str, Any]]] = deque()
+
+    def __len__(self) -> int:
+        self._update()
+        return len(self._images)
+
+    def __iter__(self) -> Iterator[tuple[int, list[Any], dict[str, Any]]]:
+        """The remaining images, oldest first, with the position of their message."""
+        self._update()
+        return iter(self._images)
+
+    def newest(self) -> dict[str, Any] | None:
+        """The most recent image block still in the history."""
+        self._update()
+        return self._images[-1][2] if self._images else None
+
+    def remove_oldest_images(
+        self, images_to_keep: int, min_removal_threshold: int
+    ) -> list[dict[str, Any]]:
+        """
+        Remove all but the final `images_to_keep` tool_result images in place, in
+        chunks of `min_removal_threshold` to reduce how often the prompt cache breaks.
+        Returns the removed image blocks.
+        """
+        images_to_remove = len(self) - images_to_keep
+        # for better cache behavior, we want to remove in chunks
+        images_to_remove -= images_to_remove % min_removal_threshold
+        removed = []
+        for _ in range(max(images_to_remove, 0)):
+            _, content, image = self._images.popleft()
+            for i, block in enumerate(content):
+                if block is image:
+                    del content[i]
+                    break
+            removed.append(image)
+        return removed
+
+    def _update(self):
+        if len(self._messages) < self._scanned:
+            # the history was cleared or truncated, start over
+            self._scanned = 0
+            self._images.clear()
+        for position in range(self._scanned, len(self._messages)):
+            self._index(position, self._messages[position])
+        self._scanned = len(self._messages)
+
+    def _index(self, position: int, message: BetaMessageParam):
+        if not isinstance(message["content"], list):
+            return
+        for item in message["content"]:
+            if not (isinstance(item, dict) and item.get("type") == "tool_result"):
+                continue
+            content = item.get("content")
+            if not isinstance(content, list):
+                continue
+            for block in content:
+                if isinstance(block, dict) and block.get("type") == "image":
+                    self._images.append((position, content, block))
+
+
+# perceptual hashes at most this many bits apart count as the same screen; unset to
+# only drop screenshots identical to the previous one
+DEDUP_DISTANCE_ENV_VAR = "COMPUTER_USE_SCREENSHOT_DEDUP_DISTANCE"
+
+DUPLICATE_SCREENSHOT_MARKER = (
+    "The screen is unchanged since the previous screenshot, so no image is attached."
+)
+NEAR_DUPLICATE_SCREENSHOT_MARKER = (
+    "The screen is nearly unchanged since the previous screenshot, so no image is "
+    "attached."
+)
+
+
+@dataclass
+class DedupStats:
+    """Screenshots left out of the history as repeats, and their base64 size."""
+
+    images_avoided: int = 0
+    bytes_avoided: int = 0
+
+
+class ScreenshotDeduplicator:
+    """
+    Decides whether a screenshot repeats the newest image still in the history, in
+    which case its tool result carries a text marker instead of a second copy.
+
+    Screenshots are the same when their blob digests are equal, or, with a
+    `max_distance`, when their perceptual hashes differ in at most that many bits.
+    A perceptual match can hide a small change such as a toggled checkbox, so it is
+    off unless configured.
+    """
+
+    def __init__(self, max_distance: int | None = None):
+        if max_distance is None and os.environ.get(DEDUP_DISTANCE_ENV_VAR):
+            max_distance = int(os.environ[DEDUP_DISTANCE_ENV_VAR])
+        self.max_distance = max_distance
+        self.stats = DedupStats()
+        # perceptual hash of each screenshot digest that went into the history
+        self._hashes: dict[str, str] = {}
+        # the image block of the last screenshot let through, and its content list
+        self._previous: tuple[list[Any], dict[str, Any]] | None = None
+
+    def marker(
+        self,
+        digest: str,
+        image_hash: str | None,
+        image_index: ImageIndex,
+        size: int,
+    ) -> str | None:
+        """
+        The text to send instead of the screenshot `digest` of `size` base64 bytes,
+        or None if it should be sent. `image_index` says which images remain in the
+        history after pruning.
+        """
+        previous = self._newest_image(image_index)
+        if previous is None or previous["source"].get("digest") is None:
+            return None
+        previous_digest = previous["source"]["digest"]
+        if previous_digest == digest:
+            marker = DUPLICATE_SCREENSHOT_MARKER
+        elif self._near(self._hashes.get(previous_digest), image_hash):
+            marker = NEAR_DUPLICATE_SCREENSHOT_MARKER
+        else:
+            return None
+        self.stats.images_avoided += 1
+        self.stats.bytes_avoided += size
+        return marker
+
+    def record(self, content: list[Any], image: dict[str, Any], image_hash: str | None):
+        """Note the screenshot `image`, in the tool result `content`, as the newest one."""
+        if image_hash:
+            self._hashes[image["source"]["digest"]] = image_hash
+        self._previous = (content, image)
+
+    def _newest_image(self, image_index: ImageIndex) -> dict[str, Any] | None:
+        # results of the turn in progress are not in the history yet
+        if self._previous:
+            content, image = self._previous
+            if any(block is image for block in content):
+                return image
+        return image_index.newest()
+
+    def _near(self, previous_hash: str | None, image_hash: str | None) -> bool:
+        if self.max_distance is None or not previous_hash or not image_hash:
+            return False
+        if len(previous_hash) != len(image_hash):
+            return False
+        distance = (int(previous_hash, 16) ^ int(image_hash, 16)).bit_count()
+        return distance <= self.max_distance
+
+
+class MessageHistory(list):
+    """
+    A list of messages that carries its own ImageIndex and ScreenshotDeduplicator
+    across sampling loops.
+    """
+
+    def __init__(self, messages: list[BetaMessageParam] | None = None):
+        super().__init__(messages or [])
+        self.image_index = ImageIndex(self)
+        self.deduplicator = ScreenshotDeduplicator()
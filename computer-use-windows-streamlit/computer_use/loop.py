@@ -2,36 +2,73 @@
 Agentic sampling loop that calls the Anthropic API and local implenmentation of anthropic-defined computer use tools.
 """
 
+import asyncio
+import atexit
+import inspect
+import json
 import platform
-from collections.abc import Callable
+from collections.abc import Awaitable, Callable
 from datetime import datetime
-from enum import StrEnum
-from typing import Any, cast
+from typing import Any, TypeVar, cast
 
-from anthropic import Anthropic, AnthropicBedrock, AnthropicVertex, APIResponse
-from anthropic.types import (
-    ToolResultBlockParam,
-)
+from anthropic import APIError, APIResponse, AsyncStream
 from anthropic.types.beta import (
     BetaContentBlock,
+    BetaCacheControlEphemeralParam,
     BetaContentBlockParam,
     BetaImageBlockParam,
     BetaMessage,
     BetaMessageParam,
+    BetaRawMessageStreamEvent,
+    BetaTextBlock,
     BetaTextBlockParam,
     BetaToolResultBlockParam,
+    BetaToolUnionParam,
+    BetaToolUseBlock,
+    BetaUsage,
 )
 
 # Change to absolute imports
-from computer_use.tools import BashTool, ComputerTool, EditTool, ToolCollection, ToolResult
+from computer_use.blobs import (
+    BLOB_SOURCE_TYPE,
+    DEFAULT_MEMORY_LIMIT,
+    BlobStore,
+    default_spill_dir,
+)
+from computer_use.clients import APIClient, APIProvider, ClientRegistry
+from computer_use.history import ImageIndex, MessageHistory, ScreenshotDeduplicator
+from computer_use.tools import (
+    BashTool,
+    CLIResult,
+    ComputerTool,
+    EditTool,
+    ToolCollection,
+    ToolResult,
+    ToolScheduler,
+)
 
 BETA_FLAG = "computer-use-2024-10-22"
+PROMPT_CACHING_BETA_FLAG = "prompt-caching-2024-07-31"
 
+# the API allows 4 cache breakpoints: the system prompt and tool definitions take
+# one each and the rest roll along the most recent user turns
+CACHED_USER_TURNS = 2
+EPHEMERAL: BetaCacheControlEphemeralParam = {"type": "ephemeral"}
 
-class APIProvider(StrEnum):
-    ANTHROPIC = "anthropic"
-    BEDROCK = "bedrock"
-    VERTEX = "vertex"
+# screenshots are of diminishing value as the conversation progresses, old ones
+# are removed in chunks of this size so the prompt cache breaks less often
+IMAGE_REMOVAL_CHUNK_SIZE = 10
+
+T = TypeVar("T")
+
+# used when the caller does not bring its own registry, so repeated calls to
+# sampling_loop in one process still share connections
+DEFAULT_CLIENT_REGISTRY = ClientRegistry()
+# likewise for screenshots, identical frames from any session are stored once
+DEFAULT_BLOB_STORE = BlobStore(
+    memory_limit=DEFAULT_MEMORY_LIMIT, spill_dir=default_spill_dir()
+)
+atexit.register(DEFAULT_BLOB_STORE.close)
 
 
 PROVIDER_TO_DEFAULT_MODEL_NAME: dict[APIProvider, str] = {
@@ -62,6 +99,11 @@ SYSTEM_PROMPT = f"""<SYSTEM_CAPABILITY>
 * When using commands that are expected to output very large quantities of text, redirect into a temporary file and use the edit tool or appropriate filtering commands to examine the output.
 * When viewing a page it can be helpful to zoom out so that you can see everything on the page. Either that, or make sure you scroll down to see everything before deciding something isn't available.
 * When using your computer function calls, they take a while to run and send back to you. Where possible/feasible, try to chain multiple of these calls all into one function calls request.
+* To chain input actions, use the computer tool's "batch" action with an "actions" list of {{"action": ..., "text": ..., "coordinate": ...}} objects (key, type, mouse_move, left_click, left_click_drag, right_click, middle_click, double_click). They run back to back and a single screenshot is taken at the end.
+* To read small text or fine detail, use the computer tool's "zoom" action with a "region" of [left, top, right, bottom] in screenshot coordinates. It returns that region at the screen's full resolution.
+* To wait for a page load, an installer or other progress, use the computer tool's "wait_for_change" or "wait_until_stable" action, optionally with a "region" and a "timeout" in seconds (up to 60), instead of taking repeated screenshots. Either returns a screenshot once the screen changes or settles.
+* To find an element again without a screenshot, use the computer tool's "locate" action. Give a "region" around it once, which returns a template digest that stays valid for the rest of the conversation, then pass that digest (or the path of an image file) as "template". It returns the matching centers with their confidence; set "threshold" (0 to 1, default 0.9) to accept weaker matches.
+* Long text given to the "type" action is pasted through the clipboard. If a field does not accept pasted text, repeat the action with "paste": false to type it key by key.
 * The current date is {datetime.today().strftime('%A, %B %#d, %Y')}.
 </SYSTEM_CAPABILITY>
 
@@ -83,11 +125,46 @@ async def sampling_loop(
     api_key: str,
     only_n_most_recent_images: int | None = None,
     max_tokens: int = 4096,
+    client_registry: ClientRegistry | None = None,
+    stop_event: asyncio.Event | None = None,
+    stream: bool = False,
+    usage_callback: Callable[[BetaUsage], None] | None = None,
+    blob_store: BlobStore | None = None,
+    deduplicator: ScreenshotDeduplicator | None = None,
+    tool_collection: ToolCollection | None = None,
 ):
     """
     Agentic sampling loop for the assistant/tool interaction of computer use.
+
+    Pass the same `tool_collection` to every call of a conversation to keep what
+    its tools learned, e.g. the computer tool's template cache and statistics, and
+    the bash tool's shell. The caller owns a collection it passes and closes it once
+    the conversation is over; the loop only suspends its background work, like the
+    computer tool's capture, when it returns.
+
+    Setting `stop_event` (or cancelling the task running the loop) aborts the
+    in-flight API request and returns the messages exchanged so far.
+
+    With `stream` set, responses are streamed: text deltas reach `output_callback`
+    while the model is still generating, and each tool starts running as soon as
+    its tool_use block is complete instead of after the whole message.
+
+    With the Anthropic API, the system prompt, tool definitions and the most recent
+    user turns are marked as prompt cache breakpoints. `usage_callback` receives
+    the token usage of every step, including cache reads and writes.
+
+    Screenshots are moved into `blob_store`: the messages and the results passed to
+    `tool_output_callback` refer to them by digest, and they are only turned back
+    into base64 for the duration of each API request. A screenshot is released from
+    the store once it is no longer in the history, so digests a callback kept
+    may stop resolving.
+
+    A screenshot that repeats the newest image still in the history is replaced by
+    a text marker in the tool result sent to the model, as decided by
+    `deduplicator`; `tool_output_callback` still receives the screenshot.
     """
-    tool_collection = ToolCollection(
+    owns_tools = tool_collection is None
+    tool_collection = tool_collection or ToolCollection(
         ComputerTool(),
         BashTool(),
         EditTool(),
@@ -95,143 +172,390 @@ async def sampling_loop(
     system = (
         f"{SYSTEM_PROMPT}{' ' + system_prompt_suffix if system_prompt_suffix else ''}"
     )
+    client = (client_registry or DEFAULT_CLIENT_REGISTRY).get(provider, api_key)
+    blob_store = blob_store or DEFAULT_BLOB_STORE
+    # a MessageHistory keeps its index between calls, a plain list is indexed once here
+    if isinstance(messages, MessageHistory):
+        image_index = messages.image_index
+        deduplicator = deduplicator or messages.deduplicator
+    else:
+        image_index = ImageIndex(messages)
+        deduplicator = deduplicator or ScreenshotDeduplicator()
+    prompt_caching = provider == APIProvider.ANTHROPIC
+    betas = [BETA_FLAG]
+    if prompt_caching:
+        betas.append(PROMPT_CACHING_BETA_FLAG)
+
+    try:
+        while True:
+            if stop_event and stop_event.is_set():
+                return messages
+
+            if only_n_most_recent_images:
+                blob_store.release_image_blocks(
+                    image_index.remove_oldest_images(
+                        only_n_most_recent_images, IMAGE_REMOVAL_CHUNK_SIZE
+                    )
+                )
 
-    while True:
-        if only_n_most_recent_images:
-            _maybe_filter_to_n_most_recent_images(messages, only_n_most_recent_images)
-
-        if provider == APIProvider.ANTHROPIC:
-            client = Anthropic(api_key=api_key)
-        elif provider == APIProvider.VERTEX:
-            client = AnthropicVertex()
-        elif provider == APIProvider.BEDROCK:
-            client = AnthropicBedrock()
-
-        # Call the API
-        # we use raw_response to provide debug information to streamlit. Your
-        # implementation may be able call the SDK directly with:
-        # `response = client.messages.create(...)` instead.
-        raw_response = client.beta.messages.with_raw_response.create(
-            max_tokens=max_tokens,
-            messages=messages,
-            model=model,
-            system=system,
-            tools=tool_collection.to_params(),
-            betas=["computer-use-2024-10-22"],
-        )
-
-        api_response_callback(cast(APIResponse[BetaMessage], raw_response))
-
-        response = raw_response.parse()
-
-        messages.append(
-            {
-                "role": "assistant",
-                "content": cast(list[BetaContentBlockParam], response.content),
-            }
-        )
+            # tool runs start as soon as their tool_use block is complete; the
+            # scheduler overlaps independent calls and keeps dependent ones in order
+            scheduler = ToolScheduler(tool_collection)
+            tool_runs: dict[str, asyncio.Task[ToolResult]] = {}
+            response: BetaMessage | None = None
 
-        tool_result_content: list[BetaToolResultBlockParam] = []
-        for content_block in cast(list[BetaContentBlock], response.content):
-            output_callback(content_block)
-            if content_block.type == "tool_use":
-                result = await tool_collection.run(
+            def run_tool(content_block: BetaToolUseBlock):
+                tool_runs[content_block.id] = scheduler.submit(
                     name=content_block.name,
                     tool_input=cast(dict[str, Any], content_block.input),
                 )
-                tool_result_content.append(
-                    _make_api_tool_result(result, content_block.id)
+
+            params = dict(
+                max_tokens=max_tokens,
+                messages=_with_resolved_images(messages, image_index, blob_store),
+                model=model,
+                system=system,
+                tools=tool_collection.to_params(),
+                betas=betas,
+            )
+            if prompt_caching:
+                params.update(
+                    messages=_with_cache_breakpoints(params["messages"]),
+                    system=[{"type": "text", "text": system, "cache_control": EPHEMERAL}],
+                    tools=_with_tools_cache_breakpoint(params["tools"]),
                 )
-                tool_output_callback(result, content_block.id)
+            if stream:
+                request = _stream_message(
+                    client, params, output_callback, run_tool, api_response_callback
+                )
+            else:
+                request = _create_message(client, params, api_response_callback)
+            try:
+                response = await _until_stopped(request, stop_event)
+            finally:
+                if response is None:
+                    # tools dispatched from a message that never completed
+                    for task in tool_runs.values():
+                        task.cancel()
+            if response is None:
+                return messages
+
+            if usage_callback:
+                usage_callback(response.usage)
+
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": cast(list[BetaContentBlockParam], response.content),
+                }
+            )
 
-        if not tool_result_content:
-            return messages
+            content_blocks = cast(list[BetaContentBlock], response.content)
+            for content_block in content_blocks:
+                if content_block.type == "tool_use" and content_block.id not in tool_runs:
+                    run_tool(content_block)
+
+            # results are collected in block order, whatever order the tools finish in
+            tool_result_content: list[BetaToolResultBlockParam] = []
+            for content_block in content_blocks:
+                if not stream:
+                    output_callback(content_block)
+                if content_block.type == "tool_use":
+                    result = _store_image(await tool_runs[content_block.id], blob_store)
+                    tool_result = _make_api_tool_result(
+                        _deduplicated(result, deduplicator, image_index, blob_store),
+                        content_block.id,
+                        blob_store,
+                    )
+                    _record_image(tool_result, result, deduplicator)
+                    tool_result_content.append(tool_result)
+                    tool_output_callback(result, content_block.id)
+                    if result.image_digest and not _image_of(tool_result):
+                        # left out of the history, which holds its blob otherwise
+                        blob_store.release(result.image_digest)
+
+            if not tool_result_content:
+                return messages
+
+            messages.append({"content": tool_result_content, "role": "user"})
+
+    finally:
+        # e.g. the computer tool's background capture
+        if owns_tools:
+            await tool_collection.aclose()
+        else:
+            await tool_collection.suspend()
+
+
+async def _create_message(
+    client: APIClient,
+    params: dict[str, Any],
+    api_response_callback: Callable[[APIResponse[BetaMessage]], None],
+) -> BetaMessage:
+    # we use raw_response to provide debug information to streamlit. Your
+    # implementation may be able call the SDK directly with:
+    # `response = client.messages.create(...)` instead.
+    raw_response = await client.beta.messages.with_raw_response.create(**params)
+    api_response_callback(cast(APIResponse[BetaMessage], raw_response))
+    return await _parse(raw_response)
 
-        messages.append({"content": tool_result_content, "role": "user"})
 
+async def _parse(raw_response: Any) -> Any:
+    """
+    The raw responses of anthropic 1.x async clients parse in a coroutine, those
+    of 0.x parse synchronously.
+    """
+    parsed = raw_response.parse()
+    if inspect.isawaitable(parsed):
+        return await parsed
+    return parsed
 
-def _maybe_filter_to_n_most_recent_images(
-    messages: list[BetaMessageParam],
-    images_to_keep: int,
-    min_removal_threshold: int = 10,
-):
+
+async def _stream_message(
+    client: APIClient,
+    params: dict[str, Any],
+    output_callback: Callable[[BetaContentBlock], None],
+    on_tool_use: Callable[[BetaToolUseBlock], None],
+    api_response_callback: Callable[[APIResponse[BetaMessage]], None],
+) -> BetaMessage:
     """
-    With the assumption that images are screenshots that are of diminishing value as
-    the conversation progresses, remove all but the final `images_to_keep` tool_result
-    images in place, with a chunk of min_removal_threshold to reduce the amount we
-    break the implicit prompt cache.
+    Request the message as a stream of server-sent events, accumulating it into a
+    BetaMessage. Text deltas are forwarded to `output_callback` as they arrive and
+    each tool_use block is handed to `on_tool_use` as soon as it is complete.
     """
-    if images_to_keep is None:
-        return messages
-
-    tool_result_blocks = cast(
-        list[ToolResultBlockParam],
-        [
-            item
-            for message in messages
-            for item in (
-                message["content"] if isinstance(message["content"], list) else []
-            )
-            if isinstance(item, dict) and item.get("type") == "tool_result"
-        ],
+    raw_response = await client.beta.messages.with_raw_response.create(
+        **params, stream=True
     )
+    events = cast(AsyncStream[BetaRawMessageStreamEvent], await _parse(raw_response))
+    message: BetaMessage | None = None
+    tool_input_json: dict[int, str] = {}
+    async for event in events:
+        if event.type == "message_start":
+            message = event.message
+        elif event.type == "content_block_start":
+            assert message
+            message.content.append(event.content_block)
+            if event.content_block.type == "tool_use":
+                tool_input_json[event.index] = ""
+        elif event.type == "content_block_delta":
+            assert message
+            block = message.content[event.index]
+            if event.delta.type == "text_delta" and block.type == "text":
+                block.text += event.delta.text
+                output_callback(BetaTextBlock(type="text", text=event.delta.text))
+            elif event.delta.type == "input_json_delta":
+                tool_input_json[event.index] += event.delta.partial_json
+        elif event.type == "content_block_stop":
+            assert message
+            block = message.content[event.index]
+            if block.type == "tool_use":
+                block.input = json.loads(tool_input_json.pop(event.index) or "{}")
+                output_callback(block)
+                on_tool_use(block)
+        elif event.type == "message_delta":
+            assert message
+            message.stop_reason = event.delta.stop_reason
+            message.stop_sequence = event.delta.stop_sequence
+            message.usage.output_tokens = event.usage.output_tokens
+    if message is None:
+        raise APIError(
+            "stream ended before the message started",
+            raw_response.http_request,
+            body=None,
+        )
+    api_response_callback(cast(APIResponse[BetaMessage], raw_response))
+    return message
+
 
-    total_images = sum(
-        1
-        for tool_result in tool_result_blocks
-        for content in tool_result.get("content", [])
-        if isinstance(content, dict) and content.get("type") == "image"
+async def _until_stopped(
+    awaitable: Awaitable[T], stop_event: asyncio.Event | None
+) -> T | None:
+    """
+    Await `awaitable`, cancelling it as soon as `stop_event` is set. Returns None
+    if it was stopped before completing.
+    """
+    if stop_event is None:
+        return await awaitable
+    task = asyncio.ensure_future(awaitable)
+    stopped = asyncio.ensure_future(stop_event.wait())
+    try:
+        await asyncio.wait({task, stopped}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stopped.cancel()
+        if not task.done():
+            # cancelling the request task closes its connection right away
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    if task.cancelled():
+        return None
+    return task.result()
+
+
+def _store_image(result: ToolResult, blob_store: BlobStore) -> ToolResult:
+    """Move the screenshot of a tool result into the blob store."""
+    if not result.base64_image:
+        return result
+    return result.replace(
+        base64_image=None, image_digest=blob_store.put_base64(result.base64_image)
     )
 
-    images_to_remove = total_images - images_to_keep
-    # for better cache behavior, we want to remove in chunks
-    images_to_remove -= images_to_remove % min_removal_threshold
 
-    for tool_result in tool_result_blocks:
-        if isinstance(tool_result.get("content"), list):
-            new_content = []
-            for content in tool_result.get("content", []):
-                if isinstance(content, dict) and content.get("type") == "image":
-                    if images_to_remove > 0:
-                        images_to_remove -= 1
-                        continue
-                new_content.append(content)
-            tool_result["content"] = new_content
+def _deduplicated(
+    result: ToolResult,
+    deduplicator: ScreenshotDeduplicator,
+    image_index: ImageIndex,
+    blob_store: BlobStore,
+) -> ToolResult:
+    """The result to send the model, without a screenshot that repeats the last one."""
+    if not result.image_digest:
+        return result
+    marker = deduplicator.marker(
+        result.image_digest,
+        result.image_hash,
+        image_index,
+        len(blob_store.get_base64(result.image_digest)),
+    )
+    if marker is None:
+        return result
+    output = f"{result.output}\n{marker}" if result.output else marker
+    return result.replace(image_digest=None, image_hash=None, output=output)
 
 
-def _make_api_tool_result(
-    result: ToolResult, tool_use_id: str
-) -> BetaToolResultBlockParam:
-    """Convert an agent ToolResult to an API ToolResultBlockParam."""
-    tool_result_content: list[BetaTextBlockParam | BetaImageBlockParam] | str = []
-    is_error = False
-    if result.error:
-        is_error = True
-        tool_result_content = _maybe_prepend_system_tool_result(result, result.error)
-    else:
-        if result.output:
-            tool_result_content.append(
-                {
-                    "type": "text",
-                    "text": _maybe_prepend_system_tool_result(result, result.output),
-                }
-            )
-        if result.base64_image:
-            tool_result_content.append(
+def _record_image(
+    tool_result: BetaToolResultBlockParam,
+    result: ToolResult,
+    deduplicator: ScreenshotDeduplicator,
+):
+    if image := _image_of(tool_result):
+        content = cast(list[Any], tool_result["content"])
+        deduplicator.record(content, image, result.image_hash)
+
+
+def _image_of(tool_result: BetaToolResultBlockParam) -> dict[str, Any] | None:
+    """The image block a tool result sends, if any."""
+    content = tool_result["content"]
+    if isinstance(content, list) and content and content[-1]["type"] == "image":
+        return cast(dict[str, Any], content[-1])
+    return None
+
+
+def _with_resolved_images(
+    messages: list[BetaMessageParam], image_index: ImageIndex, blob_store: BlobStore
+) -> list[BetaMessageParam]:
+    """
+    Return a copy of `messages` for the API request, with images that refer to the
+    blob store replaced by their base64 data. Only the messages holding such images
+    are copied, and the index says which those are without a pass over the history.
+    """
+    resolved = list(messages)
+    contents_by_position: dict[int, set[int]] = {}
+    for position, content, image in image_index:
+        if image["source"].get("type") == BLOB_SOURCE_TYPE:
+            contents_by_position.setdefault(position, set()).add(id(content))
+    for position, content_ids in contents_by_position.items():
+        message = resolved[position]
+        resolved[position] = {
+            **message,
+            "content": [
                 {
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": "image/png",
-                        "data": result.base64_image,
-                    },
+                    **item,
+                    "content": [
+                        blob_store.resolve(block)
+                        if isinstance(block, dict) and block.get("type") == "image"
+                        else block
+                        for block in item["content"]
+                    ],
                 }
-            )
+                if isinstance(item, dict) and id(item.get("content")) in content_ids
+                else item
+                for item in message["content"]
+            ],
+        }
+    return resolved
+
+
+def _with_cache_breakpoints(
+    messages: list[BetaMessageParam],
+) -> list[BetaMessageParam]:
+    """
+    Return a copy of `messages` with a cache breakpoint on the last block of each
+    of the CACHED_USER_TURNS most recent user turns. The older of the two was the
+    newest turn on the previous step, so the prefix up to it is read back from the
+    cache, while the newest turn writes the prefix the next step will read.
+
+    Breakpoints are placed after images have been filtered; since images are
+    removed in chunks, the cached prefix only changes once per chunk.
+    """
+    cached = list(messages)
+    turns_remaining = CACHED_USER_TURNS
+    for index in range(len(cached) - 1, -1, -1):
+        message = cached[index]
+        if not turns_remaining:
+            break
+        if message["role"] != "user" or not message["content"]:
+            continue
+        content = message["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        last_block = content[-1]
+        if not isinstance(last_block, dict):
+            last_block = last_block.model_dump(exclude_none=True)
+        cached[index] = {
+            **message,
+            "content": [*content[:-1], {**last_block, "cache_control": EPHEMERAL}],
+        }
+        turns_remaining -= 1
+    return cached
+
+
+def _with_tools_cache_breakpoint(
+    tools: list[BetaToolUnionParam],
+) -> list[BetaToolUnionParam]:
+    """Mark the last tool definition, which caches all of them after the system prompt."""
+    if not tools:
+        return tools
+    return [*tools[:-1], {**tools[-1], "cache_control": EPHEMERAL}]
+
+
+def _make_api_tool_result(
+    result: ToolResult, tool_use_id: str, blob_store: BlobStore | None = None
+) -> BetaToolResultBlockParam:
+    """
+    Convert an agent ToolResult to an API ToolResultBlockParam. A screenshot held
+    in `blob_store` becomes an image block that refers to it by digest. A failed
+    call keeps its output and screenshot, e.g. where a batch left the screen.
+    A command's exit code and resource use are sent even if it printed nothing,
+    and a command that failed makes the result an error.
+    """
+    stats = result.stats if isinstance(result, CLIResult) else None
+    texts = [text for text in (result.output, result.error) if text]
+    if texts:
+        texts[0] = _maybe_prepend_system_tool_result(result, texts[0])
+    elif result.system:
+        texts = [f"<system>{result.system}</system>"]
+    tool_result_content: list[BetaTextBlockParam | BetaImageBlockParam] = [
+        {"type": "text", "text": text} for text in texts
+    ]
+    if result.base64_image:
+        tool_result_content.append(
+            {
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": "image/png",
+                    "data": result.base64_image,
+                },
+            }
+        )
+    elif result.image_digest and blob_store:
+        tool_result_content.append(
+            cast(BetaImageBlockParam, blob_store.image_block(result.image_digest))
+        )
     return {
         "type": "tool_result",
         "content": tool_result_content,
         "tool_use_id": tool_use_id,
-        "is_error": is_error,
+        "is_error": bool(result.error) or bool(stats and stats.failed),
     }
 
 
@@ -3,36 +3,62 @@ Entrypoint for streamlit, see https://docs.streamlit.io/
 """
 
 import asyncio
+import atexit
 import base64
 import os
+import json
 import subprocess
 import platform
+from collections.abc import Callable
+from dataclasses import dataclass
 from datetime import datetime
 from enum import StrEnum
 from functools import partial
 from pathlib import Path
-from typing import cast
+from typing import Any, cast
 
 import streamlit as st
 from anthropic import APIResponse
 from anthropic.types import (
     TextBlock,
 )
-from anthropic.types.beta import BetaMessage, BetaTextBlock, BetaToolUseBlock
+from anthropic.types.beta import (
+    BetaContentBlock,
+    BetaMessage,
+    BetaTextBlock,
+    BetaToolUseBlock,
+    BetaUsage,
+)
 from anthropic.types.tool_use_block import ToolUseBlock
 from streamlit.delta_generator import DeltaGenerator
 
 # Change to absolute imports
+from computer_use.blobs import DEFAULT_MEMORY_LIMIT, BlobStore, default_spill_dir
+from computer_use.clients import ClientRegistry, httpx
+from computer_use.history import MessageHistory
 from computer_use.loop import (
     PROVIDER_TO_DEFAULT_MODEL_NAME,
     APIProvider,
     sampling_loop,
 )
-from computer_use.tools import ToolResult
+from computer_use.tools import (
+    BashTool,
+    ComputerTool,
+    EditTool,
+    ToolCollection,
+    ToolResult,
+)
+from computer_use.tools.base import ToolError
+from computer_use.tools.capture import get_capture_backend
 
 # Use appropriate config directory for Windows vs Unix
 CONFIG_DIR = Path(os.path.expandvars("%APPDATA%\\anthropic")) if platform.system() == "Windows" else Path("~/.anthropic").expanduser()
 API_KEY_FILE = CONFIG_DIR / "api_key"
+# screenshots beyond this many bytes in memory are spilled to BLOB_SPILL_DIR
+BLOB_MEMORY_LIMIT = DEFAULT_MEMORY_LIMIT
+BLOB_SPILL_DIR = default_spill_dir()
+# how often a running agent gives streamlit the chance to ask for a rerun or stop
+RERUN_POLL_INTERVAL = 0.2
 STREAMLIT_STYLE = """
 <style>
     /* Hide chat input while agent loop is running */
@@ -59,7 +85,7 @@ class Sender(StrEnum):
 def initialize_session_state():
     """Initialize all session state variables with default values."""
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = MessageHistory()
     if "api_key" not in st.session_state:
         st.session_state.api_key = load_from_storage("api_key") or os.getenv(
             "ANTHROPIC_API_KEY", ""
@@ -84,6 +110,35 @@ def initialize_session_state():
         st.session_state.custom_system_prompt = load_from_storage("system_prompt") or ""
     if "hide_images" not in st.session_state:
         st.session_state.hide_images = False
+    if "stream_responses" not in st.session_state:
+        st.session_state.stream_responses = False
+    if "usage" not in st.session_state:
+        st.session_state.usage = []
+    if "agent_stopped" not in st.session_state:
+        st.session_state.agent_stopped = False
+
+
+@st.cache_resource
+def get_client_registry() -> ClientRegistry:
+    """One registry per process, shared by every session and rerun."""
+    return ClientRegistry()
+
+
+@st.cache_resource
+def get_blob_store() -> BlobStore:
+    """Screenshots of every session, stored once per distinct frame."""
+    store = BlobStore(memory_limit=BLOB_MEMORY_LIMIT, spill_dir=BLOB_SPILL_DIR)
+    atexit.register(store.close)
+    return store
+
+
+def get_tool_collection() -> ToolCollection:
+    """The session's tools, kept across turns so what they learn carries over."""
+    if "tool_collection" not in st.session_state:
+        st.session_state.tool_collection = ToolCollection(
+            ComputerTool(), BashTool(), EditTool()
+        )
+    return st.session_state.tool_collection
 
 
 def _reset_model():
@@ -145,10 +200,86 @@ async def main():
             ),
         )
         st.checkbox("Hide screenshots", key="hide_images")
+        st.checkbox(
+            "Stream responses",
+            key="stream_responses",
+            help="Show text as it is generated and start each tool as soon as its call is complete",
+        )
+
+        if st.session_state.usage:
+            st.caption(_format_cache_usage(st.session_state.usage))
+
+        stats = get_client_registry().stats
+        st.caption(
+            f"API clients: {stats.clients_created} created, {stats.clients_reused} reused. "
+            f"Connections: {stats.connections_opened} opened, {stats.connections_reused} reused."
+        )
+        try:
+            capture_backend = get_capture_backend()
+        except ToolError as e:
+            st.caption(f"Screen capture: {e.message}")
+        else:
+            capture_stats = capture_backend.stats
+            st.caption(
+                f"Screen capture ({capture_backend.name}): {capture_stats.captures} captures, "
+                f"{capture_stats.mean * 1000:.0f}ms mean, {capture_stats.slowest * 1000:.0f}ms slowest."
+            )
+        if "tool_collection" in st.session_state:
+            computer = cast(ComputerTool, get_tool_collection().tool_map["computer"])
+            settle_stats = computer.settle_stats
+            st.caption(
+                f"Screen settling, last {settle_stats.waits} actions: "
+                f"{settle_stats.mean * 1000:.0f}ms mean, {settle_stats.slowest * 1000:.0f}ms "
+                f"slowest, {settle_stats.timeouts} timed out."
+            )
+            pasted, typed = computer.paste_typing.stats, computer.keystroke_typing.stats
+            st.caption(
+                f"Text entry: {pasted.characters} characters pasted at "
+                f"{pasted.chars_per_second:.0f}/s, {typed.characters} typed at "
+                f"{typed.chars_per_second:.0f}/s."
+            )
+            if computer.frame_buffer:
+                frame_stats = computer.frame_buffer.stats
+                st.caption(
+                    f"Background capture, last turn: {frame_stats.frames} frames, "
+                    f"{frame_stats.unchanged} unchanged, {frame_stats.encodes} encoded, "
+                    f"{frame_stats.encode_reuses} encodings reused. "
+                    f"{frame_stats.cpu_fraction:.0%} of a core spent capturing."
+                )
+        blob_stats = get_blob_store().stats
+        st.caption(
+            f"Screenshots: {blob_stats.blobs} stored, {blob_stats.duplicates} duplicates. "
+            f"{blob_stats.memory_bytes / 2**20:.1f} MiB in memory, "
+            f"{blob_stats.spilled_bytes / 2**20:.1f} MiB on disk, "
+            f"{blob_stats.evicted} released."
+        )
+        if isinstance(st.session_state.messages, MessageHistory):
+            dedup_stats = st.session_state.messages.deduplicator.stats
+            st.caption(
+                f"Repeated screenshots: {dedup_stats.images_avoided} left out of the "
+                f"history, {dedup_stats.bytes_avoided / 2**20:.1f} MiB of image data avoided."
+            )
+
+        st.button(
+            "Stop",
+            on_click=_stop_agent,
+            help="Cancel the request in flight and wait for your next message",
+        )
 
         if st.button("Reset", type="primary"):
             with st.spinner("Resetting..."):
+                if isinstance(st.session_state.messages, MessageHistory):
+                    get_blob_store().release_image_blocks(
+                        image for _, _, image in st.session_state.messages.image_index
+                    )
+                if "tool_collection" in st.session_state:
+                    await st.session_state.tool_collection.aclose()
+                # the clients of this session's loop, which keeps running
+                await get_client_registry().aclose()
+                event_loop = st.session_state.pop("event_loop", None)
                 st.session_state.clear()
+                if event_loop:
+                    st.session_state.event_loop = event_loop
                 initialize_session_state()
 
                 # Windows-compatible process management
@@ -168,6 +299,7 @@ async def main():
             return
         else:
             st.session_state.auth_validated = True
+            st.session_state.warm_up_pending = True
 
     chat, http_logs = st.tabs(["Chat", "HTTP Exchange Logs"])
     new_message = st.chat_input(
@@ -197,8 +329,16 @@ async def main():
         for identity, response in st.session_state.responses.items():
             _render_api_response(response, identity, http_logs)
 
+        if st.session_state.pop("warm_up_pending", False):
+            # open the connection before the user sends their first message, once
+            # the page is drawn so a slow endpoint doesn't hold it up
+            await get_client_registry().warm_up(
+                st.session_state.provider, st.session_state.api_key
+            )
+
         # render past chats
         if new_message:
+            st.session_state.agent_stopped = False
             st.session_state.messages.append(
                 {
                     "role": Sender.USER,
@@ -216,25 +356,75 @@ async def main():
             # we don't have a user message to respond to, exit early
             return
 
-        with st.spinner("Running Agent..."):
-            # run the agent sampling loop with the newest message
-            st.session_state.messages = await sampling_loop(
-                system_prompt_suffix=st.session_state.custom_system_prompt,
-                model=st.session_state.model,
-                provider=st.session_state.provider,
-                messages=st.session_state.messages,
-                output_callback=partial(_render_message, Sender.BOT),
-                tool_output_callback=partial(
-                    _tool_output_callback, tool_state=st.session_state.tools
-                ),
-                api_response_callback=partial(
-                    _api_response_callback,
-                    tab=http_logs,
-                    response_state=st.session_state.responses,
-                ),
-                api_key=st.session_state.api_key,
-                only_n_most_recent_images=st.session_state.only_n_most_recent_images,
-            )
+        if st.session_state.agent_stopped:
+            # stopped by the user, wait for their next message
+            return
+
+        stop_event = asyncio.Event()
+        watcher = asyncio.create_task(_stop_on_rerun(stop_event, st.empty()))
+        try:
+            with st.spinner("Running Agent..."):
+                if st.session_state.stream_responses:
+                    output_callback = _StreamedOutputRenderer()
+                else:
+                    output_callback = partial(_render_message, Sender.BOT)
+                # run the agent sampling loop with the newest message
+                st.session_state.messages = await sampling_loop(
+                    system_prompt_suffix=st.session_state.custom_system_prompt,
+                    model=st.session_state.model,
+                    provider=st.session_state.provider,
+                    messages=st.session_state.messages,
+                    output_callback=output_callback,
+                    tool_output_callback=partial(
+                        _tool_output_callback,
+                        tool_state=st.session_state.tools,
+                        output_callback=output_callback,
+                    ),
+                    api_response_callback=partial(
+                        _api_response_callback,
+                        tab=http_logs,
+                        response_state=st.session_state.responses,
+                    ),
+                    api_key=st.session_state.api_key,
+                    only_n_most_recent_images=st.session_state.only_n_most_recent_images,
+                    client_registry=get_client_registry(),
+                    stream=st.session_state.stream_responses,
+                    usage_callback=st.session_state.usage.append,
+                    blob_store=get_blob_store(),
+                    stop_event=stop_event,
+                    tool_collection=get_tool_collection(),
+                )
+        finally:
+            control = watcher.result() if watcher.done() else None
+            watcher.cancel()
+        if control is not None:
+            # let streamlit carry out the rerun or stop it asked for
+            raise control
+
+
+def _stop_agent():
+    st.session_state.agent_stopped = True
+
+
+async def _stop_on_rerun(
+    stop_event: asyncio.Event, placeholder: DeltaGenerator
+) -> BaseException | None:
+    """
+    Set `stop_event` once streamlit asks to rerun or stop the script, after the
+    Stop button or any other widget was used, and return the exception streamlit
+    raised for it. Streamlit raises that only while the script sends something to
+    the browser, which it doesn't while awaiting an API request, so the
+    placeholder is emptied every RERUN_POLL_INTERVAL to give it the chance.
+    """
+    while True:
+        await asyncio.sleep(RERUN_POLL_INTERVAL)
+        try:
+            placeholder.empty()
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:  # streamlit's RerunException and StopException
+            stop_event.set()
+            return e
 
 
 def validate_auth(provider: APIProvider, api_key: str | None):
@@ -289,39 +479,138 @@ def save_to_storage(filename: str, data: str) -> None:
 def _api_response_callback(
     response: APIResponse[BetaMessage],
     tab: DeltaGenerator,
-    response_state: dict[str, APIResponse[BetaMessage]],
+    response_state: dict[str, "_HttpExchange"],
 ):
     """
     Handle an API response by storing it to state and rendering it.
     """
     response_id = datetime.now().isoformat()
-    response_state[response_id] = response
-    _render_api_response(response, response_id, tab)
+    exchange = _HttpExchange.from_response(response)
+    response_state[response_id] = exchange
+    _render_api_response(exchange, response_id, tab)
+
+
+@dataclass(frozen=True)
+class _HttpExchange:
+    """
+    What the HTTP logs show of an API call. The request body is kept with its image
+    data elided, since every request carries the most recent screenshots again.
+    """
+
+    request_line: str
+    request_headers: dict[str, str]
+    request_body: Any
+    status_code: int
+    response_headers: dict[str, str]
+    # None for streamed responses, whose content is shown in the chat
+    response_body: str | None
+
+    @classmethod
+    def from_response(cls, response: APIResponse[BetaMessage]) -> "_HttpExchange":
+        try:
+            response_body = response.http_response.text
+        except httpx.ResponseNotRead:
+            response_body = None
+        return cls(
+            request_line=f"{response.http_request.method} {response.http_request.url}",
+            request_headers=dict(response.http_request.headers),
+            request_body=_elide_image_data(response.http_request.read().decode()),
+            status_code=response.http_response.status_code,
+            response_headers=dict(response.headers),
+            response_body=response_body,
+        )
+
+
+def _elide_image_data(body: str) -> Any:
+    """Replace base64 image data in a JSON request body with its size."""
+    try:
+        parsed = json.loads(body)
+    except ValueError:
+        return body
+
+    def elide(value: Any) -> Any:
+        if isinstance(value, list):
+            return [elide(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        if value.get("type") == "base64" and isinstance(value.get("data"), str):
+            return {**value, "data": f"<{len(value['data'])} base64 characters>"}
+        return {key: elide(item) for key, item in value.items()}
+
+    return elide(parsed)
 
 
 def _tool_output_callback(
-    tool_output: ToolResult, tool_id: str, tool_state: dict[str, ToolResult]
+    tool_output: ToolResult,
+    tool_id: str,
+    tool_state: dict[str, ToolResult],
+    output_callback: Callable[[BetaContentBlock], None] | None = None,
 ):
     """Handle a tool output by storing it to state and rendering it."""
     tool_state[tool_id] = tool_output
+    if isinstance(output_callback, _StreamedOutputRenderer):
+        output_callback.end_message()
     _render_message(Sender.TOOL, tool_output)
 
 
+class _StreamedOutputRenderer:
+    """
+    Output callback for streamed responses, which arrive as many small text blocks.
+    Consecutive text is rendered into a single chat message that grows in place.
+    """
+
+    def __init__(self):
+        self._placeholder: DeltaGenerator | None = None
+        self._text = ""
+
+    def __call__(self, block: BetaContentBlock):
+        if not isinstance(block, BetaTextBlock):
+            self.end_message()
+            _render_message(Sender.BOT, block)
+            return
+        if self._placeholder is None:
+            self._placeholder = st.chat_message(Sender.BOT).empty()
+        self._text += block.text
+        self._placeholder.markdown(self._text)
+
+    def end_message(self):
+        self._placeholder = None
+        self._text = ""
+
+
+def _format_cache_usage(usage: list[BetaUsage]) -> str:
+    """Summarize prompt cache reads and writes of the last step and the session."""
+    last = usage[-1]
+    read = sum(step.cache_read_input_tokens or 0 for step in usage)
+    written = sum(step.cache_creation_input_tokens or 0 for step in usage)
+    uncached = sum(step.input_tokens for step in usage)
+    total = read + written + uncached
+    hit_rate = read / total if total else 0.0
+    return (
+        f"Prompt cache, last step: {last.cache_read_input_tokens or 0} read, "
+        f"{last.cache_creation_input_tokens or 0} written, {last.input_tokens} uncached. "
+        f"Session: {hit_rate:.0%} of {total} input tokens read from cache."
+    )
+
+
 def _render_api_response(
-    response: APIResponse[BetaMessage], response_id: str, tab: DeltaGenerator
+    exchange: _HttpExchange, response_id: str, tab: DeltaGenerator
 ):
     """Render an API response to a streamlit tab"""
     with tab:
         with st.expander(f"Request/Response ({response_id})"):
             newline = "\n\n"
             st.markdown(
-                f"`{response.http_request.method} {response.http_request.url}`{newline}{newline.join(f'`{k}: {v}`' for k, v in response.http_request.headers.items())}"
+                f"`{exchange.request_line}`{newline}{newline.join(f'`{k}: {v}`' for k, v in exchange.request_headers.items())}"
             )
-            st.json(response.http_request.read().decode())
+            st.json(exchange.request_body)
             st.markdown(
-                f"`{response.http_response.status_code}`{newline}{newline.join(f'`{k}: {v}`' for k, v in response.headers.items())}"
+                f"`{exchange.status_code}`{newline}{newline.join(f'`{k}: {v}`' for k, v in exchange.response_headers.items())}"
             )
-            st.json(response.http_response.text)
+            if exchange.response_body is None:
+                st.markdown("`streamed response, its content is shown in the chat`")
+            else:
+                st.json(exchange.response_body)
 
 
 def _render_message(
@@ -352,8 +641,15 @@ def _render_message(
                     st.markdown(message.output)
             if message.error:
                 st.error(message.error)
+            if stats := getattr(message, "stats", None):
+                st.caption(stats.summary())
             if message.base64_image and not st.session_state.hide_images:
                 st.image(base64.b64decode(message.base64_image))
+            if message.image_digest and not st.session_state.hide_images:
+                try:
+                    st.image(get_blob_store().get(message.image_digest))
+                except KeyError:
+                    st.caption("Screenshot released, it is no longer in the history.")
         elif isinstance(message, BetaTextBlock) or isinstance(message, TextBlock):
             st.write(message.text)
         elif isinstance(message, BetaToolUseBlock) or isinstance(message, ToolUseBlock):
@@ -362,5 +658,15 @@ def _render_message(
             st.markdown(message)
 
 
+def _session_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Async API clients are bound to the event loop that created them, so each
+    session keeps one loop across reruns instead of a fresh one per asyncio.run.
+    """
+    if "event_loop" not in st.session_state:
+        st.session_state.event_loop = asyncio.new_event_loop()
+    return st.session_state.event_loop
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    _session_event_loop().run_until_complete(main())
@@ -1,14 +1,17 @@
-from .base import CLIResult, ToolResult
+from .base import CLIResult, CommandStats, ConcurrencyClass, ToolResult
 from .bash import BashTool
-from .collection import ToolCollection
+from .collection import ToolCollection, ToolScheduler
 from .computer import ComputerTool
 from .edit import EditTool
 
 __ALL__ = [
     BashTool,
     CLIResult,
+    CommandStats,
     ComputerTool,
+    ConcurrencyClass,
     EditTool,
     ToolCollection,
     ToolResult,
+    ToolScheduler,
 ]
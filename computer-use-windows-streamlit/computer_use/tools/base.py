@@ -1,13 +1,29 @@
+import os
 from abc import ABCMeta, abstractmethod
 from dataclasses import dataclass, fields, replace
-from typing import Any
+from enum import StrEnum
+from typing import Any, ClassVar
 
 from anthropic.types.beta import BetaToolUnionParam
 
 
+class ConcurrencyClass(StrEnum):
+    """How calls to a tool may overlap with other tool calls of the same turn."""
+
+    # the screen, mouse and keyboard are shared, so calls run one at a time, in order
+    EXCLUSIVE_DESKTOP = "desktop"
+    # calls on the same path run in order, calls on different paths overlap
+    PER_PATH = "path"
+    # calls that share the tool's shell session run in order, and as a command may
+    # touch any file, also in order with PER_PATH calls
+    PER_SESSION = "session"
+
+
 class BaseAnthropicTool(metaclass=ABCMeta):
     """Abstract base class for Anthropic-defined tools."""
 
+    concurrency: ClassVar[ConcurrencyClass] = ConcurrencyClass.EXCLUSIVE_DESKTOP
+
     @abstractmethod
     def __call__(self, **kwargs) -> Any:
         """Executes the tool with the given arguments."""
@@ -19,6 +35,21 @@ class BaseAnthropicTool(metaclass=ABCMeta):
     ) -> BetaToolUnionParam:
         raise NotImplementedError
 
+    async def suspend(self):
+        """Stop background work until the next call, keeping the tool's state."""
+
+    async def aclose(self):
+        """Release anything the tool keeps running between calls."""
+
+    def lock_key(self, tool_input: dict[str, Any]) -> str:
+        """Calls with the same lock key run one at a time, in the order they were made."""
+        if self.concurrency == ConcurrencyClass.PER_PATH:
+            path = str(tool_input.get("path", ""))
+            return f"{ConcurrencyClass.PER_PATH}:{os.path.normcase(os.path.normpath(path))}"
+        if self.concurrency == ConcurrencyClass.PER_SESSION:
+            return f"{ConcurrencyClass.PER_SESSION}:{id(self)}"
+        return ConcurrencyClass.EXCLUSIVE_DESKTOP.value
+
 
 @dataclass(kw_only=True, frozen=True)
 class ToolResult:
@@ -27,6 +58,10 @@ class ToolResult:
     output: str | None = None
     error: str | None = None
     base64_image: str | None = None
+    # set instead of base64_image once the screenshot has been moved to a BlobStore
+    image_digest: str | None = None
+    # perceptual hash of the screenshot, for spotting near-identical screens
+    image_hash: str | None = None
     system: str | None = None
 
     def __bool__(self):
@@ -46,6 +81,8 @@ class ToolResult:
             output=combine_fields(self.output, other.output),
             error=combine_fields(self.error, other.error),
             base64_image=combine_fields(self.base64_image, other.base64_image, False),
+            image_digest=combine_fields(self.image_digest, other.image_digest, False),
+            image_hash=combine_fields(self.image_hash, other.image_hash, False),
             system=combine_fields(self.system, other.system),
         )
 
@@ -54,9 +91,47 @@ class ToolResult:
         return replace(self, **kwargs)
 
 
+@dataclass(frozen=True)
+class CommandStats:
+    """How a shell command ended and what it and the processes it started used."""
+
+    exit_code: int | None
+    wall_time: float
+    # user and system time of the shell and every process the command started
+    cpu_time: float | None = None
+    # the most resident memory the command's processes held at once, sampled
+    peak_rss: int | None = None
+    # the timeout, in seconds, after which the command was interrupted
+    interrupted_after: float | None = None
+
+    @property
+    def failed(self) -> bool:
+        """Whether the command exited with a non-zero code or was interrupted."""
+        return bool(self.exit_code) or self.interrupted_after is not None
+
+    def summary(self) -> str:
+        parts = [
+            "exit code unknown"
+            if self.exit_code is None
+            else f"exit code {self.exit_code}",
+            f"{self.wall_time:.2f}s",
+        ]
+        if self.interrupted_after is not None:
+            parts.insert(0, f"interrupted after {self.interrupted_after:g}s")
+        if self.cpu_time is not None:
+            parts.append(f"{self.cpu_time:.2f}s CPU")
+        if self.peak_rss is not None:
+            parts.append(f"peak RSS {self.peak_rss / 2**20:.1f} MiB")
+        return ", ".join(parts)
+
+
+@dataclass(kw_only=True, frozen=True)
 class CLIResult(ToolResult):
     """A ToolResult that can be rendered as a CLI output."""
 
+    # set by the bash tool for each command it runs
+    stats: CommandStats | None = None
+
 
 class ToolFailure(ToolResult):
     """A ToolResult that represents a failure."""
@@ -1,172 +1,346 @@
 """Tool for executing shell commands."""
 
 import asyncio
+import locale
 import os
 import platform
+import shutil
+import signal
 import subprocess
-import threading
-from queue import Queue
+import tempfile
+import time
+from abc import ABCMeta, abstractmethod
 from typing import ClassVar, Literal
 
+import psutil
 from anthropic.types.beta import BetaToolBash20241022Param
 
-from .base import BaseAnthropicTool, CLIResult, ToolError, ToolResult
-
-
-class _WindowsShellSession:
-    """A Windows-specific shell session using cmd.exe."""
-    def __init__(self):
-        self._started = False
-        self._timed_out = False
-        self._process = None
-        self._output_queue = Queue()
-        self._error_queue = Queue()
-        self._timeout = 120.0
-        self._sentinel = "<<exit>>"
-
-    async def start(self):
-        if self._started:
-            return
+from .base import (
+    BaseAnthropicTool,
+    CLIResult,
+    CommandStats,
+    ConcurrencyClass,
+    ToolError,
+    ToolResult,
+)
+
+
+# how much of a pipe is read at a time; a command's output arrives in as few
+# reads as the pipe allows instead of one line at a time
+READ_CHUNK_SIZE = 64 * 1024
+# the beginning and end of each stream a result shows, as much as run.py's
+# MAX_RESPONSE_LEN between them; longer output is written to a file instead
+OUTPUT_HEAD_SIZE = 8 * 1024
+OUTPUT_TAIL_SIZE = 8 * 1024
+
+SENTINEL = "<<exit>>"
+# cmd.exe with /Q does not echo the commands it reads, so the sentinel only
+# appears in the output once the command has finished
+WINDOWS_SHELL = ("cmd.exe", "/Q")
+# the sentinel is echoed to both pipes, so that neither is read before the
+# command's output on it is complete, followed on stdout by the exit status.
+# cmd expands %errorlevel% when it reads a line, so the sentinel goes on a line
+# of its own, read after the command has run; carets keep cmd from parsing < and >
+WINDOWS_SENTINEL_SUFFIX = (
+    "\necho ^<^<exit^>^>%errorlevel% & echo ^<^<exit^>^> 1>&2"
+)
+UNIX_SHELL = ("/bin/bash",)
+# on a line of its own, so that commands ending in & or a comment don't swallow it
+UNIX_SENTINEL_SUFFIX = "\necho \"<<exit>>$?\"; echo '<<exit>>' >&2"
+# how often the processes of a running command are sampled for their memory
+RESOURCE_SAMPLE_INTERVAL = 0.05
+# how long an interrupted command has to stop, and then its killed processes, before
+# the shell is given up on
+INTERRUPT_GRACE_PERIOD = 2.0
+
+
+class _OutputCapture:
+    """
+    One stream of a command's output, within a fixed memory budget: the first
+    `head_size` and the last `tail_size` bytes are kept. Once the stream outgrows
+    them, all of it is written to a temporary file in `spill_dir`, which is left
+    in place for the model to read.
+    """
 
-        # Start cmd.exe process
-        self._process = subprocess.Popen(
-            "cmd.exe",
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
+    def __init__(
+        self,
+        head_size: int = OUTPUT_HEAD_SIZE,
+        tail_size: int = OUTPUT_TAIL_SIZE,
+        spill_dir: str | None = None,
+    ):
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.spill_dir = spill_dir
+        self.size = 0
+        self.path: str | None = None
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._file = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.path is not None
+
+    @property
+    def head(self) -> bytes:
+        return bytes(self._head)
+
+    @property
+    def tail(self) -> bytes:
+        return bytes(self._tail)
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self._file:
+            self._file.write(data)
+        room = self.head_size - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        self._tail += data
+        if len(self._tail) > self.tail_size:
+            if self._file is None:
+                self._spill()
+            del self._tail[: -self.tail_size]
+
+    def getvalue(self) -> bytes:
+        """Everything written, if the stream fit within the budget."""
+        if self.truncated:
+            raise ValueError(f"output was spilled to {self.path}")
+        return bytes(self._head + self._tail)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _spill(self):
+        # everything so far is still in memory, the head and the untrimmed tail
+        fd, self.path = tempfile.mkstemp(
+            prefix="bash-output-", suffix=".txt", dir=self.spill_dir
         )
-        
-        # Start threads to read output and error streams
-        self._start_output_reader()
-        self._start_error_reader()
-        
-        self._started = True
-
-    def _start_output_reader(self):
-        def reader():
-            while True:
-                line = self._process.stdout.readline()
-                if not line:
-                    break
-                self._output_queue.put(line)
-        
-        thread = threading.Thread(target=reader, daemon=True)
-        thread.start()
-
-    def _start_error_reader(self):
-        def reader():
-            while True:
-                line = self._process.stderr.readline()
-                if not line:
-                    break
-                self._error_queue.put(line)
-        
-        thread = threading.Thread(target=reader, daemon=True)
-        thread.start()
-
-    def stop(self):
-        """Terminate the shell."""
-        if not self._started:
-            raise ToolError("Session has not started.")
-        if self._process.poll() is not None:
-            return
-        self._process.terminate()
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._head)
+        self._file.write(self._tail)
 
-    async def run(self, command: str):
-        """Execute a command in the shell."""
-        if not self._started:
-            raise ToolError("Session has not started.")
-        if self._process.poll() is not None:
-            return ToolResult(
-                system="tool must be restarted",
-                error=f"shell has exited with returncode {self._process.returncode}",
-            )
-
-        # Clear queues
-        while not self._output_queue.empty():
-            self._output_queue.get()
-        while not self._error_queue.empty():
-            self._error_queue.get()
 
-        # Send command with sentinel
-        self._process.stdin.write(f"{command} & echo {self._sentinel}\n")
-        self._process.stdin.flush()
+class _SentinelReader:
+    """
+    Reads a pipe in chunks up to the next sentinel, passing the data before it on
+    to an _OutputCapture. Only the last few bytes, where a sentinel split across
+    two reads can start, are held back between chunks, so long output is scanned
+    once and never held in full.
+    """
 
-        # Read output until sentinel
-        output_lines = []
-        error_lines = []
-        timeout = self._timeout
-        start_time = asyncio.get_event_loop().time()
+    def __init__(self, stream: asyncio.StreamReader, sentinel: bytes):
+        self._stream = stream
+        self._sentinel = sentinel
+        self._buffer = bytearray()
 
+    async def read_until_sentinel(self, capture: _OutputCapture) -> bytes:
+        """
+        Read into `capture` up to the next sentinel, waiting for it to arrive, and
+        return the rest of the sentinel's line, such as the exit status.
+        """
         while True:
-            current_time = asyncio.get_event_loop().time()
-            if current_time - start_time > timeout:
-                self._timed_out = True
-                raise ToolError(
-                    f"timed out: shell has not returned in {timeout} seconds and must be restarted"
-                )
+            index = self._buffer.find(self._sentinel)
+            if index != -1:
+                capture.write(bytes(self._buffer[:index]))
+                del self._buffer[:index]
+                end = self._buffer.find(b"\n", len(self._sentinel))
+                if end != -1:
+                    trailer = bytes(self._buffer[len(self._sentinel) : end]).strip()
+                    del self._buffer[: end + 1]
+                    return trailer
+            else:
+                keep = len(self._sentinel) - 1
+                if len(self._buffer) > keep:
+                    capture.write(bytes(self._buffer[:-keep]))
+                    del self._buffer[:-keep]
+            chunk = await self._stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise ToolError("shell has exited before the command finished")
+            self._buffer += chunk
+
+
+class _ResourceMonitor:
+    """
+    Measures what the processes a command starts under the shell use.
+
+    CPU time is the growth of the shell's own times and, on Unix, of those of the
+    children it has waited for, which cover everything the command ran to
+    completion. Resident memory, and the CPU time of processes nothing waited for
+    (on Windows, all of them), are sampled every `interval` seconds while the
+    command runs, so processes shorter than that can be missed and commands that
+    finish within it have no peak memory.
+    """
 
-            # Check for output
-            try:
-                line = self._output_queue.get_nowait()
-                if self._sentinel in line:
-                    break
-                output_lines.append(line)
-            except:
-                pass
+    def __init__(self, pid: int, interval: float = RESOURCE_SAMPLE_INTERVAL):
+        self._shell = psutil.Process(pid)
+        self._interval = interval
+        self._started_cpu = self._shell_cpu()
+        self._started_own_cpu = self._own_cpu()
+        # the last CPU time seen of each process, by pid
+        self._sampled_cpu: dict[int, float] = {}
+        self._peak_rss: int | None = None
+        self._task = asyncio.create_task(self._sample_until_cancelled())
+
+    async def stop(self) -> tuple[float | None, int | None]:
+        """The command's CPU time and peak resident memory, None if the shell is gone."""
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        try:
+            waited_for = self._shell_cpu() - self._started_cpu
+            sampled = self._own_cpu() - self._started_own_cpu
+        except psutil.NoSuchProcess:
+            return None, None
+        # what was waited for is exact, the samples only count what they saw
+        sampled += sum(self._sampled_cpu.values())
+        return max(waited_for, sampled), self._peak_rss
+
+    def _shell_cpu(self) -> float:
+        times = self._shell.cpu_times()
+        return times.user + times.system + times.children_user + times.children_system
+
+    def _own_cpu(self) -> float:
+        times = self._shell.cpu_times()
+        return times.user + times.system
+
+    async def _sample_until_cancelled(self):
+        # commands that finish within an interval are not sampled at all, the
+        # tree walk would cost them more than they take
+        while True:
+            await asyncio.sleep(self._interval)
+            await asyncio.to_thread(self._sample)
 
-            # Check for errors
+    def _sample(self):
+        try:
+            processes = self._shell.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        rss = 0
+        for process in processes:
             try:
-                line = self._error_queue.get_nowait()
-                error_lines.append(line)
-            except:
-                pass
+                with process.oneshot():
+                    rss += process.memory_info().rss
+                    times = process.cpu_times()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            self._sampled_cpu[process.pid] = times.user + times.system
+        if processes:
+            self._peak_rss = max(self._peak_rss or 0, rss)
 
-            # Small delay to prevent busy waiting
-            await asyncio.sleep(0.1)
 
-        output = "".join(output_lines).strip()
-        error = "".join(error_lines).strip()
+class _ShellSession(metaclass=ABCMeta):
+    """
+    A shell that runs one command at a time. Each command is followed by a suffix
+    echoing the sentinel to stdout and stderr, and its output is read as it
+    arrives, so a command returns as soon as its sentinel has been echoed.
 
-        return CLIResult(output=output, error=error)
+    `shell` and `sentinel_suffix` can stand in for the platform's shell and its
+    syntax, e.g. to run the Windows session against /bin/sh.
 
+    Output too long for a result is spilled to files in a directory of the
+    session's own, which is removed with the shell when it is stopped or closed.
+    """
 
-class _UnixShellSession:
-    """A Unix-specific shell session using bash."""
+    shell: ClassVar[tuple[str, ...]]
+    sentinel_suffix: ClassVar[str]
+    # written to the shell once it has started
+    setup: ClassVar[str | None] = None
 
-    def __init__(self):
+    def __init__(
+        self,
+        shell: tuple[str, ...] | None = None,
+        sentinel_suffix: str | None = None,
+    ):
         self._started = False
         self._timed_out = False
+        self._process: asyncio.subprocess.Process | None = None
         self._timeout: float = 120.0
-        self._sentinel: str = "<<exit>>"
-        self._output_delay: float = 0.2
+        self._sentinel: str = SENTINEL
+        self._shell = shell or self.shell
+        self._sentinel_suffix = sentinel_suffix or self.sentinel_suffix
+        self._encoding = "utf-8"
+        self._spill_dir: str | None = None
 
     async def start(self):
         if self._started:
             return
 
-        self._process = await asyncio.create_subprocess_shell(
-            "/bin/bash",
+        self._spill_dir = tempfile.mkdtemp(prefix="bash-session-")
+
+        self._process = await asyncio.create_subprocess_exec(
+            *self._shell,
             stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
-            preexec_fn=os.setsid,
+            **self._spawn_options(),
         )
+        assert self._process.stdout and self._process.stderr
+        sentinel = self._sentinel.encode()
+        self._stdout = _SentinelReader(self._process.stdout, sentinel)
+        self._stderr = _SentinelReader(self._process.stderr, sentinel)
+        if self.setup:
+            assert self._process.stdin
+            self._process.stdin.write(f"{self.setup}\n".encode(self._encoding))
+            await self._process.stdin.drain()
+
         self._started = True
 
     def stop(self):
         """Terminate the shell."""
-        if not self._started:
+        if not self._started or self._process is None:
             raise ToolError("Session has not started.")
+        self._remove_spill_dir()
         if self._process.returncode is not None:
             return
         self._process.terminate()
 
-    async def run(self, command: str):
-        """Execute a command in the shell."""
-        if not self._started:
+    async def close(self):
+        """Terminate the shell and wait for it to exit."""
+        self._remove_spill_dir()
+        if self._process is None:
+            return
+        if self._process.returncode is None:
+            self._process.terminate()
+        await self._process.wait()
+
+    def _remove_spill_dir(self):
+        if self._spill_dir:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    @abstractmethod
+    def interrupt(self):
+        """
+        Interrupt the command in the foreground, the way Ctrl+C would at a
+        terminal, leaving the shell running.
+        """
+
+    def kill_children(self):
+        """Kill every process the shell has started, leaving the shell running."""
+        assert self._process
+        try:
+            children = psutil.Process(self._process.pid).children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        for child in children:
+            try:
+                child.kill()
+            except psutil.NoSuchProcess:
+                pass
+
+    async def run(self, command: str, timeout: float | None = None):
+        """
+        Execute a command in the shell. A command still running after `timeout`
+        seconds, by default the session's, is interrupted and its output so far
+        returned.
+        """
+        if not self._started or self._process is None:
             raise ToolError("Session has not started.")
         if self._process.returncode is not None:
             return ToolResult(
@@ -179,39 +353,154 @@ class _UnixShellSession:
             )
 
         assert self._process.stdin
-        assert self._process.stdout
-        assert self._process.stderr
-
+        started = time.perf_counter()
+        try:
+            monitor = _ResourceMonitor(self._process.pid)
+        except psutil.NoSuchProcess:
+            monitor = None
+        # Send command with sentinel
         self._process.stdin.write(
-            command.encode() + f"; echo '{self._sentinel}'\n".encode()
+            f"{command}{self._sentinel_suffix}\n".encode(self._encoding)
         )
         await self._process.stdin.drain()
 
+        timeout = timeout or self._timeout
+        output = _OutputCapture(spill_dir=self._spill_dir)
+        error = _OutputCapture(spill_dir=self._spill_dir)
+        reading = asyncio.gather(
+            self._stdout.read_until_sentinel(output),
+            self._stderr.read_until_sentinel(error),
+        )
+        interrupted = False
         try:
-            async with asyncio.timeout(self._timeout):
-                while True:
-                    await asyncio.sleep(self._output_delay)
-                    output = self._process.stdout._buffer.decode()
-                    if self._sentinel in output:
-                        output = output[: output.index(self._sentinel)]
-                        break
-        except asyncio.TimeoutError:
+            try:
+                status, _ = await asyncio.wait_for(asyncio.shield(reading), timeout)
+            except TimeoutError:
+                interrupted = True
+                status, _ = await self._stop_command(reading)
+        except TimeoutError:
             self._timed_out = True
             raise ToolError(
-                f"timed out: shell has not returned in {self._timeout} seconds and must be restarted",
+                f"timed out: shell has not returned in {timeout} seconds and must be restarted"
             ) from None
+        except ToolError:
+            # the pipes closed with the shell, reap it so the next run sees its returncode
+            await self._process.wait()
+            raise
+        finally:
+            output.close()
+            error.close()
+            cpu_time, peak_rss = await monitor.stop() if monitor else (None, None)
+
+        stats = CommandStats(
+            exit_code=int(status) if status.lstrip(b"-").isdigit() else None,
+            wall_time=time.perf_counter() - started,
+            cpu_time=cpu_time,
+            peak_rss=peak_rss,
+            interrupted_after=timeout if interrupted else None,
+        )
+        return CLIResult(
+            output=self._text(output),
+            error=self._text(error),
+            system=self._summary(output, error, stats),
+            stats=stats,
+        )
 
-        if output.endswith("\n"):
-            output = output[:-1]
+    async def _stop_command(self, reading: asyncio.Future):
+        """
+        Interrupt the running command, then kill what it started if it does not
+        stop, and read on to its sentinel. Raises TimeoutError if neither works,
+        when the shell itself is stuck, e.g. in a loop of builtins.
+        """
+        for stop in (self.interrupt, self.kill_children):
+            stop()
+            try:
+                return await asyncio.wait_for(
+                    asyncio.shield(reading), INTERRUPT_GRACE_PERIOD
+                )
+            except TimeoutError:
+                continue
+        reading.cancel()
+        raise TimeoutError
+
+    def _text(self, capture: _OutputCapture) -> str:
+        if not capture.truncated:
+            return self._decode(capture.getvalue())
+        omitted = capture.size - len(capture.head) - len(capture.tail)
+        return (
+            f"{self._decode(capture.head)}\n"
+            f"<{omitted:,} bytes omitted, the full stream is in {capture.path}>\n"
+            f"{self._decode(capture.tail)}"
+        )
+
+    def _summary(
+        self, output: _OutputCapture, error: _OutputCapture, stats: CommandStats
+    ) -> str:
+        summary = (
+            f"{stats.summary()}; {output.size:,} bytes of output and "
+            f"{error.size:,} bytes of errors"
+        )
+        for name, capture in (("output", output), ("errors", error)):
+            if capture.truncated:
+                summary += f"; the full {name} is in {capture.path}"
+        return summary
+
+    def _spawn_options(self) -> dict:
+        return {}
+
+    def _decode(self, data: bytes) -> str:
+        return data.decode(self._encoding, errors="replace")
+
+
+class _WindowsShellSession(_ShellSession):
+    """A Windows-specific shell session using cmd.exe."""
+
+    shell = WINDOWS_SHELL
+    sentinel_suffix = WINDOWS_SENTINEL_SUFFIX
+
+    def __init__(
+        self,
+        shell: tuple[str, ...] | None = None,
+        sentinel_suffix: str | None = None,
+    ):
+        super().__init__(shell, sentinel_suffix)
+        self._encoding = locale.getpreferredencoding(False)
+
+    def interrupt(self):
+        # Ctrl+Break reaches every process of the console group cmd.exe leads;
+        # cmd itself only abandons the command line it was running
+        assert self._process
+        self._process.send_signal(signal.CTRL_BREAK_EVENT)
+
+    def _spawn_options(self) -> dict:
+        # a process group of its own, for interrupt to send Ctrl+Break to
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+    def _decode(self, data: bytes) -> str:
+        return super()._decode(data).replace("\r\n", "\n").strip()
 
-        error = self._process.stderr._buffer.decode()
-        if error.endswith("\n"):
-            error = error[:-1]
 
-        self._process.stdout._buffer.clear()
-        self._process.stderr._buffer.clear()
+class _UnixShellSession(_ShellSession):
+    """A Unix-specific shell session using bash."""
+
+    shell = UNIX_SHELL
+    sentinel_suffix = UNIX_SENTINEL_SUFFIX
+    # bash would exit along with a command killed by SIGINT unless it traps it;
+    # trapped signals are reset for the commands it runs, so they still stop
+    setup = "trap : INT"
+
+    def interrupt(self):
+        # the foreground command and the shell share the process group; jobs put
+        # in the background ignore SIGINT, as they do in any non-interactive shell
+        assert self._process
+        os.killpg(self._process.pid, signal.SIGINT)
 
-        return CLIResult(output=output, error=error)
+    def _spawn_options(self) -> dict:
+        # its own process group, so the shell's jobs can be signalled together
+        return {"start_new_session": True}
+
+    def _decode(self, data: bytes) -> str:
+        return super()._decode(data).removesuffix("\n")
 
 
 class BashTool(BaseAnthropicTool):
@@ -220,9 +509,10 @@ class BashTool(BaseAnthropicTool):
     The tool parameters are defined by Anthropic and are not editable.
     """
 
-    _session: _WindowsShellSession | _UnixShellSession | None
+    _session: _ShellSession | None
     name: ClassVar[Literal["bash"]] = "bash"
     api_type: ClassVar[Literal["bash_20241022"]] = "bash_20241022"
+    concurrency = ConcurrencyClass.PER_SESSION
 
     def __init__(self):
         self._session = None
@@ -243,10 +533,15 @@ class BashTool(BaseAnthropicTool):
             await self._session.start()
 
         if command is not None:
-            return await self._session.run(command)
+            return await self._session.run(command, kwargs.get("timeout"))
 
         raise ToolError("no command provided.")
 
+    async def aclose(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
     def to_params(self) -> BetaToolBash20241022Param:
         return {
             "type": self.api_type,
@@ -1,11 +1,13 @@
 """Collection classes for managing multiple tools."""
 
+import asyncio
 from typing import Any
 
 from anthropic.types.beta import BetaToolUnionParam
 
 from .base import (
     BaseAnthropicTool,
+    ConcurrencyClass,
     ToolError,
     ToolFailure,
     ToolResult,
@@ -32,3 +34,62 @@ class ToolCollection:
             return await tool(**tool_input)
         except ToolError as e:
             return ToolFailure(error=e.message)
+
+    async def suspend(self):
+        await asyncio.gather(*(tool.suspend() for tool in self.tools))
+
+    async def aclose(self):
+        await asyncio.gather(*(tool.aclose() for tool in self.tools))
+
+    def lock_key(self, *, name: str, tool_input: dict[str, Any]) -> str:
+        tool = self.tool_map.get(name)
+        if not tool:
+            return name
+        return tool.lock_key(tool_input)
+
+
+class ToolScheduler:
+    """
+    Runs the tool calls of one assistant turn, starting each as soon as it is
+    submitted. A call waits for earlier calls with the same lock key, so computer
+    actions stay strictly ordered while e.g. edits to different files overlap.
+
+    A shell command may read or write any file, so it also waits for earlier
+    edits of every path, and an edit waits for earlier shell commands. Shell
+    commands and computer actions still overlap.
+    """
+
+    def __init__(self, tool_collection: ToolCollection):
+        self.tool_collection = tool_collection
+        self._last_run: dict[str, asyncio.Task[ToolResult]] = {}
+
+    def submit(self, *, name: str, tool_input: dict[str, Any]) -> asyncio.Task[ToolResult]:
+        """Start the call once its predecessors are done; await the task for its result."""
+        key = self.tool_collection.lock_key(name=name, tool_input=tool_input)
+        previous = [
+            run
+            for other, run in self._last_run.items()
+            if other == key or _conflicts(key, other)
+        ]
+        run = asyncio.create_task(
+            self._run_after(previous, name=name, tool_input=tool_input)
+        )
+        self._last_run[key] = run
+        return run
+
+    async def _run_after(
+        self,
+        previous: list[asyncio.Task[ToolResult]],
+        *,
+        name: str,
+        tool_input: dict[str, Any],
+    ) -> ToolResult:
+        if previous:
+            await asyncio.wait(previous)
+        return await self.tool_collection.run(name=name, tool_input=tool_input)
+
+
+def _conflicts(key: str, other: str) -> bool:
+    """Whether calls under different lock keys may touch the same files."""
+    classes = {key.partition(":")[0], other.partition(":")[0]}
+    return classes == {ConcurrencyClass.PER_PATH, ConcurrencyClass.PER_SESSION}
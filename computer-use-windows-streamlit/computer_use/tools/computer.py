@@ -1,30 +1,74 @@
 """Tool for computer interaction."""
 
 import asyncio
-import base64
+import math
 import os
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
 from enum import StrEnum
+from functools import lru_cache, reduce
 from pathlib import Path
-from typing import Literal, TypedDict
-from uuid import uuid4
+from typing import Any, Literal, TypedDict, cast
 
-import pyautogui
-import win32api
-import win32con
-from PIL import Image
 from anthropic.types.beta import BetaToolParam
+from PIL import Image
 
-from .base import BaseAnthropicTool, ToolError, ToolResult
-
-# Configure pyautogui
-pyautogui.FAILSAFE = True
-pyautogui.PAUSE = 0.1  # Add small delay between actions
-
-OUTPUT_DIR = os.path.join(os.environ.get('TEMP', '.'), 'outputs')
+from .base import BaseAnthropicTool, ConcurrencyClass, ToolError, ToolResult
+from .capture import CaptureBackend, Frame, get_capture_backend
+from .delta import Region, changed_regions, perceptual_hash
+from .encoding import PngOptions, encode_png_base64
+from .frames import FrameRingBuffer
+from .locate import DEFAULT_THRESHOLD, TemplateLocator
+from .settle import (
+    ChangeResult,
+    SettleDetector,
+    SettleResult,
+    SettleStats,
+    reduce_frame,
+)
+from .text_entry import ClipboardError, KeystrokeTyping, PasteTyping
+from .windows import RegionOfInterest, WindowProvider, default_window_provider
+
+try:
+    import pyautogui
+    from pyautogui import FailSafeException
+except Exception:  # pyautogui needs a display to import on Linux
+    pyautogui = None
+
+    class FailSafeException(Exception):
+        pass
+
+if pyautogui:
+    # Configure pyautogui
+    pyautogui.FAILSAFE = True
+    pyautogui.PAUSE = 0.1  # Add small delay between actions
 
 TYPING_DELAY_MS = 12
 TYPING_GROUP_SIZE = 50
 
+# how many settle measurements ComputerTool.settle_history keeps
+SETTLE_HISTORY_SIZE = 100
+
+# frames per second of the opt-in background capture, unset to turn it off
+FRAME_RATE_ENV_VAR = "COMPUTER_USE_FRAME_RATE"
+# set to 1 to send small changes as crops of the changed region
+DELTA_SCREENSHOTS_ENV_VAR = "COMPUTER_USE_DELTA_SCREENSHOTS"
+# changed regions listed in a screenshot's output, the rest are counted
+MAX_LISTED_REGIONS = 10
+# a factor of at most 1 applied to the screenshot resolution, for fewer image
+# tokens per screenshot; the zoom action shows the detail this loses
+SCREENSHOT_SCALE_ENV_VAR = "COMPUTER_USE_SCREENSHOT_SCALE"
+# zoomed images larger than this many pixels are scaled down to fit
+ZOOM_MAX_PIXELS = 1366 * 768
+# longest a wait_for_change or wait_until_stable action may block, in seconds
+MAX_WAIT_TIMEOUT = 60.0
+# matches a locate action reports
+MAX_LOCATE_MATCHES = 5
+# actions that only look at the screen, and so work without pyautogui
+VIEW_ACTIONS = ("screenshot", "zoom", "wait_for_change", "wait_until_stable", "locate")
+
 Action = Literal[
     "key",
     "type",
@@ -36,8 +80,25 @@ Action = Literal[
     "double_click",
     "screenshot",
     "cursor_position",
+    "batch",
+    "zoom",
+    "wait_for_change",
+    "wait_until_stable",
+    "locate",
 ]
 
+# actions that only send input, and so can be part of a batch
+INPUT_ACTIONS = (
+    "key",
+    "type",
+    "mouse_move",
+    "left_click",
+    "left_click_drag",
+    "right_click",
+    "middle_click",
+    "double_click",
+)
+
 class Resolution(TypedDict):
     width: int
     height: int
@@ -59,44 +120,130 @@ class ComputerToolOptions(TypedDict):
     display_width_px: int
     display_number: int | None
 
-def chunks(s: str, chunk_size: int) -> list[str]:
-    return [s[i : i + chunk_size] for i in range(0, len(s), chunk_size)]
-
 class ComputerTool(BaseAnthropicTool):
     """
     A tool that allows the agent to interact with the screen, keyboard, and mouse of the current computer.
-    Windows-compatible implementation using pyautogui and win32api.
+    Windows-compatible implementation using pyautogui for input and a pluggable
+    capture backend for screenshots.
     """
 
     name: Literal["computer"] = "computer"
     api_type: Literal["computer_20241022"] = "computer_20241022"  # Updated to match expected type
+    concurrency = ConcurrencyClass.EXCLUSIVE_DESKTOP
     width: int
     height: int
     display_num: int | None
 
-    _screenshot_delay = 2.0
+    # the screen counts as settled once it has not changed for _settle_window
+    # seconds, screenshots are taken after at most _settle_timeout seconds; read
+    # on every screenshot, like the other tunables
+    _settle_window = 0.3
+    _settle_interval = 0.05
+    _settle_timeout = 2.0
     _scaling_enabled = True
+    # text of at least this many characters is pasted rather than typed, unless the
+    # call sets paste; None always types
+    _paste_threshold: int | None = 200
+    # pause between the actions of a batch, unless the call sets pacing_ms
+    _batch_pacing = 0.05
+    # frames kept by the background capture, see FrameRingBuffer
+    _frame_buffer_capacity = 8
+    # list the regions that changed since the previous screenshot in its output
+    _report_changes = True
+    # with delta screenshots, changes covering at most this fraction of the screen
+    # are sent cropped; every so often a full frame is sent regardless, so the
+    # model is not left piecing the screen together from crops
+    _delta_max_area = 0.25
+    _max_consecutive_deltas = 5
+    # the wait actions sample the screen every _wait_interval seconds, for up to
+    # _wait_timeout unless the call sets timeout; wait_until_stable returns once
+    # the screen has not changed for _wait_stable_window seconds
+    _wait_interval = 0.1
+    _wait_timeout = 10.0
+    _wait_stable_window = 1.0
+    # see benchmarks/screenshot_encoding.py for the latency and size of other settings
+    png_options = PngOptions()
 
     @property
     def options(self) -> ComputerToolOptions:
-        width, height = self.scale_coordinates(
-            ScalingSource.COMPUTER, self.width, self.height
-        )
+        scaling = self.scaling
         return {
-            "display_width_px": width,
-            "display_height_px": height,
+            "display_width_px": scaling.target_width,
+            "display_height_px": scaling.target_height,
             "display_number": self.display_num,
         }
 
     def to_params(self) -> BetaToolParam:
-        return {"name": self.name, "type": self.api_type, **self.options}
+        # rebuilt only when the display geometry changes, which `scaling` checks
+        self.scaling
+        if self._params is None:
+            self._params = {"name": self.name, "type": self.api_type, **self.options}
+        return self._params
 
-    def __init__(self):
+    def __init__(
+        self,
+        capture_backend: CaptureBackend | None = None,
+        frame_rate: float | None = None,
+        delta_screenshots: bool | None = None,
+        screenshot_scale: float | None = None,
+        region_of_interest: RegionOfInterest | str | None = None,
+        window_provider: WindowProvider | None = None,
+    ):
         super().__init__()
+        self.capture_backend = capture_backend or get_capture_backend()
+        if frame_rate is None and os.environ.get(FRAME_RATE_ENV_VAR):
+            frame_rate = float(os.environ[FRAME_RATE_ENV_VAR])
+        # with a frame rate, screenshot actions are answered from recent frames
+        self.frame_buffer = (
+            FrameRingBuffer(
+                self.capture_backend, frame_rate, self._frame_buffer_capacity
+            )
+            if frame_rate
+            else None
+        )
+        self._last_input_at = 0.0
+        if delta_screenshots is None:
+            delta_screenshots = os.environ.get(DELTA_SCREENSHOTS_ENV_VAR) == "1"
+        self.delta_screenshots = delta_screenshots
+        # the frame the model saw last, whole or as a crop, for change detection
+        self._last_sent_frame: Frame | None = None
+        self._consecutive_deltas = 0
+        if screenshot_scale is None:
+            screenshot_scale = float(os.environ.get(SCREENSHOT_SCALE_ENV_VAR) or 1)
+        if not 0 < screenshot_scale <= 1:
+            raise ToolError(f"screenshot_scale must be in (0, 1], not {screenshot_scale}")
+        self.screenshot_scale = screenshot_scale
+        if isinstance(region_of_interest, str):
+            region_of_interest = RegionOfInterest.parse(region_of_interest)
+        # screenshots and coordinates cover only this part of the display, if set
+        self.region_of_interest = region_of_interest or RegionOfInterest.from_env()
+        self.window_provider = window_provider or default_window_provider()
+        # the region's box on the display, and its top-left corner that API
+        # coordinates are relative to
+        self._box: tuple[int, int, int, int] | None = None
+        self._origin = (0, 0)
         # Get primary monitor resolution
-        self.width = win32api.GetSystemMetrics(win32con.SM_CXSCREEN)
-        self.height = win32api.GetSystemMetrics(win32con.SM_CYSCREEN)
+        self.width, self.height = self.capture_backend.size()
+        self._geometry: tuple[int, int, bool, float] | None = None
+        self._scaling: ScalingTransform
+        self._params: BetaToolParam | None = None
         self.display_num = None  # Windows handles multiple displays differently
+        self._refresh_region()
+        self.settle_detector = SettleDetector(
+            lambda: reduce_frame(self.capture_backend.capture(self._box).image()),
+            stable_window=self._settle_window,
+            interval=self._settle_interval,
+            timeout=self._settle_timeout,
+        )
+        self.keystroke_typing = KeystrokeTyping(
+            pyautogui, TYPING_GROUP_SIZE, TYPING_DELAY_MS
+        )
+        self.paste_typing = PasteTyping(pyautogui)
+        self.locator = TemplateLocator()
+        # (action, settle result) of the most recent actions
+        self.settle_history: deque[tuple[str, SettleResult]] = deque(
+            maxlen=SETTLE_HISTORY_SIZE
+        )
 
     async def __call__(
         self,
@@ -104,149 +251,617 @@ class ComputerTool(BaseAnthropicTool):
         action: Action,
         text: str | None = None,
         coordinate: tuple[int, int] | None = None,
+        paste: bool | None = None,
+        actions: list[dict[str, Any]] | None = None,
+        pacing_ms: int | None = None,
+        region: list[int] | None = None,
+        timeout: float | None = None,
+        template: str | None = None,
+        threshold: float | None = None,
         **kwargs,
     ):
+        if self.frame_buffer:
+            self.frame_buffer.start()
         try:
-            if action in ("mouse_move", "left_click_drag"):
-                if coordinate is None:
-                    raise ToolError(f"coordinate is required for {action}")
-                if text is not None:
-                    raise ToolError(f"text is not accepted for {action}")
-                if not isinstance(coordinate, list) or len(coordinate) != 2:
-                    raise ToolError(f"{coordinate} must be a tuple of length 2")
-                if not all(isinstance(i, int) and i >= 0 for i in coordinate):
-                    raise ToolError(f"{coordinate} must be a tuple of non-negative ints")
-
-                x, y = self.scale_coordinates(
-                    ScalingSource.API, coordinate[0], coordinate[1]
+            # coordinates follow the region's window if it moved since the last call
+            self._refresh_region()
+            if pyautogui is None and action not in VIEW_ACTIONS:
+                raise ToolError(f"pyautogui is not available to perform {action}")
+
+            if action == "batch":
+                return await self.batch(actions, pacing_ms)
+            if action == "zoom":
+                return await self.zoom(region)
+            if action in ("wait_for_change", "wait_until_stable"):
+                return await self.wait(action, region, timeout)
+            if action == "locate":
+                return await self.locate(template, region, threshold)
+
+            if action not in (*INPUT_ACTIONS, "screenshot", "cursor_position"):
+                raise ToolError(f"Invalid action: {action}")
+            self._validate(action, text, coordinate, paste)
+
+            if action == "screenshot":
+                return await self.screenshot(after=action)
+            elif action == "cursor_position":
+                x, y = await asyncio.to_thread(pyautogui.position)
+                scaled_x, scaled_y = self.scale_coordinates(
+                    ScalingSource.COMPUTER, x, y
+                )
+                return ToolResult(
+                    output=f"X={scaled_x},Y={scaled_y}",
+                    error=None,
+                    base64_image=None
                 )
 
-                if action == "mouse_move":
-                    await asyncio.to_thread(pyautogui.moveTo, x, y)
-                elif action == "left_click_drag":
-                    await asyncio.to_thread(pyautogui.dragTo, x, y)
+            await self._perform(action, text, coordinate, paste)
+            return await self.screenshot(after=action)
 
-                return await self.screenshot()
-
-            if action in ("key", "type"):
-                if text is None:
-                    raise ToolError(f"text is required for {action}")
-                if coordinate is not None:
-                    raise ToolError(f"coordinate is not accepted for {action}")
-                if not isinstance(text, str):
-                    raise ToolError(output=f"{text} must be a string")
-
-                if action == "key":
-                    await asyncio.to_thread(pyautogui.press, text)
-                elif action == "type":
-                    for chunk in chunks(text, TYPING_GROUP_SIZE):
-                        await asyncio.to_thread(
-                            pyautogui.write, chunk, interval=TYPING_DELAY_MS/1000
-                        )
-
-                return await self.screenshot()
-
-            if action in (
-                "left_click",
-                "right_click",
-                "double_click",
-                "middle_click",
-                "screenshot",
-                "cursor_position",
-            ):
-                if text is not None:
-                    raise ToolError(f"text is not accepted for {action}")
-                if coordinate is not None:
-                    raise ToolError(f"coordinate is not accepted for {action}")
-
-                if action == "screenshot":
-                    return await self.screenshot()
-                elif action == "cursor_position":
-                    x, y = win32api.GetCursorPos()
-                    scaled_x, scaled_y = self.scale_coordinates(
-                        ScalingSource.COMPUTER, x, y
-                    )
-                    return ToolResult(
-                        output=f"X={scaled_x},Y={scaled_y}",
-                        error=None,
-                        base64_image=None
-                    )
-                else:
-                    click_funcs = {
-                        "left_click": lambda: pyautogui.click(button='left'),
-                        "right_click": lambda: pyautogui.click(button='right'),
-                        "middle_click": lambda: pyautogui.click(button='middle'),
-                        "double_click": lambda: pyautogui.doubleClick(),
-                    }
-                    await asyncio.to_thread(click_funcs[action])
-                    return await self.screenshot()
-
-            raise ToolError(f"Invalid action: {action}")
-
-        except pyautogui.FailSafeException as e:
+        except FailSafeException as e:
             raise ToolError(f"Mouse movement failed (hit screen edge): {str(e)}")
         except Exception as e:
             raise ToolError(f"Action failed: {str(e)}")
 
-    async def screenshot(self) -> ToolResult:
-        """Take a screenshot of the current screen and return the base64 encoded image."""
-        output_dir = Path(OUTPUT_DIR)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        path = output_dir / f"screenshot_{uuid4().hex}.png"
+    async def batch(
+        self, actions: list[dict[str, Any]] | None, pacing_ms: int | None = None
+    ) -> ToolResult:
+        """
+        Perform a list of input actions back to back, `pacing_ms` apart, and take a
+        single screenshot at the end. All actions are validated before any runs.
+        """
+        if not isinstance(actions, list) or not actions:
+            raise ToolError("actions must be a non-empty list for batch")
+        steps: list[tuple[str, Any, Any, Any]] = []
+        for index, step in enumerate(actions):
+            try:
+                if not isinstance(step, dict):
+                    raise ToolError(f"{step} must be an object with an action")
+                action = step.get("action")
+                if action not in INPUT_ACTIONS:
+                    raise ToolError(
+                        f"{action} cannot be batched, "
+                        f"expected one of {', '.join(INPUT_ACTIONS)}"
+                    )
+                self._validate(
+                    action, step.get("text"), step.get("coordinate"), step.get("paste")
+                )
+            except ToolError as e:
+                raise ToolError(f"actions[{index}]: {e.message}")
+            steps.append(
+                (action, step.get("text"), step.get("coordinate"), step.get("paste"))
+            )
+
+        pacing = self._batch_pacing if pacing_ms is None else pacing_ms / 1000
+        for index, (action, text, coordinate, paste) in enumerate(steps):
+            if index:
+                await asyncio.sleep(pacing)
+            try:
+                await self._perform(action, text, coordinate, paste)
+            except Exception as e:
+                # the earlier actions already happened, so show where they left the screen
+                error = (
+                    f"actions[{index}] ({action}) failed, "
+                    f"the {index} actions before it were performed: {e}"
+                )
+                return ToolResult(error=error) + await self.screenshot(after="batch")
+        output = f"Performed {len(steps)} actions"
+        return _with_output(output, await self.screenshot(after="batch"))
+
+    async def wait(
+        self, action: str, region: list[int] | None = None, timeout: float | None = None
+    ) -> ToolResult:
+        """
+        Block until the screen, or `region` of it, changes (wait_for_change) or stops
+        changing (wait_until_stable), for at most `timeout` seconds, then take a
+        screenshot. Saves the model a round trip per screenshot while it waits.
+        """
+        if timeout is None:
+            timeout = self._wait_timeout
+        if (
+            not isinstance(timeout, int | float)
+            or isinstance(timeout, bool)
+            or not 0 < timeout <= MAX_WAIT_TIMEOUT
+        ):
+            raise ToolError(
+                f"timeout must be a number of seconds up to {MAX_WAIT_TIMEOUT:g}"
+            )
+        box = self._region_box(region, action) if region is not None else None
+        subject = "The screen" if region is None else f"Region {tuple(region)}"
+
+        def sample_frame() -> Image.Image:
+            image = self.capture_backend.capture(self._box).image()
+            # regions are compared whole, they are usually small already
+            return image.crop(box) if box else reduce_frame(image)
+
+        detector = SettleDetector(
+            sample_frame,
+            stable_window=self._wait_stable_window,
+            interval=self._wait_interval,
+            max_changed_fraction=self.settle_detector.max_changed_fraction,
+        )
+        if action == "wait_for_change":
+            changed = await detector.wait_for_change(timeout)
+            outcome = "changed" if changed.changed else "did not change"
+            result: ChangeResult | SettleResult = changed
+        else:
+            settled = await detector.wait(timeout)
+            outcome = "is stable" if settled.settled else "was still changing"
+            result = settled
+        output = (
+            f"{subject} {outcome} after {result.elapsed:.1f}s "
+            f"({result.frames} frames sampled)."
+        )
+        return _with_output(output, await self.screenshot(after=action))
+
+    async def zoom(self, region: list[int] | None) -> ToolResult:
+        """
+        Capture `region`, given as [left, top, right, bottom] in the coordinates of
+        screenshots, at the display's native resolution, for reading detail that
+        scaled screenshots lose.
+        """
+        box = self._region_box(region, "zoom")
+        left, top, right, bottom = cast(list[int], region)
+
+        frame = await self._current_frame(after="zoom")
+        base64_image, size = await asyncio.to_thread(self._encode_zoom, frame, box)
+        factor = size[0] / (right - left)
+        return ToolResult(
+            output=(
+                f"Region ({left}, {top}, {right}, {bottom}) at {factor:.2f}x the scale "
+                f"of screenshots, {size[0]}x{size[1]} pixels. Point (x, y) of this image "
+                f"is at ({left} + x / {factor:.2f}, {top} + y / {factor:.2f}) in "
+                "screenshots."
+            ),
+            base64_image=base64_image,
+        )
+
+    async def locate(
+        self,
+        template: str | None = None,
+        region: list[int] | None = None,
+        threshold: float | None = None,
+    ) -> ToolResult:
+        """
+        Find where `template` appears on the screen, returning the centers of the
+        best matches in API coordinates with their confidence, without a screenshot.
+
+        `template` is the path of an image file, or the digest of a template seen
+        before. With `region` instead, that part of the screen becomes the template,
+        and its digest is returned for finding it again later.
+        """
+        if threshold is None:
+            threshold = DEFAULT_THRESHOLD
+        if (
+            not isinstance(threshold, int | float)
+            or isinstance(threshold, bool)
+            or not 0 < threshold <= 1
+        ):
+            raise ToolError("threshold must be a number above 0 and at most 1")
+        if (template is None) == (region is None):
+            raise ToolError("locate takes either a template or a region")
+        box = self._region_box(region, "locate") if region is not None else None
+
+        frame = await self._current_frame(after="locate")
+        saved = ""
+        if box:
+            found = await asyncio.to_thread(
+                lambda: self.locator.add_image(frame.image().crop(box))
+            )
+            saved = (
+                f"Saved region {tuple(cast(list[int], region))} as template "
+                f"{found.digest}. "
+            )
+        elif isinstance(template, str) and (cached := self.locator.get(template)):
+            found = cached
+        elif isinstance(template, str) and os.path.isfile(template):
+            data = await asyncio.to_thread(Path(template).read_bytes)
+            found = await asyncio.to_thread(self.locator.add, data)
+        else:
+            raise ToolError(
+                f"{template} is neither an image file nor the digest of a template"
+            )
+
+        matches = await self.locator.locate(
+            frame.image(), found, threshold=threshold, max_matches=MAX_LOCATE_MATCHES
+        )
+        if not matches:
+            return ToolResult(
+                output=(
+                    f"{saved}No match for the template with confidence "
+                    f"{threshold:g} or more."
+                )
+            )
+        listed = ", ".join(
+            f"{self.scaling.to_api(*match.center)} {match.confidence:.2f}"
+            for match in matches
+        )
+        return ToolResult(
+            output=(
+                f"{saved}Found {len(matches)} "
+                f"{'match' if len(matches) == 1 else 'matches'} for the template, "
+                f"as center (x, y) and confidence: {listed}."
+            )
+        )
+
+    async def _current_frame(self, after: str) -> Frame:
+        """The newest buffered frame since the last input, else a settled capture."""
+        if self.frame_buffer and self.frame_buffer.running:
+            if buffered := self.frame_buffer.newest(self._last_input_at):
+                return self._in_region(buffered.frame)
+        return await self._capture(after=after)
+
+    def _region_box(self, region: Any, action: str) -> tuple[int, int, int, int]:
+        """The display box of `region`, a [left, top, right, bottom] in API coordinates."""
+        scaling = self.scaling
+        if (
+            not isinstance(region, list)
+            or len(region) != 4
+            or not all(isinstance(i, int) and i >= 0 for i in region)
+        ):
+            raise ToolError(f"{region} must be a list of 4 non-negative ints for {action}")
+        left, top, right, bottom = region
+        width, height = scaling.target_width, scaling.target_height
+        if not (left < right <= width and top < bottom <= height):
+            raise ToolError(
+                f"{region} must be a [left, top, right, bottom] box within "
+                f"{width}x{height}"
+            )
+        # the corners go through the same mapping as clicks do
+        box = (*scaling.from_api(left, top), *scaling.from_api(right, bottom))
+        return (
+            min(box[0], self.width - 1),
+            min(box[1], self.height - 1),
+            min(max(box[2], box[0] + 1), self.width),
+            min(max(box[3], box[1] + 1), self.height),
+        )
 
+    def _encode_zoom(
+        self, frame: Frame, box: tuple[int, int, int, int]
+    ) -> tuple[str, tuple[int, int]]:
+        crop = frame.image().crop(box)
+        width, height = crop.size
+        # a native crop of a large region would cost more tokens than it is worth
+        fit = min(math.sqrt(ZOOM_MAX_PIXELS / (width * height)), 1)
+        size = (max(round(width * fit), 1), max(round(height * fit), 1))
+        return encode_png_base64(crop, size, self.png_options), size
+
+    async def _type(self, text: str, paste: bool | None = None):
+        """
+        Paste text of at least _paste_threshold characters, or when `paste` is set,
+        and type it key by key otherwise or when the clipboard is not available.
+        """
+        if paste is None:
+            paste = self._paste_threshold is not None and len(text) >= self._paste_threshold
+        if paste:
+            try:
+                await self.paste_typing.type(text)
+                return
+            except ClipboardError:
+                pass
+        await self.keystroke_typing.type(text)
+
+    def _validate(self, action: str, text: Any, coordinate: Any, paste: Any = None):
+        if paste is not None and (action != "type" or not isinstance(paste, bool)):
+            raise ToolError("paste is only accepted for type, as true or false")
+        if action in ("mouse_move", "left_click_drag"):
+            if coordinate is None:
+                raise ToolError(f"coordinate is required for {action}")
+            if text is not None:
+                raise ToolError(f"text is not accepted for {action}")
+            if not isinstance(coordinate, list) or len(coordinate) != 2:
+                raise ToolError(f"{coordinate} must be a tuple of length 2")
+            if not all(isinstance(i, int) and i >= 0 for i in coordinate):
+                raise ToolError(f"{coordinate} must be a tuple of non-negative ints")
+        elif action in ("key", "type"):
+            if text is None:
+                raise ToolError(f"text is required for {action}")
+            if coordinate is not None:
+                raise ToolError(f"coordinate is not accepted for {action}")
+            if not isinstance(text, str):
+                raise ToolError(f"{text} must be a string")
+        else:
+            if text is not None:
+                raise ToolError(f"text is not accepted for {action}")
+            if coordinate is not None:
+                raise ToolError(f"coordinate is not accepted for {action}")
+
+    async def _perform(
+        self, action: str, text: Any, coordinate: Any, paste: bool | None = None
+    ):
+        """Send the input of a validated action, without taking a screenshot."""
         try:
-            # Take screenshot using pyautogui
-            screenshot = await asyncio.to_thread(pyautogui.screenshot)
-            
-            if self._scaling_enabled:
+            if action in ("mouse_move", "left_click_drag"):
                 x, y = self.scale_coordinates(
-                    ScalingSource.COMPUTER, self.width, self.height
+                    ScalingSource.API, coordinate[0], coordinate[1]
                 )
-                screenshot = screenshot.resize((x, y), Image.Resampling.LANCZOS)
-
-            # Save the screenshot
-            screenshot.save(str(path))
-            
-            # Add delay to let things settle
-            await asyncio.sleep(self._screenshot_delay)
-            
-            # Return the result with base64 encoded image
-            return ToolResult(
-                output=None,
-                error=None,
-                base64_image=base64.b64encode(path.read_bytes()).decode()
+
+                if action == "mouse_move":
+                    await asyncio.to_thread(pyautogui.moveTo, x, y)
+                elif action == "left_click_drag":
+                    await asyncio.to_thread(pyautogui.dragTo, x, y)
+            elif action == "key":
+                await asyncio.to_thread(pyautogui.press, text)
+            elif action == "type":
+                await self._type(text, paste)
+            else:
+                click_funcs = {
+                    "left_click": lambda: pyautogui.click(button='left'),
+                    "right_click": lambda: pyautogui.click(button='right'),
+                    "middle_click": lambda: pyautogui.click(button='middle'),
+                    "double_click": lambda: pyautogui.doubleClick(),
+                }
+                await asyncio.to_thread(click_funcs[action])
+        finally:
+            # frames captured before this are stale for the next screenshot
+            self._last_input_at = time.monotonic()
+
+    async def screenshot(self, after: str = "screenshot") -> ToolResult:
+        """
+        Wait for the screen to settle after the `after` action, then take a screenshot
+        of the current screen and return the base64 encoded image. A screenshot
+        action is answered from the background capture, when it is on.
+        """
+        self._refresh_region()
+        if after == "screenshot" and self.frame_buffer:
+            if result := await self._buffered_screenshot():
+                return result
+        try:
+            frame = await self._capture(after)
+            scaling = self.scaling
+            size = (scaling.target_width, scaling.target_height)
+
+            # Resize and encode in memory, on a worker thread
+            return await self._screenshot_result(
+                frame, lambda: self._encode(frame, size)
             )
         except Exception as e:
             raise ToolError(f"Failed to take screenshot: {str(e)}")
-        finally:
-            # Clean up the temporary file
-            try:
-                if path.exists():
-                    path.unlink()
-            except Exception:
-                pass
+
+    async def _capture(self, after: str) -> Frame:
+        """Wait for the screen to settle after the `after` action, then capture it."""
+        # Wait until the screen stops changing, so the capture is not stale
+        settle = await self.settle_detector.wait(
+            self._settle_timeout,
+            stable_window=self._settle_window,
+            interval=self._settle_interval,
+        )
+        self.settle_history.append((after, settle))
+
+        # Take screenshot using the capture backend
+        frame = await asyncio.to_thread(self.capture_backend.capture, self._box)
+        if frame.size != (self.width, self.height):
+            # every capture doubles as a poll of the display resolution
+            self.on_display_change(*frame.size)
+        return frame
+
+    async def _buffered_screenshot(self) -> ToolResult | None:
+        """The newest buffered frame that shows the effect of the last input, if any."""
+        assert self.frame_buffer
+        buffered = await self.frame_buffer.wait_for_frame(
+            self._last_input_at, timeout=2 / self.frame_buffer.rate
+        )
+        if buffered is None:
+            return None
+        # the buffer holds whole displays, cut to the region here
+        frame = self._in_region(buffered.frame)
+        if frame.size != (self.width, self.height):
+            self.on_display_change(*frame.size)
+        scaling = self.scaling
+        size = (scaling.target_width, scaling.target_height)
+        frame_buffer = self.frame_buffer
+        return await self._screenshot_result(
+            frame,
+            lambda: frame_buffer.encode(
+                buffered,
+                (size, self._box, self.png_options),
+                lambda _: self._encode(frame, size),
+            ),
+        )
+
+    def _in_region(self, frame: Frame) -> Frame:
+        return frame.crop(self._box) if self._box else frame
+
+    def _refresh_region(self):
+        """Look up the region of interest again, e.g. after its window moved or resized."""
+        if self.region_of_interest is None:
+            return
+        box = self.region_of_interest.resolve(
+            self.window_provider, self.capture_backend.size()
+        )
+        # without its window, e.g. while it is minimized, the whole display is shown
+        self._box = box
+        self._origin = (box[0], box[1]) if box else (0, 0)
+        self.on_display_change()
+
+    async def _screenshot_result(
+        self, frame: Frame, encode_full: Callable[[], str]
+    ) -> ToolResult:
+        """
+        The result for a captured frame, listing the regions that changed since the
+        previous screenshot. With delta screenshots on, a change smaller than
+        _delta_max_area is sent as a crop of the changed region, and no change as
+        no image at all, until _max_consecutive_deltas have been sent in a row.
+        """
+        previous, self._last_sent_frame = self._last_sent_frame, frame
+        if previous is None or previous.size != frame.size or not self._report_changes:
+            self._consecutive_deltas = 0
+            return await self._full_frame_result(frame, encode_full)
+
+        regions = await asyncio.to_thread(changed_regions, previous, frame)
+        if not regions:
+            output = "The screen has not changed since the previous screenshot."
+        else:
+            listed = ", ".join(
+                str(self._to_api_region(region))
+                for region in regions[:MAX_LISTED_REGIONS]
+            )
+            if len(regions) > MAX_LISTED_REGIONS:
+                listed += f" and {len(regions) - MAX_LISTED_REGIONS} more"
+            output = (
+                "Regions changed since the previous screenshot, as "
+                f"(left, top, right, bottom): {listed}."
+            )
+
+        send_delta = self._consecutive_deltas < self._max_consecutive_deltas
+        if self.delta_screenshots and send_delta:
+            if not regions:
+                self._consecutive_deltas += 1
+                return ToolResult(output=output)
+            bounds = reduce(Region.union, regions)
+            if bounds.area <= self._delta_max_area * frame.width * frame.height:
+                self._consecutive_deltas += 1
+                api_bounds = self._to_api_region(bounds)
+                return ToolResult(
+                    output=(
+                        f"{output} The image shows only the changed part of the "
+                        f"screen, with its top-left corner at ({api_bounds[0]}, "
+                        f"{api_bounds[1]}); the rest is as in the previous screenshot."
+                    ),
+                    base64_image=await asyncio.to_thread(
+                        self._encode_region, frame, bounds
+                    ),
+                )
+
+        self._consecutive_deltas = 0
+        return await self._full_frame_result(frame, encode_full, output)
+
+    async def _full_frame_result(
+        self, frame: Frame, encode_full: Callable[[], str], output: str | None = None
+    ) -> ToolResult:
+        # the hash is taken here, at capture time, so the history can tell whether
+        # the model already has a screenshot of the same screen
+        image_hash, base64_image = await asyncio.to_thread(
+            lambda: (perceptual_hash(frame), encode_full())
+        )
+        return ToolResult(output=output, base64_image=base64_image, image_hash=image_hash)
+
+    def _to_api_region(self, region: Region) -> tuple[int, int, int, int]:
+        left, top = self.scaling.to_api(region.left, region.top)
+        right, bottom = self.scaling.to_api(region.right, region.bottom)
+        return left, top, right, bottom
+
+    def _encode_region(self, frame: Frame, region: Region) -> str:
+        # scaled like a full screenshot, so sizes on screen stay comparable
+        left, top, right, bottom = self._to_api_region(region)
+        crop = frame.image().crop((region.left, region.top, region.right, region.bottom))
+        size = (max(right - left, 1), max(bottom - top, 1))
+        return encode_png_base64(crop, size, self.png_options)
+
+    @property
+    def settle_stats(self) -> SettleStats:
+        """How long the screen took to settle after the most recent actions."""
+        return SettleStats.of(result for _, result in self.settle_history)
+
+    async def suspend(self):
+        if self.frame_buffer:
+            await self.frame_buffer.stop()
+
+    async def aclose(self):
+        await self.suspend()
+        self.locator.close()
+
+    def _encode(self, frame: Frame, size: tuple[int, int] | None) -> str:
+        # raw buffer backends are only converted to an image here
+        return encode_png_base64(frame.image(), size, self.png_options)
 
     def scale_coordinates(self, source: ScalingSource, x: int, y: int):
-        """Scale coordinates to a target maximum resolution."""
-        if not self._scaling_enabled:
+        """
+        Scale coordinates to a target maximum resolution. API coordinates are
+        relative to the region of interest, display coordinates to the display.
+        """
+        origin_x, origin_y = self._origin
+        if source == ScalingSource.API:
+            x, y = self.scaling.from_api(x, y)
+            return x + origin_x, y + origin_y
+        return self.scaling.to_api(x - origin_x, y - origin_y)
+
+    @property
+    def scaling(self) -> "ScalingTransform":
+        """The transform for the current display geometry, computed once per geometry."""
+        geometry = (
+            self.width, self.height, self._scaling_enabled, self.screenshot_scale
+        )
+        if self._geometry != geometry:
+            self._geometry = geometry
+            self._scaling = scaling_transform(*geometry)
+            self._params = None
+        return self._scaling
+
+    def on_display_change(self, width: int | None = None, height: int | None = None):
+        """
+        Call when the display resolution changes, e.g. on WM_DISPLAYCHANGE. Without a
+        size, it is that of the region of interest, or the capture backend is asked
+        for the display's.
+        """
+        if width is None or height is None:
+            if self._box:
+                left, top, right, bottom = self._box
+                width, height = right - left, bottom - top
+            else:
+                width, height = self.capture_backend.size()
+        self.width, self.height = width, height
+
+
+def _with_output(output: str, result: ToolResult) -> ToolResult:
+    """`result` with `output` on a line before whatever output it has."""
+    return result.replace(output=f"{output}\n{result.output}" if result.output else output)
+
+
+@dataclass(frozen=True)
+class ScalingTransform:
+    """Maps between display coordinates and the resolution the API sees."""
+
+    width: int
+    height: int
+    target_width: int
+    target_height: int
+
+    @property
+    def x_factor(self) -> float:
+        # should be less than 1
+        return self.target_width / self.width
+
+    @property
+    def y_factor(self) -> float:
+        return self.target_height / self.height
+
+    def to_api(self, x: int, y: int) -> tuple[int, int]:
+        """Scale display coordinates down to the API's."""
+        if not self.scaled:
             return x, y
-        ratio = self.width / self.height
-        target_dimension = None
-        for dimension in MAX_SCALING_TARGETS.values():
-            # allow some error in the aspect ratio - not ratios are exactly 16:9
-            if abs(dimension["width"] / dimension["height"] - ratio) < 0.02:
-                if dimension["width"] < self.width:
-                    target_dimension = dimension
-                break
-        if target_dimension is None:
+        return round(x * self.x_factor), round(y * self.y_factor)
+
+    @property
+    def scaled(self) -> bool:
+        return (self.target_width, self.target_height) != (self.width, self.height)
+
+    def from_api(self, x: int, y: int) -> tuple[int, int]:
+        """Scale API coordinates up to the display's."""
+        if not self.scaled:
             return x, y
-        # should be less than 1
-        x_scaling_factor = target_dimension["width"] / self.width
-        y_scaling_factor = target_dimension["height"] / self.height
-        if source == ScalingSource.API:
-            if x > self.width or y > self.height:
-                raise ToolError(f"Coordinates {x}, {y} are out of bounds")
-            # scale up
-            return round(x / x_scaling_factor), round(y / y_scaling_factor)
-        # scale down
-        return round(x * x_scaling_factor), round(y * y_scaling_factor)
+        if x > self.width or y > self.height:
+            raise ToolError(f"Coordinates {x}, {y} are out of bounds")
+        return round(x / self.x_factor), round(y / self.y_factor)
+
+
+@lru_cache
+def scaling_transform(
+    width: int, height: int, scaling_enabled: bool, scale: float = 1.0
+) -> ScalingTransform:
+    """
+    The transform to the first target with the display's aspect ratio, if smaller,
+    further reduced by `scale`.
+    """
+    if not scaling_enabled:
+        return ScalingTransform(width, height, width, height)
+    target_width, target_height = width, height
+    ratio = width / height
+    for dimension in MAX_SCALING_TARGETS.values():
+        # allow some error in the aspect ratio - not ratios are exactly 16:9
+        if abs(dimension["width"] / dimension["height"] - ratio) < 0.02:
+            if dimension["width"] < width:
+                target_width, target_height = dimension["width"], dimension["height"]
+            break
+    return ScalingTransform(
+        width, height, round(target_width * scale), round(target_height * scale)
+    )
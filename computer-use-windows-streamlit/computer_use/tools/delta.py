@@ -0,0 +1,114 @@
+"""Finds the regions of the screen that changed between two frames."""
+
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from .capture import Frame
+
+# frames are compared in square tiles of this many pixels
+TILE_SIZE = 16
+# channel differences up to this much are compression or dithering noise
+PIXEL_TOLERANCE = 8
+# perceptual hashes compare a grid of this many cells per side, 256 bits
+HASH_SIZE = 16
+
+
+@dataclass(frozen=True)
+class Region:
+    """A box of the screen, right and bottom exclusive."""
+
+    left: int
+    top: int
+    right: int
+    bottom: int
+
+    @property
+    def area(self) -> int:
+        return (self.right - self.left) * (self.bottom - self.top)
+
+    def union(self, other: "Region") -> "Region":
+        return Region(
+            min(self.left, other.left),
+            min(self.top, other.top),
+            max(self.right, other.right),
+            max(self.bottom, other.bottom),
+        )
+
+
+def frame_array(frame: Frame) -> np.ndarray:
+    """The frame's pixels as a height x width x channels array, without copying raw buffers."""
+    if frame.data and frame.raw_mode in ("RGB", "BGR"):
+        return np.frombuffer(frame.data, np.uint8).reshape(frame.height, frame.width, 3)
+    if frame.data and frame.raw_mode in ("BGRX", "BGRA", "RGBX", "RGBA"):
+        pixels = np.frombuffer(frame.data, np.uint8).reshape(frame.height, frame.width, 4)
+        return pixels[..., :3]
+    return np.asarray(frame.image())
+
+
+def changed_tiles(
+    previous: np.ndarray, current: np.ndarray, tile_size: int = TILE_SIZE
+) -> np.ndarray:
+    """A boolean grid with one cell per tile, set where any pixel of the tile changed."""
+    # the absolute difference without widening the arrays out of uint8
+    difference = np.maximum(previous, current) - np.minimum(previous, current)
+    changed = (difference > PIXEL_TOLERANCE).any(axis=2)
+    height, width = changed.shape
+    rows, columns = -(-height // tile_size), -(-width // tile_size)
+    padded = np.zeros((rows * tile_size, columns * tile_size), dtype=bool)
+    padded[:height, :width] = changed
+    return padded.reshape(rows, tile_size, columns, tile_size).any(axis=(1, 3))
+
+
+def tile_regions(tiles: np.ndarray, tile_size: int, size: tuple[int, int]) -> list[Region]:
+    """Bounding boxes, in pixels, of each group of touching changed tiles."""
+    width, height = size
+    unvisited = {(int(row), int(column)) for row, column in zip(*np.nonzero(tiles))}
+    regions = []
+    while unvisited:
+        stack = [unvisited.pop()]
+        top, left = bottom, right = stack[0]
+        while stack:
+            row, column = stack.pop()
+            top, bottom = min(top, row), max(bottom, row)
+            left, right = min(left, column), max(right, column)
+            for neighbour in (
+                (row + dy, column + dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+            ):
+                if neighbour in unvisited:
+                    unvisited.remove(neighbour)
+                    stack.append(neighbour)
+        regions.append(
+            Region(
+                left * tile_size,
+                top * tile_size,
+                min((right + 1) * tile_size, width),
+                min((bottom + 1) * tile_size, height),
+            )
+        )
+    return sorted(regions, key=lambda region: (region.top, region.left))
+
+
+def changed_regions(previous: Frame, current: Frame) -> list[Region]:
+    """The regions of `current` that differ from `previous`, which must be the same size."""
+    if (previous.raw_mode, bool(previous.data)) != (current.raw_mode, bool(current.data)):
+        # different channel orders, compare the converted images
+        arrays = np.asarray(previous.image()), np.asarray(current.image())
+    else:
+        arrays = frame_array(previous), frame_array(current)
+    tiles = changed_tiles(*arrays)
+    return tile_regions(tiles, TILE_SIZE, current.size)
+
+
+def perceptual_hash(frame: Frame) -> str:
+    """
+    A difference hash of the frame, as hex: each bit says whether a cell of a
+    HASH_SIZE grid is brighter than the cell to its right. Frames that look alike
+    have hashes that differ in few bits.
+    """
+    small = frame.image().convert("L").resize(
+        (HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX
+    )
+    cells = np.asarray(small, dtype=np.int16)
+    return np.packbits(cells[:, 1:] > cells[:, :-1]).tobytes().hex()
@@ -4,7 +4,7 @@ import os
 from pathlib import Path
 from typing import ClassVar, Literal, Optional, TypedDict
 
-from .base import BaseAnthropicTool, CLIResult, ToolError
+from .base import BaseAnthropicTool, CLIResult, ConcurrencyClass, ToolError
 from .run import run
 
 SNIPPET_LINES = 3
@@ -23,6 +23,7 @@ class EditTool(BaseAnthropicTool):
 
     name: ClassVar[Literal["str_replace_editor"]] = "str_replace_editor"
     api_type: ClassVar[Literal["text_editor_20241022"]] = "text_editor_20241022"  # Updated to match expected type
+    concurrency = ConcurrencyClass.PER_PATH
     _file_history: dict[Path, list[str]]
 
     def __init__(self):
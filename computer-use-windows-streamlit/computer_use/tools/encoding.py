@@ -0,0 +1,45 @@
+"""Screenshot encoding, done in memory and meant to run off the event loop."""
+
+import base64
+import io
+from dataclasses import dataclass
+
+from PIL import Image
+
+
+@dataclass(frozen=True)
+class PngOptions:
+    """
+    PNG encoder settings. zlib levels above the default mostly cost time on
+    screenshots, and `optimize` makes the encoder search for the smallest output.
+    """
+
+    compress_level: int = 6
+    optimize: bool = False
+
+
+def encode_png(
+    image: Image.Image,
+    size: tuple[int, int] | None = None,
+    options: PngOptions = PngOptions(),
+) -> bytes:
+    """Resize `image` to `size` if given and encode it as PNG into a buffer."""
+    if size and size != image.size:
+        image = image.resize(size, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        format="PNG",
+        compress_level=options.compress_level,
+        optimize=options.optimize,
+    )
+    return buffer.getvalue()
+
+
+def encode_png_base64(
+    image: Image.Image,
+    size: tuple[int, int] | None = None,
+    options: PngOptions = PngOptions(),
+) -> str:
+    """Like `encode_png`, base64 encoded for a ToolResult."""
+    return base64.b64encode(encode_png(image, size, options)).decode()
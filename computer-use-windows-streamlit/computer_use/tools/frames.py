@@ -0,0 +1,143 @@
+"""Background capture of recent frames, so a screenshot can be answered without a grab."""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from .capture import CaptureBackend, Frame
+
+
+@dataclass
+class FrameBufferStats:
+    """
+    What the background capture costs. CPU time is that of the worker threads doing
+    the grabs and encodes, which excludes any work done by the OS or the GPU.
+    """
+
+    frames: int = 0
+    # frames identical to the one before, which share its encoding
+    unchanged: int = 0
+    encodes: int = 0
+    encode_reuses: int = 0
+    capture_cpu_seconds: float = 0.0
+    encode_cpu_seconds: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+    stopped_at: float | None = None
+
+    @property
+    def cpu_fraction(self) -> float:
+        """Share of one core spent on capturing while the buffer ran."""
+        elapsed = (self.stopped_at or time.monotonic()) - self.started_at
+        return self.capture_cpu_seconds / elapsed if elapsed else 0.0
+
+
+class _Encoding:
+    """The encoding of a frame's content, shared by consecutive identical frames."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.key: object = None
+        self.value: str | None = None
+
+
+@dataclass
+class BufferedFrame:
+    frame: Frame
+    _encoding: _Encoding = field(default_factory=_Encoding, repr=False)
+
+    @property
+    def captured_at(self) -> float:
+        return self.frame.captured_at
+
+
+class FrameRingBuffer:
+    """
+    Captures a frame every 1/`rate` seconds into a ring of the `capacity` most
+    recent frames. Frames are kept raw and encoded on first request; a frame
+    identical to the one before it reuses that frame's encoding.
+    """
+
+    def __init__(self, backend: CaptureBackend, rate: float, capacity: int = 8):
+        self.backend = backend
+        self.rate = rate
+        self.frames: deque[BufferedFrame] = deque(maxlen=capacity)
+        self.stats = FrameBufferStats()
+        self._task: asyncio.Task | None = None
+        self._new_frame = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self.stats = FrameBufferStats()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self.stats.stopped_at = time.monotonic()
+
+    def newest(self, since: float) -> BufferedFrame | None:
+        """The most recent frame, if it was captured at or after `since`."""
+        if self.frames and self.frames[-1].captured_at >= since:
+            return self.frames[-1]
+        return None
+
+    async def wait_for_frame(self, since: float, timeout: float) -> BufferedFrame | None:
+        """The first frame captured at or after `since`, waiting up to `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        while (buffered := self.newest(since)) is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.running:
+                return None
+            self._new_frame.clear()
+            try:
+                await asyncio.wait_for(self._new_frame.wait(), remaining)
+            except TimeoutError:
+                return None
+        return buffered
+
+    def encode(self, buffered: BufferedFrame, key: object, encode: Callable[[Frame], str]) -> str:
+        """
+        Encode the frame with `encode`, or return the cached result for the same `key`,
+        which should capture everything else the encoding depends on. Blocking.
+        """
+        encoding = buffered._encoding
+        with encoding.lock:
+            if encoding.key == key and encoding.value is not None:
+                self.stats.encode_reuses += 1
+                return encoding.value
+            start = time.thread_time()
+            encoding.value = encode(buffered.frame)
+            encoding.key = key
+            self.stats.encodes += 1
+            self.stats.encode_cpu_seconds += time.thread_time() - start
+            return encoding.value
+
+    async def _run(self):
+        interval = 1 / self.rate
+        while True:
+            started = time.monotonic()
+            buffered, cpu_seconds = await asyncio.to_thread(self._capture)
+            if self.frames and buffered._encoding is self.frames[-1]._encoding:
+                self.stats.unchanged += 1
+            self.frames.append(buffered)
+            self.stats.frames += 1
+            self.stats.capture_cpu_seconds += cpu_seconds
+            self._new_frame.set()
+            await asyncio.sleep(max(interval - (time.monotonic() - started), 0))
+
+    def _capture(self) -> tuple[BufferedFrame, float]:
+        start = time.thread_time()
+        frame = self.backend.capture()
+        buffered = BufferedFrame(frame)
+        if self.frames and frame.same_content(self.frames[-1].frame):
+            buffered._encoding = self.frames[-1]._encoding
+        return buffered, time.thread_time() - start
@@ -0,0 +1,317 @@
+"""
+Finds a template image on the screen by normalized cross-correlation.
+
+The search runs on a downsampled pyramid level of the frame and the template,
+where correlating every position is cheap, and only the best candidates are
+refined at full resolution. Correlations are computed with FFTs, so the cost
+depends on the frame size rather than on the template size.
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from .base import ToolError
+
+# templates are matched at these sizes relative to the template image, for
+# elements drawn at a different DPI scale than when the template was taken
+DEFAULT_SCALES = (0.8, 0.9, 1.0, 1.1, 1.25)
+DEFAULT_THRESHOLD = 0.9
+# the coarse search stops downsampling before the template gets smaller than this
+MIN_PYRAMID_TEMPLATE_SIZE = 8
+MAX_PYRAMID_LEVELS = 3
+# coarse candidates are kept this far below the threshold, refinement decides
+COARSE_MARGIN = 0.15
+TEMPLATE_CACHE_SIZE = 32
+
+
+@dataclass(frozen=True)
+class Match:
+    """A place the template was found, as a box in display pixels."""
+
+    left: int
+    top: int
+    width: int
+    height: int
+    confidence: float
+    scale: float
+
+    @property
+    def center(self) -> tuple[int, int]:
+        return self.left + self.width // 2, self.top + self.height // 2
+
+
+def pyramid(image: Image.Image, levels: int) -> list[np.ndarray]:
+    """
+    The image in grayscale, followed by `levels` copies each half the size of the
+    one before, as arrays.
+    """
+    gray = image.convert("L")
+    return [
+        np.asarray(gray.reduce(2**level) if level else gray, dtype=np.float32)
+        for level in range(levels + 1)
+    ]
+
+
+def _window_sums(values: np.ndarray, height: int, width: int) -> np.ndarray:
+    """Sums of every height x width window of `values`, from an integral image."""
+    integral = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    integral[1:, 1:] = values.cumsum(axis=0).cumsum(axis=1)
+    return (
+        integral[height:, width:]
+        - integral[:-height, width:]
+        - integral[height:, :-width]
+        + integral[:-height, :-width]
+    )
+
+
+def correlate(image: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """
+    Normalized cross-correlation of `template` at every position it fits in
+    `image`, from -1 to 1. Flat windows, where it is undefined, score 0.
+    """
+    height, width = template.shape
+    centered = template - template.mean()
+    template_norm = np.sqrt((centered**2).sum())
+    if template_norm == 0:
+        return np.zeros(
+            (image.shape[0] - height + 1, image.shape[1] - width + 1), np.float32
+        )
+    # the template is zero mean, so correlating it with the raw image is the same
+    # as correlating it with the image minus each window's mean
+    spectrum = np.fft.rfft2(image) * np.conj(np.fft.rfft2(centered, s=image.shape))
+    products = np.fft.irfft2(spectrum, s=image.shape)
+    products = products[: image.shape[0] - height + 1, : image.shape[1] - width + 1]
+    count = height * width
+    sums = _window_sums(image.astype(np.float64), height, width)
+    squares = _window_sums(image.astype(np.float64) ** 2, height, width)
+    deviation = np.sqrt(np.maximum(squares - sums**2 / count, 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = products / (deviation * template_norm)
+    scores[deviation < 1e-3 * np.sqrt(count)] = 0
+    return scores.astype(np.float32)
+
+
+def _peaks(scores: np.ndarray, floor: float, size: tuple[int, int], limit: int):
+    """Up to `limit` (row, column) maxima at least `floor`, `size` apart."""
+    scores = scores.copy()
+    height, width = size
+    peaks = []
+    while len(peaks) < limit:
+        row, column = np.unravel_index(np.argmax(scores), scores.shape)
+        if scores[row, column] < floor:
+            break
+        peaks.append((int(row), int(column)))
+        scores[
+            max(row - height // 2, 0) : row + height // 2 + 1,
+            max(column - width // 2, 0) : column + width // 2 + 1,
+        ] = -1
+    return peaks
+
+
+def _overlap(a: Match, b: Match) -> bool:
+    return (
+        abs(a.center[0] - b.center[0]) < max(a.width, b.width) / 2
+        and abs(a.center[1] - b.center[1]) < max(a.height, b.height) / 2
+    )
+
+
+class Template:
+    """A template image with its grayscale pyramids, computed once per scale."""
+
+    def __init__(self, image: Image.Image, digest: str):
+        self.digest = digest
+        self.image = image.convert("L")
+        self._pyramids: dict[float, list[np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.image.size
+
+    def pyramid(self, scale: float) -> list[np.ndarray]:
+        with self._lock:
+            if scale not in self._pyramids:
+                # each level is resampled from the template itself, which keeps
+                # odd sizes from drifting the way halving the level above would
+                width, height = self.size
+                levels = _levels((round(height * scale), round(width * scale)))
+                self._pyramids[scale] = [
+                    np.asarray(
+                        self.image.resize(
+                            (
+                                max(round(width * scale / 2**level), 1),
+                                max(round(height * scale / 2**level), 1),
+                            ),
+                            Image.Resampling.BOX,
+                        ),
+                        dtype=np.float32,
+                    )
+                    for level in range(levels + 1)
+                ]
+            return self._pyramids[scale]
+
+
+def _levels(template_shape: tuple[int, ...]) -> int:
+    """How many times the search can halve a template of this shape."""
+    levels, smallest = 0, min(template_shape)
+    while levels < MAX_PYRAMID_LEVELS and smallest // 2 >= MIN_PYRAMID_TEMPLATE_SIZE:
+        levels, smallest = levels + 1, smallest // 2
+    return levels
+
+
+class TemplateLocator:
+    """
+    Matches templates against frames on a pool of worker threads, one scale per
+    task. Templates are kept by the sha256 digest of their encoded image, for the
+    `cache_size` most recently used ones.
+    """
+
+    def __init__(
+        self, max_workers: int | None = None, cache_size: int = TEMPLATE_CACHE_SIZE
+    ):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.cache_size = cache_size
+        self._templates: OrderedDict[str, Template] = OrderedDict()
+        self._lock = threading.Lock()
+        # started on first use, and again after close
+        self._pool: ThreadPoolExecutor | None = None
+
+    def add(self, data: bytes) -> Template:
+        """The template for an encoded image, decoded only the first time it is seen."""
+        digest = hashlib.sha256(data).hexdigest()
+        if template := self.get(digest):
+            return template
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except Exception as e:
+            raise ToolError(f"Template is not a readable image: {e}") from e
+        return self._put(Template(image, digest))
+
+    def add_image(self, image: Image.Image) -> Template:
+        """The template for an image, such as a region cropped from the screen."""
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, "PNG")
+        return self.add(buffer.getvalue())
+
+    def get(self, digest: str) -> Template | None:
+        with self._lock:
+            template = self._templates.get(digest)
+            if template:
+                self._templates.move_to_end(digest)
+            return template
+
+    async def locate(
+        self,
+        frame: Image.Image,
+        template: Template,
+        *,
+        threshold: float = DEFAULT_THRESHOLD,
+        scales: tuple[float, ...] = DEFAULT_SCALES,
+        max_matches: int = 5,
+    ) -> list[Match]:
+        """The best non-overlapping matches of at least `threshold`, best first."""
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        frames = await loop.run_in_executor(
+            pool, self._frame_pyramid, frame, template, scales
+        )
+        per_scale = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    pool,
+                    self._match_scale,
+                    frames,
+                    template,
+                    scale,
+                    threshold,
+                    max_matches,
+                )
+                for scale in scales
+            )
+        )
+        matches: list[Match] = []
+        for match in sorted(
+            (match for found in per_scale for match in found),
+            key=lambda match: match.confidence,
+            reverse=True,
+        ):
+            if not any(_overlap(match, kept) for kept in matches):
+                matches.append(match)
+        return matches[:max_matches]
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="locate"
+                )
+            return self._pool
+
+    @staticmethod
+    def _frame_pyramid(
+        frame: Image.Image, template: Template, scales: tuple[float, ...]
+    ) -> list[np.ndarray]:
+        """The frame pyramid deep enough for every scale, building the template's too."""
+        levels = max(len(template.pyramid(scale)) - 1 for scale in scales)
+        return pyramid(frame, levels)
+
+    def _match_scale(
+        self,
+        frames: list[np.ndarray],
+        template: Template,
+        scale: float,
+        threshold: float,
+        limit: int,
+    ) -> list[Match]:
+        templates = template.pyramid(scale)
+        full = templates[0]
+        height, width = full.shape
+        if height > frames[0].shape[0] or width > frames[0].shape[1]:
+            return []
+        level = len(templates) - 1
+        coarse = correlate(frames[level], templates[level])
+        candidates = _peaks(
+            coarse, threshold - COARSE_MARGIN, templates[level].shape, limit * 2
+        )
+        matches = []
+        factor = 2**level
+        for row, column in candidates:
+            # search the full resolution positions the coarse one stands for
+            top = max(row * factor - factor, 0)
+            left = max(column * factor - factor, 0)
+            bottom = min(row * factor + 2 * factor + height, frames[0].shape[0])
+            right = min(column * factor + 2 * factor + width, frames[0].shape[1])
+            neighbourhood = frames[0][top:bottom, left:right]
+            if neighbourhood.shape[0] < height or neighbourhood.shape[1] < width:
+                continue
+            scores = correlate(neighbourhood, full)
+            y, x = np.unravel_index(np.argmax(scores), scores.shape)
+            confidence = float(scores[y, x])
+            if confidence >= threshold:
+                matches.append(
+                    Match(left + int(x), top + int(y), width, height, confidence, scale)
+                )
+        return matches
+
+    def _put(self, template: Template) -> Template:
+        with self._lock:
+            self._templates[template.digest] = template
+            while len(self._templates) > self.cache_size:
+                self._templates.popitem(last=False)
+        return template
+
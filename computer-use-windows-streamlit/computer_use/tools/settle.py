@@ -0,0 +1,144 @@
+"""Detects when the screen has stopped changing after an action."""
+
+import asyncio
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+
+from PIL import Image, ImageChops
+
+# frames are compared at 1/SAMPLE_REDUCTION of the screen size in each dimension
+SAMPLE_REDUCTION = 8
+# channel differences up to this much are compression or dithering noise
+PIXEL_TOLERANCE = 8
+
+
+@dataclass(frozen=True)
+class SettleResult:
+    """How long the screen took to settle, and whether it did before the timeout."""
+
+    settled: bool
+    elapsed: float
+    frames: int
+
+
+@dataclass(frozen=True)
+class SettleStats:
+    """How long the screen took to settle over a series of waits."""
+
+    waits: int = 0
+    timeouts: int = 0
+    mean: float = 0.0
+    slowest: float = 0.0
+
+    @classmethod
+    def of(cls, results: Iterable[SettleResult]) -> "SettleStats":
+        elapsed = []
+        timeouts = 0
+        for result in results:
+            elapsed.append(result.elapsed)
+            timeouts += not result.settled
+        if not elapsed:
+            return cls()
+        return cls(len(elapsed), timeouts, sum(elapsed) / len(elapsed), max(elapsed))
+
+
+@dataclass(frozen=True)
+class ChangeResult:
+    """How long the screen took to change, and whether it did before the timeout."""
+
+    changed: bool
+    elapsed: float
+    frames: int
+
+
+class SettleDetector:
+    """
+    Samples low resolution frames until consecutive frames have been the same for
+    `stable_window` seconds, or `timeout` seconds have passed.
+
+    A blinking caret or spinner would keep the screen from ever being identical, so
+    frames count as the same while at most `max_changed_fraction` of the sampled
+    pixels differ.
+    """
+
+    def __init__(
+        self,
+        sample_frame: Callable[[], Image.Image],
+        *,
+        stable_window: float = 0.3,
+        interval: float = 0.05,
+        timeout: float = 2.0,
+        max_changed_fraction: float = 0.001,
+    ):
+        self.sample_frame = sample_frame
+        self.stable_window = stable_window
+        self.interval = interval
+        self.timeout = timeout
+        self.max_changed_fraction = max_changed_fraction
+
+    async def wait(
+        self,
+        timeout: float | None = None,
+        *,
+        stable_window: float | None = None,
+        interval: float | None = None,
+    ) -> SettleResult:
+        """
+        Wait until the screen is stable, or for `timeout` seconds. Arguments that
+        are given override the detector's settings for this wait.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        stable_window = self.stable_window if stable_window is None else stable_window
+        interval = self.interval if interval is None else interval
+        start = time.monotonic()
+        previous = await asyncio.to_thread(self.sample_frame)
+        frames = 1
+        stable_since = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now - stable_since >= stable_window:
+                return SettleResult(settled=True, elapsed=now - start, frames=frames)
+            if now - start >= timeout:
+                return SettleResult(settled=False, elapsed=now - start, frames=frames)
+            await asyncio.sleep(interval)
+            frame = await asyncio.to_thread(self.sample_frame)
+            frames += 1
+            if self.changed(previous, frame):
+                stable_since = time.monotonic()
+            previous = frame
+
+    async def wait_for_change(self, timeout: float | None = None) -> ChangeResult:
+        """
+        Wait until the screen differs from how it looked when called, or for
+        `timeout` seconds if given.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        first = await asyncio.to_thread(self.sample_frame)
+        frames = 1
+        while time.monotonic() - start < timeout:
+            await asyncio.sleep(self.interval)
+            frame = await asyncio.to_thread(self.sample_frame)
+            frames += 1
+            if self.changed(first, frame):
+                return ChangeResult(
+                    changed=True, elapsed=time.monotonic() - start, frames=frames
+                )
+        return ChangeResult(changed=False, elapsed=time.monotonic() - start, frames=frames)
+
+    def changed(self, previous: Image.Image, frame: Image.Image) -> bool:
+        """Whether more than the tolerated fraction of pixels differ between frames."""
+        if previous.size != frame.size:
+            return True
+        difference = ImageChops.difference(
+            previous.convert("RGB"), frame.convert("RGB")
+        ).convert("L")
+        histogram = difference.histogram()
+        changed_pixels = sum(histogram[PIXEL_TOLERANCE + 1 :])
+        return changed_pixels > self.max_changed_fraction * frame.width * frame.height
+
+
+def reduce_frame(frame: Image.Image) -> Image.Image:
+    """Shrink a full resolution capture to the size settle detection compares."""
+    return frame.reduce(SAMPLE_REDUCTION)
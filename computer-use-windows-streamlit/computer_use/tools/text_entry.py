@@ -0,0 +1,104 @@
+"""Engines that enter text into the focused field, by keystrokes or by pasting."""
+
+import asyncio
+import platform
+import time
+from abc import ABCMeta, abstractmethod
+from dataclasses import dataclass
+from typing import Any, ClassVar
+
+try:
+    import pyperclip
+except ImportError:
+    pyperclip = None
+
+PASTE_CHORD = ("command", "v") if platform.system() == "Darwin" else ("ctrl", "v")
+
+
+def chunks(s: str, chunk_size: int) -> list[str]:
+    return [s[i : i + chunk_size] for i in range(0, len(s), chunk_size)]
+
+
+class ClipboardError(Exception):
+    """Raised when the clipboard cannot be read or written, so pasting is not possible."""
+
+
+@dataclass
+class TypingStats:
+    """Characters entered by an engine and the time it took."""
+
+    characters: int = 0
+    seconds: float = 0.0
+
+    @property
+    def chars_per_second(self) -> float:
+        return self.characters / self.seconds if self.seconds else 0.0
+
+
+class TypingEngine(metaclass=ABCMeta):
+    """Enters text with `keyboard`, a pyautogui-like module, recording throughput."""
+
+    name: ClassVar[str]
+
+    def __init__(self, keyboard: Any):
+        self.keyboard = keyboard
+        self.stats = TypingStats()
+
+    async def type(self, text: str):
+        start = time.perf_counter()
+        await self._type(text)
+        self.stats.characters += len(text)
+        self.stats.seconds += time.perf_counter() - start
+
+    @abstractmethod
+    async def _type(self, text: str): ...
+
+
+class KeystrokeTyping(TypingEngine):
+    """Types one key at a time, in groups so the event loop gets a turn in between."""
+
+    name = "keys"
+
+    def __init__(self, keyboard: Any, group_size: int, delay_ms: int):
+        super().__init__(keyboard)
+        self.group_size = group_size
+        self.delay_ms = delay_ms
+
+    async def _type(self, text: str):
+        for chunk in chunks(text, self.group_size):
+            await asyncio.to_thread(
+                self.keyboard.write, chunk, interval=self.delay_ms / 1000
+            )
+
+
+class PasteTyping(TypingEngine):
+    """
+    Puts the text on the clipboard and sends the paste chord, then restores what
+    the clipboard held before. Only text can be restored; other content, such as
+    a copied image, is replaced by the text that was typed.
+    """
+
+    name = "paste"
+
+    def __init__(self, keyboard: Any, clipboard: Any = None, restore_delay: float = 0.1):
+        super().__init__(keyboard)
+        self.clipboard = clipboard or pyperclip
+        # the target reads the clipboard when it handles the chord, not when it is sent
+        self.restore_delay = restore_delay
+
+    async def _type(self, text: str):
+        if self.clipboard is None:
+            raise ClipboardError("pyperclip is not installed")
+        try:
+            previous = await asyncio.to_thread(self.clipboard.paste)
+            await asyncio.to_thread(self.clipboard.copy, text)
+        except Exception as e:
+            raise ClipboardError(f"Clipboard is not available: {e}") from e
+        try:
+            await asyncio.to_thread(self.keyboard.hotkey, *PASTE_CHORD)
+            await asyncio.sleep(self.restore_delay)
+        finally:
+            try:
+                await asyncio.to_thread(self.clipboard.copy, previous)
+            except Exception:
+                pass
@@ -0,0 +1,172 @@
+"""
+Regions of interest for screen capture: a window found through a WindowProvider,
+or a fixed rectangle of the display.
+"""
+
+import os
+from abc import ABCMeta, abstractmethod
+from dataclasses import dataclass
+from typing import ClassVar
+
+from .base import ToolError
+
+try:
+    import pygetwindow
+except Exception:  # only implemented on Windows and macOS
+    pygetwindow = None
+
+# "foreground", "window:<part of a title>" or "left,top,right,bottom"; unset to
+# capture the whole display
+REGION_ENV_VAR = "COMPUTER_USE_CAPTURE_REGION"
+
+Box = tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class Window:
+    """A top-level window and its rectangle in display pixels, right and bottom exclusive."""
+
+    title: str
+    left: int
+    top: int
+    right: int
+    bottom: int
+
+    @property
+    def box(self) -> Box:
+        return self.left, self.top, self.right, self.bottom
+
+
+class WindowProvider(metaclass=ABCMeta):
+    """Looks up the rectangles of the desktop's windows."""
+
+    name: ClassVar[str]
+
+    @abstractmethod
+    def foreground(self) -> Window | None:
+        """The window that has the focus, if any."""
+        ...
+
+    @abstractmethod
+    def windows(self) -> list[Window]:
+        """Every visible window, in z-order from the top."""
+        ...
+
+    def find(self, title: str) -> Window | None:
+        """The topmost window whose title contains `title`, ignoring case."""
+        title = title.casefold()
+        for window in self.windows():
+            if title in window.title.casefold():
+                return window
+        return None
+
+
+class PyGetWindowProvider(WindowProvider):
+    """Windows of the desktop through pygetwindow, which comes with pyautogui."""
+
+    name = "pygetwindow"
+
+    def __init__(self):
+        if pygetwindow is None:
+            raise ToolError("pygetwindow is not available to find windows")
+
+    def foreground(self) -> Window | None:
+        window = pygetwindow.getActiveWindow()
+        return self._window(window) if window else None
+
+    def windows(self) -> list[Window]:
+        return [
+            window
+            for window in map(self._window, pygetwindow.getAllWindows())
+            if window is not None and window.title
+        ]
+
+    def _window(self, window) -> Window | None:
+        # minimized windows are parked far off screen
+        if window.isMinimized or window.width <= 0 or window.height <= 0:
+            return None
+        return Window(
+            window.title,
+            window.left,
+            window.top,
+            window.left + window.width,
+            window.top + window.height,
+        )
+
+
+class StaticWindowProvider(WindowProvider):
+    """
+    A fixed list of windows, the first of which has the focus. For running without
+    a desktop; assign `windows_list` to move, resize or refocus them.
+    """
+
+    name = "static"
+
+    def __init__(self, windows: list[Window] | None = None):
+        self.windows_list = list(windows or [])
+
+    def foreground(self) -> Window | None:
+        return self.windows_list[0] if self.windows_list else None
+
+    def windows(self) -> list[Window]:
+        return list(self.windows_list)
+
+
+def default_window_provider() -> WindowProvider:
+    return PyGetWindowProvider() if pygetwindow is not None else StaticWindowProvider()
+
+
+@dataclass(frozen=True)
+class RegionOfInterest:
+    """
+    The part of the display screenshots are restricted to: the foreground window,
+    the first window with `title` in its title, or a fixed `box`.
+    """
+
+    foreground: bool = False
+    title: str | None = None
+    box: Box | None = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "RegionOfInterest":
+        """A region from "foreground", "window:<title>" or "left,top,right,bottom"."""
+        if spec == "foreground":
+            return cls(foreground=True)
+        if spec.startswith("window:") and spec[len("window:") :].strip():
+            return cls(title=spec[len("window:") :].strip())
+        try:
+            left, top, right, bottom = (int(part) for part in spec.split(","))
+        except ValueError:
+            raise ToolError(
+                f"Unknown capture region {spec}, expected foreground, window:<title> "
+                "or left,top,right,bottom"
+            ) from None
+        if not (0 <= left < right and 0 <= top < bottom):
+            raise ToolError(f"Capture region {spec} is not a left,top,right,bottom box")
+        return cls(box=(left, top, right, bottom))
+
+    @classmethod
+    def from_env(cls) -> "RegionOfInterest | None":
+        spec = os.environ.get(REGION_ENV_VAR)
+        return cls.parse(spec) if spec else None
+
+    def resolve(self, provider: WindowProvider, display: tuple[int, int]) -> Box | None:
+        """
+        The region's box on a display of size `display`, clipped to it, or None when
+        the window is not there or lies entirely off the display.
+        """
+        if self.box:
+            box = self.box
+        else:
+            window = provider.foreground() if self.foreground else provider.find(
+                self.title or ""
+            )
+            if window is None:
+                return None
+            box = window.box
+        width, height = display
+        left, top = max(box[0], 0), max(box[1], 0)
+        right, bottom = min(box[2], width), min(box[3], height)
+        if left >= right or top >= bottom:
+            return None
+        return left, top, right, bottom
@@ -0,0 +1,87 @@
+import base64
+
+import pytest
+
+from computer_use.blobs import BlobStore
+
+
+def test_identical_frames_are_stored_once():
+    store = BlobStore()
+
+    first = store.put(b"frame")
+    second = store.put_base64(base64.b64encode(b"frame").decode())
+
+    assert first == second
+    assert store.stats.blobs == 1
+    assert store.stats.duplicates == 1
+    assert store.stats.memory_bytes == len(b"frame")
+
+
+def test_resolve_turns_references_into_base64_images():
+    store = BlobStore()
+    digest = store.put(b"frame")
+
+    block = store.image_block(digest)
+
+    assert block["source"]["type"] == "blob"
+    assert store.resolve(block) == {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": "image/png",
+            "data": base64.b64encode(b"frame").decode(),
+        },
+    }
+    # anything else is passed through as it is
+    assert store.resolve(store.resolve(block)) == store.resolve(block)
+
+
+def test_least_recently_used_blobs_spill_to_disk(tmp_path):
+    store = BlobStore(memory_limit=10, spill_dir=tmp_path)
+
+    old = store.put(b"a" * 8)
+    new = store.put(b"b" * 8)
+
+    assert (tmp_path / old).read_bytes() == b"a" * 8
+    assert not (tmp_path / new).exists()
+    assert store.stats.memory_bytes == 8
+    assert store.stats.spilled_bytes == 8
+    assert store.get(old) == b"a" * 8
+    assert store.put(b"a" * 8) == old
+    assert store.stats.blobs == 2
+
+
+def test_unknown_digest_raises():
+    with pytest.raises(KeyError):
+        BlobStore().get("0" * 64)
+
+
+def test_blobs_are_evicted_with_their_last_reference(tmp_path):
+    store = BlobStore(memory_limit=10, spill_dir=tmp_path)
+    spilled = store.put(b"a" * 8)
+    kept = store.put(b"b" * 8)
+    assert store.put(b"b" * 8) == kept
+
+    store.release(spilled)
+    store.release(kept)
+
+    assert spilled not in store
+    assert not (tmp_path / spilled).exists()
+    assert store.get(kept) == b"b" * 8
+    store.release_image_blocks([store.image_block(kept)])
+    assert kept not in store
+    assert store.stats.blobs == 0
+    assert store.stats.evicted == 2
+    assert store.stats.memory_bytes == store.stats.spilled_bytes == 0
+
+
+def test_close_deletes_spilled_blobs(tmp_path):
+    spill_dir = tmp_path / "blobs"
+    store = BlobStore(memory_limit=10, spill_dir=spill_dir)
+    store.put(b"a" * 8)
+    store.put(b"b" * 8)
+
+    store.close()
+
+    assert not spill_dir.exists()
+    assert store.stats.blobs == 0
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from computer_use.clients import APIProvider, ClientRegistry
+from fake_api import FakeAnthropicServer
+
+
+@pytest_asyncio.fixture
+async def registry():
+    registry = ClientRegistry()
+    yield registry
+    await registry.aclose()
+
+
+@pytest.fixture
+def local_server(monkeypatch):
+    with FakeAnthropicServer([]) as server:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        yield server
+
+
+@pytest.mark.asyncio
+async def test_client_registry_reuses_client_per_key(registry):
+    client = registry.get(APIProvider.ANTHROPIC, "key-1")
+    assert registry.get(APIProvider.ANTHROPIC, "key-1") is client
+    assert registry.get(APIProvider.ANTHROPIC, "key-2") is not client
+    assert registry.stats.clients_created == 2
+    assert registry.stats.clients_reused == 1
+
+
+@pytest.mark.asyncio
+async def test_client_registry_keys_by_region(registry, monkeypatch):
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    east = registry.get(APIProvider.BEDROCK)
+    monkeypatch.setenv("AWS_REGION", "us-west-2")
+    west = registry.get(APIProvider.BEDROCK)
+    assert east is not west
+    assert west.aws_region == "us-west-2"
+
+
+@pytest.mark.asyncio
+async def test_client_registry_accepts_provider_strings(registry):
+    assert registry.get("anthropic", "key") is registry.get(
+        APIProvider.ANTHROPIC, "key"
+    )
+
+
+def test_client_registry_keeps_clients_per_event_loop():
+    registry = ClientRegistry()
+
+    async def get_client():
+        return registry.get(APIProvider.ANTHROPIC, "key")
+
+    first = asyncio.run(get_client())
+    second = asyncio.run(get_client())
+    assert first is not second
+
+
+@pytest.mark.asyncio
+async def test_client_registry_warm_up_connection_is_reused(registry, local_server):
+    await registry.warm_up(APIProvider.ANTHROPIC, "key")
+    await registry.warm_up(APIProvider.ANTHROPIC, "key")
+
+    assert registry.stats.warm_ups == 2
+    assert registry.stats.requests == 2
+    assert registry.stats.connections_opened == 1
+    assert registry.stats.connections_reused == 1
+
+
+@pytest.mark.asyncio
+async def test_client_registry_warm_up_ignores_connection_errors(
+    registry, monkeypatch
+):
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", "http://127.0.0.1:9")
+    await registry.warm_up(APIProvider.ANTHROPIC, "key")
+    assert registry.stats.warm_ups == 0
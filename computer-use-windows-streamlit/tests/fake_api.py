@@ -0,0 +1,168 @@
+"""A local stand-in for the Anthropic Messages API, used by tests and benchmarks."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+STREAM_CHUNK_SIZE = 8
+
+
+def make_message(
+    content: list[dict[str, Any]],
+    stop_reason: str = "end_turn",
+    usage: dict[str, int] | None = None,
+):
+    """Build a Messages API response body with the given content blocks."""
+    return {
+        "id": "msg_fake",
+        "type": "message",
+        "role": "assistant",
+        "model": "fake-model",
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": usage or {"input_tokens": 10, "output_tokens": 10},
+    }
+
+
+def stream_events(message: dict[str, Any]) -> list[dict[str, Any]]:
+    """Split a response body into the server-sent events that stream it."""
+    events: list[dict[str, Any]] = [
+        {
+            "type": "message_start",
+            "message": {
+                **message,
+                "content": [],
+                "stop_reason": None,
+                "usage": {**message["usage"], "output_tokens": 0},
+            },
+        }
+    ]
+    for index, block in enumerate(message["content"]):
+        if block["type"] == "text":
+            start = {**block, "text": ""}
+            deltas = [
+                {"type": "text_delta", "text": block["text"][i : i + STREAM_CHUNK_SIZE]}
+                for i in range(0, len(block["text"]), STREAM_CHUNK_SIZE)
+            ]
+        else:
+            start = {**block, "input": {}}
+            partial_json = json.dumps(block["input"])
+            deltas = [
+                {
+                    "type": "input_json_delta",
+                    "partial_json": partial_json[i : i + STREAM_CHUNK_SIZE],
+                }
+                for i in range(0, len(partial_json), STREAM_CHUNK_SIZE)
+            ]
+        events.append(
+            {"type": "content_block_start", "index": index, "content_block": start}
+        )
+        events.extend(
+            {"type": "content_block_delta", "index": index, "delta": delta}
+            for delta in deltas
+        )
+        events.append({"type": "content_block_stop", "index": index})
+    events.append(
+        {
+            "type": "message_delta",
+            "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+            "usage": {"output_tokens": message["usage"]["output_tokens"]},
+        }
+    )
+    events.append({"type": "message_stop"})
+    return events
+
+
+class FakeAnthropicServer:
+    """
+    Serves scripted responses to POST /v1/messages on a local port.
+
+    Each request pops the next scripted response, waiting `delay` seconds before
+    answering. Streaming requests get the response as server-sent events, with
+    `event_delay` seconds between events. Request bodies are recorded in
+    `requests` and the time each streamed event was sent in `event_times`.
+    """
+
+    def __init__(
+        self,
+        responses: list[dict[str, Any]],
+        delay: float = 0.0,
+        event_delay: float = 0.0,
+    ):
+        self.responses = list(responses)
+        self.delay = delay
+        self.event_delay = event_delay
+        self.requests: list[dict[str, Any]] = []
+        self.event_times: list[tuple[str, float]] = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests.append(body)
+                time.sleep(server.delay)
+                response = server.responses.pop(0)
+                try:
+                    if body.get("stream"):
+                        self._send_stream(response)
+                    else:
+                        self._send_json(response)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client gave up on the request
+                    pass
+
+            def _send_json(self, response: dict[str, Any]):
+                payload = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_stream(self, response: dict[str, Any]):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for event in stream_events(response):
+                    time.sleep(server.event_delay)
+                    data = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                    self._write_chunk(data.encode())
+                    server.event_times.append((event["type"], time.monotonic()))
+                self._write_chunk(b"")
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
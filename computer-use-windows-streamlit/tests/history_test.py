@@ -0,0 +1,184 @@
+import copy
+import random
+
+from computer_use.history import (
+    DUPLICATE_SCREENSHOT_MARKER,
+    NEAR_DUPLICATE_SCREENSHOT_MARKER,
+    ImageIndex,
+    MessageHistory,
+    ScreenshotDeduplicator,
+)
+
+
+def _image(n: int):
+    return {
+        "type": "image",
+        "source": {"type": "base64", "media_type": "image/png", "data": f"img{n}"},
+    }
+
+
+def _tool_turn(n: int, images: int = 1):
+    return {
+        "role": "user",
+        "content": [
+            {
+                "type": "tool_result",
+                "tool_use_id": str(n),
+                "content": [{"type": "text", "text": f"result {n}"}]
+                + [_image(n * 10 + i) for i in range(images)],
+            }
+        ],
+    }
+
+
+def _remaining_images(messages):
+    return [
+        block["source"]["data"]
+        for message in messages
+        if isinstance(message["content"], list)
+        for item in message["content"]
+        if isinstance(item, dict) and item.get("type") == "tool_result"
+        for block in item["content"]
+        if isinstance(block, dict) and block.get("type") == "image"
+    ]
+
+
+def _reference_filter(messages, images_to_keep, min_removal_threshold):
+    """The full-rescan implementation the index replaced."""
+    tool_result_blocks = [
+        item
+        for message in messages
+        for item in (message["content"] if isinstance(message["content"], list) else [])
+        if isinstance(item, dict) and item.get("type") == "tool_result"
+    ]
+    total_images = sum(
+        1
+        for tool_result in tool_result_blocks
+        for content in tool_result.get("content", [])
+        if isinstance(content, dict) and content.get("type") == "image"
+    )
+    images_to_remove = total_images - images_to_keep
+    images_to_remove -= images_to_remove % min_removal_threshold
+    for tool_result in tool_result_blocks:
+        if isinstance(tool_result.get("content"), list):
+            new_content = []
+            for content in tool_result.get("content", []):
+                if isinstance(content, dict) and content.get("type") == "image":
+                    if images_to_remove > 0:
+                        images_to_remove -= 1
+                        continue
+                new_content.append(content)
+            tool_result["content"] = new_content
+
+
+def test_remove_oldest_images_in_chunks():
+    history = MessageHistory([{"role": "user", "content": "Hi"}])
+    for n in range(25):
+        history.append(_tool_turn(n))
+
+    history.image_index.remove_oldest_images(images_to_keep=3, min_removal_threshold=10)
+
+    # 22 images over the limit, removed in chunks of 10
+    assert len(history.image_index) == 5
+    assert _remaining_images(history) == [f"img{n * 10}" for n in range(20, 25)]
+    assert history[1]["content"][0]["content"] == [
+        {"type": "text", "text": "result 0"}
+    ]
+
+
+def test_index_catches_up_with_appended_messages():
+    messages = [_tool_turn(n) for n in range(5)]
+    index = ImageIndex(messages)
+    assert len(index) == 5
+
+    messages.append(_tool_turn(5, images=2))
+    assert len(index) == 7
+
+    messages.clear()
+    messages.append(_tool_turn(6))
+    assert len(index) == 1
+
+
+def test_index_matches_full_rescan_semantics():
+    rng = random.Random(0)
+    messages = [{"role": "user", "content": "Start"}]
+    expected = copy.deepcopy(messages)
+    index = ImageIndex(messages)
+    for n in range(300):
+        turn = rng.choice(
+            [
+                _tool_turn(n, images=rng.randint(0, 2)),
+                {"role": "assistant", "content": [{"type": "text", "text": "ok"}]},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "tool_result", "tool_use_id": str(n), "content": "err"}
+                    ],
+                },
+            ]
+        )
+        messages.append(copy.deepcopy(turn))
+        expected.append(copy.deepcopy(turn))
+        keep, threshold = rng.randint(1, 12), rng.randint(1, 10)
+
+        index.remove_oldest_images(keep, threshold)
+        _reference_filter(expected, keep, threshold)
+
+        assert messages == expected
+
+
+def _screenshot_turn(history: MessageHistory, digest: str, image_hash: str | None):
+    image = {
+        "type": "image",
+        "source": {"type": "blob", "media_type": "image/png", "digest": digest},
+    }
+    content = [image]
+    history.append(
+        {
+            "role": "user",
+            "content": [{"type": "tool_result", "tool_use_id": digest, "content": content}],
+        }
+    )
+    history.deduplicator.record(content, image, image_hash)
+
+
+def test_repeated_screenshot_is_replaced_by_a_marker():
+    history = MessageHistory()
+    deduplicator = history.deduplicator
+    _screenshot_turn(history, "a", "00ff")
+
+    assert deduplicator.marker("a", "00ff", history.image_index, 1000) == (
+        DUPLICATE_SCREENSHOT_MARKER
+    )
+    assert deduplicator.marker("b", "00ff", history.image_index, 1000) is None
+    assert deduplicator.stats.images_avoided == 1
+    assert deduplicator.stats.bytes_avoided == 1000
+
+
+def test_screenshot_is_sent_again_once_pruned_from_history():
+    history = MessageHistory()
+    _screenshot_turn(history, "a", None)
+    _screenshot_turn(history, "b", None)
+
+    history.image_index.remove_oldest_images(images_to_keep=0, min_removal_threshold=1)
+
+    assert history.deduplicator.marker("b", None, history.image_index, 1000) is None
+
+
+def test_near_duplicates_within_the_configured_distance():
+    history = MessageHistory()
+    history.deduplicator = ScreenshotDeduplicator(max_distance=2)
+    _screenshot_turn(history, "a", "00ff")
+
+    assert history.deduplicator.marker("b", "00fc", history.image_index, 1) == (
+        NEAR_DUPLICATE_SCREENSHOT_MARKER
+    )
+    assert history.deduplicator.marker("c", "00f0", history.image_index, 1) is None
+
+
+def test_near_duplicates_need_a_distance(monkeypatch):
+    monkeypatch.delenv("COMPUTER_USE_SCREENSHOT_DEDUP_DISTANCE", raising=False)
+    history = MessageHistory()
+    _screenshot_turn(history, "a", "00ff")
+
+    assert history.deduplicator.marker("b", "00ff", history.image_index, 1) is None
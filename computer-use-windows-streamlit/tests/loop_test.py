@@ -1,14 +1,27 @@
+import asyncio
+import base64
+import hashlib
+import time
 from unittest import mock
 
+import pytest
 from anthropic.types import TextBlock, ToolUseBlock
 from anthropic.types.beta import BetaMessage, BetaMessageParam
 
-from computer_use_demo.loop import APIProvider, sampling_loop
+from computer_use.blobs import BlobStore
+from computer_use.clients import ClientRegistry
+from computer_use.history import DUPLICATE_SCREENSHOT_MARKER
+from computer_use.loop import APIProvider, _with_cache_breakpoints, sampling_loop
+from computer_use.tools import BashTool, ToolCollection, ToolResult
+from fake_api import FakeAnthropicServer, make_message
 
 
+@pytest.mark.asyncio
 async def test_loop():
     client = mock.Mock()
+    client.beta.messages.with_raw_response.create = mock.AsyncMock()
     client.beta.messages.with_raw_response.create.return_value = mock.Mock()
+    client.beta.messages.with_raw_response.create.return_value.parse = mock.AsyncMock()
     client.beta.messages.with_raw_response.create.return_value.parse.side_effect = [
         mock.Mock(
             spec=BetaMessage,
@@ -23,18 +36,22 @@ async def test_loop():
     ]
 
     tool_collection = mock.AsyncMock()
+    tool_collection.to_params = mock.Mock(return_value=[])
+    tool_collection.lock_key = mock.Mock(return_value="desktop")
     tool_collection.run.return_value = mock.Mock(
-        output="Tool output", error=None, base64_image=None
+        output="Tool output", error=None, base64_image=None, image_digest=None
     )
 
     output_callback = mock.Mock()
     tool_output_callback = mock.Mock()
     api_response_callback = mock.Mock()
 
+    client_registry = ClientRegistry()
+
     with mock.patch(
-        "computer_use_demo.loop.Anthropic", return_value=client
-    ), mock.patch(
-        "computer_use_demo.loop.ToolCollection", return_value=tool_collection
+        "computer_use.clients.AsyncAnthropic", return_value=client
+    ) as anthropic, mock.patch(
+        "computer_use.loop.ToolCollection", return_value=tool_collection
     ):
         messages: list[BetaMessageParam] = [{"role": "user", "content": "Test message"}]
         result = await sampling_loop(
@@ -46,6 +63,7 @@ async def test_loop():
             tool_output_callback=tool_output_callback,
             api_response_callback=api_response_callback,
             api_key="test-key",
+            client_registry=client_registry,
         )
 
         assert len(result) == 4
@@ -62,3 +80,404 @@ async def test_loop():
         assert output_callback.call_count == 3
         assert tool_output_callback.call_count == 1
         assert api_response_callback.call_count == 2
+
+        # one client for the whole loop, not one per iteration
+        assert anthropic.call_count == 1
+        assert client_registry.stats.clients_created == 1
+
+
+@pytest.mark.asyncio
+async def test_loop_stop_aborts_in_flight_request(monkeypatch):
+    with FakeAnthropicServer(
+        [make_message([{"type": "text", "text": "Too late"}])], delay=5.0
+    ) as server:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        client_registry = ClientRegistry()
+        stop_event = asyncio.Event()
+        api_response_callback = mock.Mock()
+
+        with mock.patch("computer_use.loop.ToolCollection") as tool_collection:
+            tool_collection.return_value.aclose = mock.AsyncMock()
+            tool_collection.return_value.to_params.return_value = []
+            messages: list[BetaMessageParam] = [
+                {"role": "user", "content": "Test message"}
+            ]
+            loop_task = asyncio.create_task(
+                sampling_loop(
+                    model="test-model",
+                    provider=APIProvider.ANTHROPIC,
+                    system_prompt_suffix="",
+                    messages=messages,
+                    output_callback=mock.Mock(),
+                    tool_output_callback=mock.Mock(),
+                    api_response_callback=api_response_callback,
+                    api_key="test-key",
+                    client_registry=client_registry,
+                    stop_event=stop_event,
+                )
+            )
+            while not server.requests:
+                await asyncio.sleep(0.01)
+            start = time.monotonic()
+            stop_event.set()
+            result = await loop_task
+
+        assert time.monotonic() - start < 1.0
+        assert result == [{"role": "user", "content": "Test message"}]
+        api_response_callback.assert_not_called()
+        await client_registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_loop_streaming_dispatches_tools_before_message_ends(monkeypatch):
+    narration = "I have started both actions and will describe them while they run. " * 3
+    first_turn = make_message(
+        [
+            {
+                "type": "tool_use",
+                "id": "1",
+                "name": "bash",
+                "input": {"command": "echo first"},
+            },
+            {
+                "type": "tool_use",
+                "id": "2",
+                "name": "bash",
+                "input": {"command": "echo second"},
+            },
+            {"type": "text", "text": narration},
+        ],
+        stop_reason="tool_use",
+    )
+    second_turn = make_message([{"type": "text", "text": "Done!"}])
+
+    tool_calls: list[tuple[str, str, float]] = []
+
+    async def run_tool(*, name, tool_input):
+        tool_calls.append(("start", tool_input["command"], time.monotonic()))
+        await asyncio.sleep(0.05)
+        tool_calls.append(("end", tool_input["command"], time.monotonic()))
+        return ToolResult(output=tool_input["command"])
+
+    tool_collection = mock.Mock()
+    tool_collection.aclose = mock.AsyncMock()
+    tool_collection.to_params.return_value = []
+    tool_collection.lock_key.return_value = "session:bash"
+    tool_collection.run.side_effect = run_tool
+    output_callback = mock.Mock()
+    tool_output_callback = mock.Mock()
+
+    with FakeAnthropicServer([first_turn, second_turn], event_delay=0.01) as server:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        client_registry = ClientRegistry()
+        with mock.patch(
+            "computer_use.loop.ToolCollection", return_value=tool_collection
+        ):
+            messages: list[BetaMessageParam] = [
+                {"role": "user", "content": "Test message"}
+            ]
+            result = await sampling_loop(
+                model="test-model",
+                provider=APIProvider.ANTHROPIC,
+                system_prompt_suffix="",
+                messages=messages,
+                output_callback=output_callback,
+                tool_output_callback=tool_output_callback,
+                api_response_callback=mock.Mock(),
+                api_key="test-key",
+                client_registry=client_registry,
+                stream=True,
+            )
+        await client_registry.aclose()
+
+    assert all(request["stream"] for request in server.requests)
+    first_message_stop = next(t for name, t in server.event_times if name == "message_stop")
+    assert tool_calls[0][2] < first_message_stop
+
+    # tools still run one at a time, in block order
+    assert [(event, command) for event, command, _ in tool_calls] == [
+        ("start", "echo first"),
+        ("end", "echo first"),
+        ("start", "echo second"),
+        ("end", "echo second"),
+    ]
+
+    streamed_text = "".join(
+        call.args[0].text
+        for call in output_callback.call_args_list
+        if call.args[0].type == "text"
+    )
+    assert streamed_text == narration + "Done!"
+    tool_uses = [
+        call.args[0]
+        for call in output_callback.call_args_list
+        if call.args[0].type == "tool_use"
+    ]
+    assert [block.input for block in tool_uses] == [
+        {"command": "echo first"},
+        {"command": "echo second"},
+    ]
+
+    assert len(result) == 4
+    assert result[1]["content"][2].text == narration
+    assert [block["tool_use_id"] for block in result[2]["content"]] == ["1", "2"]
+    assert tool_output_callback.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_loop_against_fake_server(monkeypatch):
+    with FakeAnthropicServer(
+        [make_message([{"type": "text", "text": "Done!"}])]
+    ) as server:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        client_registry = ClientRegistry()
+        output_callback = mock.Mock()
+        api_response_callback = mock.Mock()
+        with mock.patch("computer_use.loop.ToolCollection") as tool_collection:
+            tool_collection.return_value.aclose = mock.AsyncMock()
+            tool_collection.return_value.to_params.return_value = []
+            result = await sampling_loop(
+                model="test-model",
+                provider=APIProvider.ANTHROPIC,
+                system_prompt_suffix="",
+                messages=[{"role": "user", "content": "Test message"}],
+                output_callback=output_callback,
+                tool_output_callback=mock.Mock(),
+                api_response_callback=api_response_callback,
+                api_key="test-key",
+                client_registry=client_registry,
+            )
+        await client_registry.aclose()
+
+    assert len(result) == 2
+    assert result[1]["content"][0].text == "Done!"
+    assert output_callback.call_args.args[0].text == "Done!"
+    assert api_response_callback.call_count == 1
+
+
+def test_with_cache_breakpoints_marks_most_recent_user_turns():
+    messages: list[BetaMessageParam] = [
+        {"role": "user", "content": "First"},
+        {"role": "assistant", "content": [TextBlock(type="text", text="Ok")]},
+        {"role": "user", "content": [TextBlock(type="text", text="Second")]},
+        {"role": "assistant", "content": [TextBlock(type="text", text="Ok")]},
+        {
+            "role": "user",
+            "content": [
+                {"type": "tool_result", "tool_use_id": "1", "content": []},
+                {"type": "tool_result", "tool_use_id": "2", "content": []},
+            ],
+        },
+    ]
+
+    cached = _with_cache_breakpoints(messages)
+
+    assert cached[0] is messages[0]
+    assert cached[2]["content"] == [
+        {"type": "text", "text": "Second", "cache_control": {"type": "ephemeral"}}
+    ]
+    assert cached[4]["content"][0] == messages[4]["content"][0]
+    assert cached[4]["content"][1]["cache_control"] == {"type": "ephemeral"}
+    # the history itself is left untouched
+    assert "cache_control" not in messages[4]["content"][1]
+    assert messages[2]["content"][0] == TextBlock(type="text", text="Second")
+
+
+@pytest.mark.asyncio
+async def test_loop_sets_cache_breakpoints_and_reports_usage(monkeypatch):
+    usage = {
+        "input_tokens": 5,
+        "output_tokens": 10,
+        "cache_creation_input_tokens": 200,
+        "cache_read_input_tokens": 3000,
+    }
+    with FakeAnthropicServer(
+        [make_message([{"type": "text", "text": "Done!"}], usage=usage)]
+    ) as server:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        client_registry = ClientRegistry()
+        usage_callback = mock.Mock()
+        with mock.patch("computer_use.loop.ToolCollection") as tool_collection:
+            tool_collection.return_value.aclose = mock.AsyncMock()
+            tool_collection.return_value.to_params.return_value = [
+                {"name": "bash", "type": "bash_20241022"},
+                {"name": "str_replace_editor", "type": "text_editor_20241022"},
+            ]
+            await sampling_loop(
+                model="test-model",
+                provider=APIProvider.ANTHROPIC,
+                system_prompt_suffix="",
+                messages=[{"role": "user", "content": "Test message"}],
+                output_callback=mock.Mock(),
+                tool_output_callback=mock.Mock(),
+                api_response_callback=mock.Mock(),
+                api_key="test-key",
+                client_registry=client_registry,
+                usage_callback=usage_callback,
+            )
+        await client_registry.aclose()
+
+    request = server.requests[0]
+    assert request["system"][0]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in request["tools"][0]
+    assert request["tools"][1]["cache_control"] == {"type": "ephemeral"}
+    assert request["messages"][0]["content"][-1]["cache_control"] == {
+        "type": "ephemeral"
+    }
+    reported = usage_callback.call_args.args[0]
+    assert reported.cache_read_input_tokens == 3000
+    assert reported.cache_creation_input_tokens == 200
+
+
+@pytest.mark.asyncio
+async def test_loop_keeps_screenshots_in_blob_store(monkeypatch):
+    screenshot = base64.b64encode(b"not really a png").decode()
+    tool_use = {"type": "tool_use", "name": "computer", "input": {"action": "screenshot"}}
+    with FakeAnthropicServer(
+        [
+            make_message([{**tool_use, "id": "1"}], stop_reason="tool_use"),
+            make_message([{**tool_use, "id": "2"}], stop_reason="tool_use"),
+            make_message([{"type": "text", "text": "Done!"}]),
+        ]
+    ) as server:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        client_registry = ClientRegistry()
+        blob_store = BlobStore()
+        tool_output_callback = mock.Mock()
+        with mock.patch("computer_use.loop.ToolCollection") as tool_collection:
+            tool_collection.return_value.aclose = mock.AsyncMock()
+            tool_collection.return_value.to_params.return_value = []
+            tool_collection.return_value.lock_key.return_value = "desktop"
+            tool_collection.return_value.run = mock.AsyncMock(
+                return_value=ToolResult(base64_image=screenshot)
+            )
+            result = await sampling_loop(
+                model="test-model",
+                provider=APIProvider.ANTHROPIC,
+                system_prompt_suffix="",
+                messages=[{"role": "user", "content": "Test message"}],
+                output_callback=mock.Mock(),
+                tool_output_callback=tool_output_callback,
+                api_response_callback=mock.Mock(),
+                api_key="test-key",
+                client_registry=client_registry,
+                blob_store=blob_store,
+            )
+        await client_registry.aclose()
+
+    # the history and the tool outputs only hold a reference
+    digest = tool_output_callback.call_args.args[0].image_digest
+    assert tool_output_callback.call_args.args[0].base64_image is None
+    image = result[2]["content"][0]["content"][0]
+    assert image["source"] == {
+        "type": "blob",
+        "media_type": "image/png",
+        "digest": digest,
+    }
+    assert blob_store.get(digest) == b"not really a png"
+    # the identical second frame was stored once, and is kept for the first
+    assert blob_store.stats.blobs == 1
+    assert blob_store.stats.duplicates == 1
+    assert blob_store.stats.evicted == 0
+    # and is only a marker in the history, the model already has the first one
+    assert result[4]["content"][0]["content"] == [
+        {"type": "text", "text": DUPLICATE_SCREENSHOT_MARKER}
+    ]
+    # while the API got the image data in both requests that carried it
+    sent = [(server.requests[1], 2), (server.requests[2], 2)]
+    sources = [
+        request["messages"][position]["content"][0]["content"][0]["source"]
+        for request, position in sent
+    ]
+    assert sources == 2 * [
+        {"type": "base64", "media_type": "image/png", "data": screenshot}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_loop_releases_screenshots_pruned_from_the_history(monkeypatch):
+    frames = [b"first frame", b"second frame"]
+    tool_use = {"type": "tool_use", "name": "computer", "input": {"action": "screenshot"}}
+    monkeypatch.setattr("computer_use.loop.IMAGE_REMOVAL_CHUNK_SIZE", 1)
+    with FakeAnthropicServer(
+        [
+            make_message([{**tool_use, "id": "1"}], stop_reason="tool_use"),
+            make_message([{**tool_use, "id": "2"}], stop_reason="tool_use"),
+            make_message([{"type": "text", "text": "Done!"}]),
+        ]
+    ) as server:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        client_registry = ClientRegistry()
+        blob_store = BlobStore()
+        with mock.patch("computer_use.loop.ToolCollection") as tool_collection:
+            tool_collection.return_value.aclose = mock.AsyncMock()
+            tool_collection.return_value.to_params.return_value = []
+            tool_collection.return_value.lock_key.return_value = "desktop"
+            tool_collection.return_value.run = mock.AsyncMock(
+                side_effect=[
+                    ToolResult(base64_image=base64.b64encode(frame).decode())
+                    for frame in frames
+                ]
+            )
+            await sampling_loop(
+                model="test-model",
+                provider=APIProvider.ANTHROPIC,
+                system_prompt_suffix="",
+                messages=[{"role": "user", "content": "Test message"}],
+                output_callback=mock.Mock(),
+                tool_output_callback=mock.Mock(),
+                api_response_callback=mock.Mock(),
+                api_key="test-key",
+                only_n_most_recent_images=1,
+                client_registry=client_registry,
+                blob_store=blob_store,
+            )
+        await client_registry.aclose()
+
+    first, second = (hashlib.sha256(frame).hexdigest() for frame in frames)
+    assert first not in blob_store
+    assert blob_store.get(second) == b"second frame"
+    assert blob_store.stats.evicted == 1
+
+
+@pytest.mark.asyncio
+async def test_loop_reuses_the_tool_collection_it_is_given(monkeypatch):
+    def bash_turn(id: str, command: str):
+        return make_message(
+            [{"type": "tool_use", "id": id, "name": "bash", "input": {"command": command}}],
+            stop_reason="tool_use",
+        )
+
+    done = make_message([{"type": "text", "text": "Done!"}])
+    bash = BashTool()
+    tool_collection = ToolCollection(bash)
+    tool_output_callback = mock.Mock()
+    messages: list[BetaMessageParam] = []
+    with FakeAnthropicServer(
+        [bash_turn("1", "cd / && echo one"), done, bash_turn("2", "pwd"), done]
+    ) as server, mock.patch("computer_use.loop.ToolCollection") as new_collection:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        client_registry = ClientRegistry()
+        for text in ["First", "Second"]:
+            messages.append({"role": "user", "content": text})
+            messages = await sampling_loop(
+                model="test-model",
+                provider=APIProvider.ANTHROPIC,
+                system_prompt_suffix="",
+                messages=messages,
+                output_callback=mock.Mock(),
+                tool_output_callback=tool_output_callback,
+                api_response_callback=mock.Mock(),
+                api_key="test-key",
+                client_registry=client_registry,
+                tool_collection=tool_collection,
+            )
+        await client_registry.aclose()
+
+    assert not new_collection.called
+    # the second call ran in the same shell, which the caller closes
+    outputs = [call.args[0].output for call in tool_output_callback.call_args_list]
+    assert outputs == ["one", "/"]
+    assert bash._session is not None
+    await tool_collection.aclose()
+    assert bash._session is None
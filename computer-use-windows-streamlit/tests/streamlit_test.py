@@ -1,23 +1,107 @@
+import asyncio
 from unittest import mock
 
 import pytest
 from streamlit.testing.v1 import AppTest
 
-from computer_use_demo.streamlit import Sender, TextBlock
+from computer_use.streamlit import Sender, TextBlock, _stop_on_rerun
+from computer_use.tools.computer import FRAME_RATE_ENV_VAR
 
 
 @pytest.fixture
 def streamlit_app():
-    return AppTest.from_file("computer_use_demo/streamlit.py")
+    return AppTest.from_file("../computer_use/streamlit.py")
 
 
 def test_streamlit(streamlit_app: AppTest):
     streamlit_app.run()
     streamlit_app.text_input[1].set_value("sk-ant-0000000000000").run()
-    with mock.patch("computer_use_demo.loop.sampling_loop") as patch:
+    with mock.patch("computer_use.loop.sampling_loop") as patch:
         streamlit_app.chat_input[0].set_value("Hello").run()
         assert patch.called
         assert patch.call_args.kwargs["messages"] == [
             {"role": Sender.USER, "content": [TextBlock(text="Hello", type="text")]}
         ]
         assert not streamlit_app.exception
+
+
+def test_streamlit_stop_button_keeps_agent_stopped(streamlit_app: AppTest):
+    streamlit_app.run()
+    streamlit_app.text_input[1].set_value("sk-ant-0000000000000").run()
+    with mock.patch("computer_use.loop.sampling_loop") as patch:
+        streamlit_app.session_state.agent_stopped = True
+        streamlit_app.session_state.messages.append(
+            {"role": Sender.USER, "content": [TextBlock(text="Hello", type="text")]}
+        )
+        streamlit_app.run()
+        assert not patch.called
+        streamlit_app.chat_input[0].set_value("Carry on").run()
+        assert patch.called
+        assert not streamlit_app.session_state.agent_stopped
+
+
+class _Rerun(BaseException):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_stop_on_rerun_sets_stop_event():
+    placeholder = mock.Mock()
+    placeholder.empty.side_effect = [None, None, _Rerun()]
+    stop_event = asyncio.Event()
+    with mock.patch("computer_use.streamlit.RERUN_POLL_INTERVAL", 0):
+        control = await _stop_on_rerun(stop_event, placeholder)
+    assert isinstance(control, _Rerun)
+    assert stop_event.is_set()
+    assert placeholder.empty.call_count == 3
+
+
+def test_streamlit_keeps_tools_across_turns(streamlit_app: AppTest, monkeypatch):
+    monkeypatch.setenv(FRAME_RATE_ENV_VAR, "2")
+    streamlit_app.run()
+    streamlit_app.text_input[1].set_value("sk-ant-0000000000000").run()
+    with mock.patch(
+        "computer_use.loop.sampling_loop", side_effect=lambda **kwargs: kwargs["messages"]
+    ) as patch:
+        streamlit_app.chat_input[0].set_value("Hello").run()
+        streamlit_app.chat_input[0].set_value("Again").run()
+    first, second = (call.kwargs["tool_collection"] for call in patch.call_args_list)
+    assert first is second
+    captions = [caption.value for caption in streamlit_app.sidebar.caption]
+    assert any(caption.startswith("Screen settling") for caption in captions)
+    assert any(caption.startswith("Text entry") for caption in captions)
+    assert any(caption.startswith("Background capture") for caption in captions)
+
+
+def test_streamlit_warms_up_once_the_page_is_drawn(streamlit_app: AppTest, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-ant-0000000000000")
+    with mock.patch("computer_use.clients.ClientRegistry.warm_up") as warm_up:
+        streamlit_app.run()
+        assert warm_up.call_count == 1
+        assert streamlit_app.chat_input
+        streamlit_app.run()
+        assert warm_up.call_count == 1
+
+
+def test_streamlit_reset_closes_the_session_tools(streamlit_app: AppTest):
+    streamlit_app.run()
+    streamlit_app.text_input[1].set_value("sk-ant-0000000000000").run()
+    with mock.patch(
+        "computer_use.loop.sampling_loop", side_effect=lambda **kwargs: kwargs["messages"]
+    ):
+        streamlit_app.chat_input[0].set_value("Hello").run()
+    tool_collection = streamlit_app.session_state.tool_collection
+    event_loop = streamlit_app.session_state.event_loop
+    reset = next(button for button in streamlit_app.button if button.label == "Reset")
+    with mock.patch.object(
+        tool_collection, "aclose", mock.AsyncMock()
+    ) as aclose, mock.patch("subprocess.run"), mock.patch(
+        "computer_use.clients.ClientRegistry.aclose"
+    ) as registry_aclose:
+        reset.click().run()
+
+    aclose.assert_awaited_once()
+    registry_aclose.assert_awaited_once()
+    assert streamlit_app.session_state.event_loop is event_loop
+    assert "tool_collection" not in streamlit_app.session_state
+    assert not streamlit_app.session_state.messages
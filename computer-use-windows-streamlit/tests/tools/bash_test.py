@@ -1,11 +1,17 @@
+import os
+import re
+
 import pytest
+import pytest_asyncio
 
-from computer_use_demo.tools.bash import BashTool, ToolError
+from computer_use.tools.bash import BashTool, ToolError
 
 
-@pytest.fixture
-def bash_tool():
-    return BashTool()
+@pytest_asyncio.fixture
+async def bash_tool():
+    bash_tool = BashTool()
+    yield bash_tool
+    await bash_tool.aclose()
 
 
 @pytest.mark.asyncio
@@ -18,6 +24,16 @@ async def test_bash_tool_restart(bash_tool):
     assert "Hello after restart" in result.output
 
 
+@pytest.mark.asyncio
+async def test_bash_tool_restart_removes_spilled_output(bash_tool):
+    result = await bash_tool(command="seq 1 100000")
+    path = re.search(r"the full output is in (\S+)", result.system).group(1)
+    assert os.path.exists(path)
+
+    await bash_tool(restart=True)
+    assert not os.path.exists(path)
+
+
 @pytest.mark.asyncio
 async def test_bash_tool_run_command(bash_tool):
     result = await bash_tool(command="echo 'Hello, World!'")
@@ -64,8 +80,9 @@ async def test_bash_tool_non_zero_exit(bash_tool):
 async def test_bash_tool_timeout(bash_tool):
     await bash_tool(command="echo 'Hello, World!'")
     bash_tool._session._timeout = 0.1  # Set a very short timeout for testing
-    with pytest.raises(
-        ToolError,
-        match="timed out: bash has not returned in 0.1 seconds and must be restarted",
-    ):
-        await bash_tool(command="sleep 1")
+    result = await bash_tool(command="sleep 1")
+    assert result.stats.interrupted_after == 0.1
+
+    # the interrupted command leaves the session usable
+    result = await bash_tool(command="echo 'Hello again'")
+    assert result.output.strip() == "Hello again"
@@ -0,0 +1,124 @@
+import time
+from unittest import mock
+
+import pytest
+
+from computer_use.tools.base import ToolError, ToolResult
+from computer_use.tools.capture import SyntheticBackend
+from computer_use.loop import _make_api_tool_result
+from computer_use.tools.computer import ComputerTool
+
+
+@pytest.fixture
+def input_device():
+    with mock.patch("computer_use.tools.computer.pyautogui") as pyautogui:
+        yield pyautogui
+
+
+@pytest.fixture
+def computer_tool(input_device):
+    tool = ComputerTool(capture_backend=SyntheticBackend((1920, 1080)))
+    tool.screenshot = mock.AsyncMock(return_value=ToolResult(base64_image="frame"))
+    return tool
+
+
+@pytest.mark.asyncio
+async def test_batch_runs_actions_in_order_with_one_screenshot(
+    computer_tool, input_device
+):
+    result = await computer_tool(
+        action="batch",
+        actions=[
+            {"action": "mouse_move", "coordinate": [683, 384]},
+            {"action": "left_click"},
+            {"action": "type", "text": "hello"},
+            {"action": "key", "text": "Tab"},
+            {"action": "left_click_drag", "coordinate": [0, 0]},
+        ],
+        pacing_ms=0,
+    )
+
+    assert [call[0] for call in input_device.method_calls] == [
+        "moveTo",
+        "click",
+        "write",
+        "press",
+        "dragTo",
+    ]
+    input_device.moveTo.assert_called_once_with(960, 540)
+    computer_tool.screenshot.assert_awaited_once_with(after="batch")
+    assert result.output == "Performed 5 actions"
+    assert result.base64_image == "frame"
+
+
+@pytest.mark.asyncio
+async def test_batch_validates_every_action_before_running_any(
+    computer_tool, input_device
+):
+    with pytest.raises(ToolError, match=r"actions\[2\]: text is required for type"):
+        await computer_tool(
+            action="batch",
+            actions=[
+                {"action": "left_click"},
+                {"action": "key", "text": "a"},
+                {"action": "type"},
+            ],
+        )
+    with pytest.raises(ToolError, match=r"actions\[0\]: screenshot cannot be batched"):
+        await computer_tool(action="batch", actions=[{"action": "screenshot"}])
+    with pytest.raises(ToolError, match="non-empty list"):
+        await computer_tool(action="batch", actions=[])
+
+    assert not input_device.method_calls
+    computer_tool.screenshot.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_batch_paces_actions(computer_tool, input_device):
+    start = time.monotonic()
+    await computer_tool(
+        action="batch",
+        actions=[{"action": "key", "text": "a"}] * 4,
+        pacing_ms=50,
+    )
+
+    # three pauses between four actions
+    assert time.monotonic() - start >= 0.15
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_the_action_that_failed(computer_tool, input_device):
+    input_device.press.side_effect = [None, RuntimeError("key is stuck")]
+
+    result = await computer_tool(
+        action="batch",
+        actions=[
+            {"action": "key", "text": "a"},
+            {"action": "key", "text": "b"},
+            {"action": "key", "text": "c"},
+        ],
+        pacing_ms=0,
+    )
+
+    assert "actions[1] (key) failed" in result.error
+    assert input_device.press.call_count == 2
+    computer_tool.screenshot.assert_awaited_once_with(after="batch")
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_sends_its_screenshot(computer_tool, input_device):
+    input_device.press.side_effect = RuntimeError("key is stuck")
+
+    result = await computer_tool(
+        action="batch", actions=[{"action": "key", "text": "a"}], pacing_ms=0
+    )
+    tool_result = _make_api_tool_result(result, "1")
+
+    assert tool_result["is_error"]
+    assert tool_result["content"] == [
+        {"type": "text", "text": result.error},
+        {
+            "type": "image",
+            "source": {"type": "base64", "media_type": "image/png", "data": "frame"},
+        },
+    ]
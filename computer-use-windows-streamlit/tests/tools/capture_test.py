@@ -0,0 +1,108 @@
+import asyncio
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from computer_use.tools.base import ToolError
+from computer_use.tools.capture import (
+    Frame,
+    SyntheticBackend,
+    get_capture_backend,
+)
+from computer_use.tools.computer import ComputerTool
+
+
+def test_frame_converts_raw_bgra_buffers_on_first_use():
+    # one blue and one red pixel, as 32 bit BGRA
+    frame = Frame(
+        data=bytes([255, 0, 0, 255, 0, 0, 255, 255]), size=(2, 1), raw_mode="BGRX"
+    )
+
+    assert frame.image().getpixel((0, 0)) == (0, 0, 255)
+    assert frame.image().getpixel((1, 0)) == (255, 0, 0)
+    assert frame.image() is frame.image()
+
+
+def test_synthetic_backend_is_deterministic_and_paintable():
+    first, second = SyntheticBackend((64, 48)), SyntheticBackend((64, 48))
+    assert first.capture().data == second.capture().data
+
+    first.paint((0, 0, 9, 9), (255, 0, 0))
+
+    frame = first.capture()
+    assert frame.image().getpixel((5, 5)) == (255, 0, 0)
+    assert frame.data != second.capture().data
+    assert first.stats.captures == 2
+    assert 0 < first.stats.fastest <= first.stats.mean <= first.stats.slowest
+
+
+def test_backends_capture_a_box_of_the_display():
+    backend = SyntheticBackend((64, 48))
+    backend.paint((10, 20, 19, 29), (255, 0, 0))
+
+    frame = backend.capture((10, 20, 30, 40))
+
+    assert frame.size == (20, 20)
+    assert frame.image().getpixel((0, 0)) == (255, 0, 0)
+    assert frame.image().getpixel((10, 10)) != (255, 0, 0)
+    assert backend.capture().crop((10, 20, 30, 40)).data == b""
+
+
+def test_get_capture_backend_shares_instances():
+    backend = get_capture_backend()
+
+    assert isinstance(backend, SyntheticBackend)
+    assert get_capture_backend("synthetic") is backend
+    with pytest.raises(ToolError):
+        get_capture_backend("framegrabber")
+
+
+@pytest.mark.asyncio
+async def test_computer_tool_captures_through_its_backend():
+    backend = SyntheticBackend((1920, 1080))
+    tool = ComputerTool(capture_backend=backend)
+
+    result = await tool(action="screenshot")
+
+    image = Image.open(io.BytesIO(base64.b64decode(result.base64_image)))
+    assert image.size == (1366, 768)
+    assert tool.to_params()["display_width_px"] == 1366
+    assert backend.stats.captures >= 2
+
+
+@pytest.mark.asyncio
+async def test_screenshot_waits_for_synthetic_redraws_to_finish():
+    backend = SyntheticBackend((320, 200))
+    tool = ComputerTool(capture_backend=backend)
+
+    async def redraw():
+        for shade in range(0, 250, 50):
+            backend.paint((0, 0, 319, 199), (shade, shade, shade))
+            await asyncio.sleep(0.1)
+
+    redrawing = asyncio.create_task(redraw())
+    result = await tool(action="screenshot")
+    await redrawing
+
+    action, settle = tool.settle_history[-1]
+    assert action == "screenshot"
+    assert settle.settled
+    assert settle.elapsed >= 0.4
+    assert tool.settle_stats.waits == 1
+    assert tool.settle_stats.slowest == settle.elapsed
+    image = Image.open(io.BytesIO(base64.b64decode(result.base64_image)))
+    assert image.getpixel((10, 10)) == (200, 200, 200)
+
+
+@pytest.mark.asyncio
+async def test_settle_settings_apply_to_the_next_screenshot():
+    tool = ComputerTool(capture_backend=SyntheticBackend((320, 200)))
+    tool._settle_window = 0
+
+    await tool(action="screenshot")
+
+    _, settle = tool.settle_history[-1]
+    assert settle.settled
+    assert settle.elapsed < 0.1
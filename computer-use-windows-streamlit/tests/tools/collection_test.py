@@ -0,0 +1,138 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from computer_use.tools.base import BaseAnthropicTool, ConcurrencyClass, ToolResult
+from computer_use.tools.collection import ToolCollection, ToolScheduler
+
+
+class RecordingTool(BaseAnthropicTool):
+    def __init__(self, name: str, concurrency: ConcurrencyClass, events: list):
+        self.name = name
+        self.concurrency = concurrency
+        self.events = events
+
+    async def __call__(self, *, label: str, delay: float = 0.02, **kwargs):
+        self.events.append(("start", label))
+        await asyncio.sleep(delay)
+        self.events.append(("end", label))
+        return ToolResult(output=label)
+
+    def to_params(self):
+        return {"name": self.name, "type": "custom"}
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+@pytest.fixture
+def tool_collection(events):
+    return ToolCollection(
+        RecordingTool("computer", ConcurrencyClass.EXCLUSIVE_DESKTOP, events),
+        RecordingTool("bash", ConcurrencyClass.PER_SESSION, events),
+        RecordingTool("str_replace_editor", ConcurrencyClass.PER_PATH, events),
+    )
+
+
+async def _run_all(tool_collection, calls):
+    scheduler = ToolScheduler(tool_collection)
+    runs = [scheduler.submit(name=name, tool_input=tool_input) for name, tool_input in calls]
+    return [await run for run in runs]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_keeps_computer_actions_in_order(tool_collection, events):
+    results = await _run_all(
+        tool_collection,
+        [
+            ("computer", {"label": "click", "delay": 0.05}),
+            ("computer", {"label": "type", "delay": 0.0}),
+        ],
+    )
+    assert [result.output for result in results] == ["click", "type"]
+    assert events == [
+        ("start", "click"),
+        ("end", "click"),
+        ("start", "type"),
+        ("end", "type"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_overlaps_independent_tools(tool_collection, events):
+    results = await _run_all(
+        tool_collection,
+        [
+            ("str_replace_editor", {"label": "edit", "path": "/tmp/a.txt", "delay": 0.05}),
+            ("str_replace_editor", {"label": "other", "path": "/tmp/b.txt"}),
+            ("computer", {"label": "screenshot"}),
+        ],
+    )
+    # results come back in block order even though the first edit finishes last
+    assert [result.output for result in results] == ["edit", "other", "screenshot"]
+    assert events[:3] == [("start", "edit"), ("start", "other"), ("start", "screenshot")]
+    assert events[-1] == ("end", "edit")
+
+
+@pytest.mark.asyncio
+async def test_scheduler_orders_edits_to_the_same_path(tool_collection, events):
+    await _run_all(
+        tool_collection,
+        [
+            ("str_replace_editor", {"label": "first", "path": "/tmp/a.txt", "delay": 0.05}),
+            ("str_replace_editor", {"label": "other", "path": "/tmp/b.txt"}),
+            ("str_replace_editor", {"label": "second", "path": "/tmp/./a.txt"}),
+        ],
+    )
+    assert events.index(("end", "first")) < events.index(("start", "second"))
+    assert events.index(("start", "other")) < events.index(("end", "first"))
+
+
+@pytest.mark.asyncio
+async def test_scheduler_orders_calls_in_the_same_shell_session(tool_collection, events):
+    await _run_all(
+        tool_collection,
+        [
+            ("bash", {"label": "cd", "delay": 0.05}),
+            ("bash", {"label": "ls"}),
+        ],
+    )
+    assert events == [("start", "cd"), ("end", "cd"), ("start", "ls"), ("end", "ls")]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_reports_invalid_tools(tool_collection):
+    results = await _run_all(tool_collection, [("missing", {})])
+    assert results[0].error == "Tool missing is invalid"
+
+
+def test_lock_key_normalizes_paths(tool_collection):
+    key = tool_collection.lock_key(
+        name="str_replace_editor", tool_input={"path": str(Path("/tmp/dir/../a.txt"))}
+    )
+    assert key == tool_collection.lock_key(
+        name="str_replace_editor", tool_input={"path": "/tmp/a.txt"}
+    )
+
+
+@pytest.mark.asyncio
+async def test_scheduler_orders_shell_commands_and_edits(tool_collection, events):
+    await _run_all(
+        tool_collection,
+        [
+            ("str_replace_editor", {"label": "create", "path": "/tmp/a.txt", "delay": 0.05}),
+            ("str_replace_editor", {"label": "other", "path": "/tmp/b.txt", "delay": 0.05}),
+            ("computer", {"label": "screenshot", "delay": 0.05}),
+            ("bash", {"label": "cat", "delay": 0.05}),
+            ("str_replace_editor", {"label": "edit", "path": "/tmp/a.txt"}),
+        ],
+    )
+    # the command sees both files as written, and the edit what the command left
+    assert events.index(("end", "create")) < events.index(("start", "cat"))
+    assert events.index(("end", "other")) < events.index(("start", "cat"))
+    assert events.index(("end", "cat")) < events.index(("start", "edit"))
+    # the desktop is unaffected
+    assert events.index(("start", "screenshot")) < events.index(("end", "create"))
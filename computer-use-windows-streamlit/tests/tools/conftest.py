@@ -0,0 +1,38 @@
+import base64
+import io
+from unittest import mock
+
+import pytest
+from PIL import Image
+
+from computer_use.tools.capture import SyntheticBackend
+from computer_use.tools.computer import ComputerTool
+
+
+@pytest.fixture
+def desktop():
+    return SyntheticBackend((1920, 1080))
+
+
+@pytest.fixture
+def tool_options():
+    """Keyword arguments for the `tool` fixture's ComputerTool, for modules to override."""
+    return {}
+
+
+@pytest.fixture
+def tool(desktop, tool_options):
+    with mock.patch("computer_use.tools.computer.pyautogui", None):
+        tool = ComputerTool(capture_backend=desktop, **tool_options)
+        tool._settle_window = 0
+        yield tool
+
+
+@pytest.fixture
+def decode():
+    """Opens the screenshot of a tool result."""
+
+    def decode(result) -> Image.Image:
+        return Image.open(io.BytesIO(base64.b64decode(result.base64_image)))
+
+    return decode
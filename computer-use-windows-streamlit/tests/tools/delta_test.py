@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from computer_use.tools.capture import Frame
+from computer_use.tools.computer import ComputerTool
+from computer_use.tools.delta import (
+    Region,
+    changed_regions,
+    changed_tiles,
+    perceptual_hash,
+    tile_regions,
+)
+
+
+def test_changed_tiles_ignore_noise():
+    previous = np.zeros((40, 40, 3), np.uint8)
+    current = previous.copy()
+    current[5, 5] = 255
+    current[30:, 30:] = 3
+
+    tiles = changed_tiles(previous, current, tile_size=16)
+
+    assert tiles.tolist() == [
+        [True, False, False],
+        [False, False, False],
+        [False, False, False],
+    ]
+
+
+def test_touching_tiles_merge_into_one_region():
+    tiles = np.zeros((4, 6), bool)
+    tiles[0, 0] = tiles[1, 1] = True
+    tiles[3, 4:6] = True
+
+    regions = tile_regions(tiles, tile_size=10, size=(55, 40))
+
+    assert regions == [Region(0, 0, 20, 20), Region(40, 30, 55, 40)]
+
+
+def test_raw_and_converted_frames_compare_by_pixels():
+    image = Image.new("RGB", (32, 32), (10, 20, 30))
+    bgrx = bytes([30, 20, 10, 0]) * 32 * 32
+
+    assert changed_regions(Frame.from_image(image), Frame(bgrx, (32, 32), "BGRX")) == []
+
+
+def test_perceptual_hash_tells_large_changes_apart(desktop):
+    before = perceptual_hash(desktop.capture())
+    desktop.paint((400, 300, 1400, 800), (250, 250, 250))
+    after = perceptual_hash(desktop.capture())
+
+    assert len(before) == len(after) == 64
+    assert (int(before, 16) ^ int(after, 16)).bit_count() > 8
+
+
+@pytest.fixture
+def tool_options():
+    return {"delta_screenshots": True}
+
+
+@pytest.mark.asyncio
+async def test_small_changes_are_sent_cropped(tool, desktop, decode):
+    first = await tool.screenshot()
+    assert decode(first).size == (1366, 768)
+    assert first.output is None
+    assert first.image_hash
+
+    # a checkbox toggles
+    desktop.paint((100, 200, 115, 215), (0, 120, 215))
+    result = await tool.screenshot()
+
+    # the 16 pixel tiles around (96, 192, 128, 224), scaled to the API resolution
+    assert "(68, 137, 91, 159)" in result.output
+    assert "top-left corner at (68, 137)" in result.output
+    assert decode(result).size == (23, 22)
+
+
+@pytest.mark.asyncio
+async def test_large_changes_are_sent_whole(tool, desktop, decode):
+    await tool.screenshot()
+
+    # a dialog opens over most of the screen
+    desktop.paint((100, 100, 1800, 1000), (250, 250, 250))
+    result = await tool.screenshot()
+
+    assert "Regions changed" in result.output
+    assert decode(result).size == (1366, 768)
+
+
+@pytest.mark.asyncio
+async def test_unchanged_screen_is_sent_as_text_until_a_full_frame_is_due(tool, decode):
+    await tool.screenshot()
+
+    results = [await tool.screenshot() for _ in range(tool._max_consecutive_deltas + 1)]
+
+    assert all(result.base64_image is None for result in results[:-1])
+    assert results[0].output == (
+        "The screen has not changed since the previous screenshot."
+    )
+    assert decode(results[-1]).size == (1366, 768)
+
+
+@pytest.mark.asyncio
+async def test_without_delta_screenshots_changes_are_only_listed(desktop, decode):
+    tool = ComputerTool(capture_backend=desktop, delta_screenshots=False)
+    await tool.screenshot()
+
+    desktop.paint((0, 0, 15, 15), (255, 0, 0))
+    result = await tool.screenshot()
+
+    assert result.output.endswith("(0, 0, 11, 11).")
+    assert decode(result).size == (1366, 768)
@@ -0,0 +1,32 @@
+import base64
+import io
+
+from PIL import Image
+
+from computer_use.tools.encoding import PngOptions, encode_png, encode_png_base64
+
+
+def test_encode_png_resizes_in_memory():
+    image = Image.linear_gradient("L").convert("RGB")
+
+    data = encode_png(image, (128, 64))
+
+    decoded = Image.open(io.BytesIO(data))
+    assert decoded.format == "PNG"
+    assert decoded.size == (128, 64)
+
+
+def test_compression_settings_trade_size_for_time():
+    image = Image.linear_gradient("L").convert("RGB")
+
+    stored = encode_png(image, options=PngOptions(compress_level=0))
+    compressed = encode_png(image, options=PngOptions(compress_level=9))
+
+    assert len(compressed) < len(stored)
+    assert Image.open(io.BytesIO(compressed)).tobytes() == image.tobytes()
+
+
+def test_encode_png_base64_matches_encode_png():
+    image = Image.new("RGB", (10, 10), (1, 2, 3))
+
+    assert base64.b64decode(encode_png_base64(image)) == encode_png(image)
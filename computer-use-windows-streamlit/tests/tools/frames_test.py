@@ -0,0 +1,79 @@
+import asyncio
+import base64
+import io
+import time
+from unittest import mock
+
+import pytest
+from PIL import Image
+
+from computer_use.tools.capture import SyntheticBackend
+from computer_use.tools.computer import ComputerTool
+from computer_use.tools.frames import FrameRingBuffer
+
+
+@pytest.mark.asyncio
+async def test_ring_keeps_the_most_recent_frames():
+    buffer = FrameRingBuffer(SyntheticBackend((64, 48)), rate=100, capacity=3)
+
+    buffer.start()
+    await asyncio.sleep(0.2)
+    await buffer.stop()
+
+    assert len(buffer.frames) == 3
+    assert buffer.stats.frames > 3
+    assert buffer.stats.unchanged == buffer.stats.frames - 1
+    assert buffer.stats.capture_cpu_seconds > 0
+    assert 0 < buffer.stats.cpu_fraction < 1
+    assert not buffer.running
+    # the share is of the time the buffer ran, not of the time since
+    cpu_fraction = buffer.stats.cpu_fraction
+    await asyncio.sleep(0.1)
+    assert buffer.stats.cpu_fraction == cpu_fraction
+
+
+@pytest.mark.asyncio
+async def test_unchanged_frames_share_their_encoding():
+    backend = SyntheticBackend((64, 48))
+    buffer = FrameRingBuffer(backend, rate=100)
+    encode = mock.Mock(side_effect=lambda frame: f"png of {len(frame.data)} bytes")
+
+    buffer.start()
+    first = await buffer.wait_for_frame(0, timeout=1)
+    assert buffer.encode(first, "key", encode) == "png of 9216 bytes"
+    await asyncio.sleep(0.05)
+    same = buffer.newest(0)
+    assert same is not first
+    buffer.encode(same, "key", encode)
+    backend.paint((0, 0, 10, 10), (255, 0, 0))
+    changed = await buffer.wait_for_frame(time.monotonic(), timeout=1)
+    buffer.encode(changed, "key", encode)
+    await buffer.stop()
+
+    assert encode.call_count == 2
+    assert buffer.stats.encodes == 2
+    assert buffer.stats.encode_reuses == 1
+
+
+@pytest.mark.asyncio
+async def test_screenshot_is_answered_from_a_frame_newer_than_the_last_input():
+    backend = SyntheticBackend((320, 200))
+    with mock.patch("computer_use.tools.computer.pyautogui") as pyautogui:
+        tool = ComputerTool(capture_backend=backend, frame_rate=50)
+        # the click turns the screen red, after a moment
+        pyautogui.click.side_effect = lambda **kwargs: backend.paint(
+            (0, 0, 319, 199), (255, 0, 0)
+        )
+        await tool(action="screenshot")
+        await tool._perform("left_click", None, None)
+
+        start = time.monotonic()
+        result = await tool(action="screenshot")
+        elapsed = time.monotonic() - start
+        await tool.aclose()
+
+    image = Image.open(io.BytesIO(base64.b64decode(result.base64_image)))
+    assert image.getpixel((5, 5)) == (255, 0, 0)
+    # no settle wait, at most a frame interval plus the encode
+    assert elapsed < 0.2
+    assert not tool.frame_buffer.running
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from computer_use.tools.base import ToolError
+from computer_use.tools.locate import TemplateLocator, correlate
+
+
+def icon(seed: int, size: int = 48) -> Image.Image:
+    """A textured square, like an icon, that is unlike the plain synthetic desktop."""
+    cells = np.random.default_rng(seed).integers(0, 255, (12, 12, 3), dtype=np.uint8)
+    return Image.fromarray(cells).resize((size, size), Image.Resampling.BILINEAR)
+
+
+def test_correlate_peaks_where_the_template_is():
+    image = np.random.default_rng(0).random((60, 80)).astype(np.float32)
+    template = image[20:30, 40:55]
+
+    scores = correlate(image, template)
+
+    assert scores.shape == (51, 66)
+    assert np.unravel_index(np.argmax(scores), scores.shape) == (20, 40)
+    assert scores[20, 40] == pytest.approx(1, abs=1e-4)
+
+
+@pytest.mark.asyncio
+async def test_locator_finds_scaled_copies_and_ignores_others():
+    screen = Image.linear_gradient("L").resize((1280, 800)).convert("RGB")
+    screen.paste(icon(1), (100, 200))
+    screen.paste(icon(1).resize((53, 53)), (900, 600))
+    screen.paste(icon(2), (500, 300))
+    locator = TemplateLocator(max_workers=2)
+
+    matches = await locator.locate(screen, locator.add_image(icon(1)))
+    locator.close()
+
+    assert [(match.left, match.top, match.scale) for match in matches] == [
+        (100, 200, 1.0),
+        (900, 600, 1.1),
+    ]
+    assert matches[0].confidence > matches[1].confidence > 0.9
+
+
+def test_templates_are_cached_by_digest():
+    locator = TemplateLocator(cache_size=2)
+    first = locator.add_image(icon(1))
+
+    assert locator.add_image(icon(1)) is first
+    assert locator.get(first.digest) is first
+    locator.add_image(icon(2))
+    locator.add_image(icon(3))
+    assert locator.get(first.digest) is None
+
+
+@pytest.mark.asyncio
+async def test_locate_a_saved_region_again(tool, desktop):
+    desktop.paste(icon(3), (960, 540))
+    saved = await tool.locate(region=[683, 384, 717, 418])
+    digest = saved.output.split("as template ")[1].split(".")[0]
+
+    # the icon moved
+    desktop.paint((960, 540, 1008, 588), (0, 0, 0))
+    desktop.paste(icon(3), (192, 108))
+    result = await tool.locate(template=digest)
+
+    assert result.base64_image is None
+    # the center of the icon, scaled to the API's 1366x768
+    assert result.output.startswith("Found 1 match for the template")
+    assert "(154, 94)" in result.output
+    await tool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_saved_templates_outlive_the_turn(tool, desktop):
+    desktop.paste(icon(3), (960, 540))
+    saved = await tool.locate(region=[683, 384, 717, 418])
+    digest = saved.output.split("as template ")[1].split(".")[0]
+    # sampling_loop closes the tools at the end of every turn
+    await tool.aclose()
+
+    result = await tool.locate(template=digest)
+
+    assert result.output.startswith("Found 1 match for the template")
+    await tool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_locate_a_template_file(tool, desktop, tmp_path):
+    path = tmp_path / "icon.png"
+    icon(4).save(path)
+
+    assert (await tool.locate(template=str(path))).output.startswith("No match")
+    desktop.paste(icon(4), (0, 0))
+    assert "(17, 17) 1.00" in (await tool.locate(template=str(path))).output
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"template": "missing.png"},
+        {"template": "x.png", "region": [0, 0, 10, 10]},
+        {"region": [0, 0, 10, 10], "threshold": 2},
+    ],
+)
+async def test_locate_rejects_invalid_calls(tool, kwargs):
+    with pytest.raises(ToolError):
+        await tool.locate(**kwargs)
@@ -0,0 +1,102 @@
+from unittest import mock
+
+import pytest
+
+from computer_use.tools.base import ToolError
+from computer_use.tools.computer import ComputerTool, ScalingSource
+from computer_use.tools.windows import RegionOfInterest, StaticWindowProvider, Window
+
+NOTEPAD = Window("Untitled - Notepad", 200, 100, 1000, 700)
+BROWSER = Window("Example Domain - Edge", 0, 0, 1920, 1040)
+
+
+@pytest.fixture
+def windows():
+    return StaticWindowProvider([NOTEPAD, BROWSER])
+
+
+@pytest.fixture
+def gui():
+    with mock.patch("computer_use.tools.computer.pyautogui") as gui:
+        yield gui
+
+
+def make_tool(desktop, windows, region) -> ComputerTool:
+    tool = ComputerTool(
+        capture_backend=desktop, region_of_interest=region, window_provider=windows
+    )
+    # read on every screenshot, so none of them waits for the screen to settle
+    tool._settle_window = 0
+    return tool
+
+
+def test_parse_region_specs():
+    assert RegionOfInterest.parse("foreground") == RegionOfInterest(foreground=True)
+    assert RegionOfInterest.parse("window: Notepad") == RegionOfInterest(title="Notepad")
+    assert RegionOfInterest.parse("10,20,110,220") == RegionOfInterest(box=(10, 20, 110, 220))
+    for spec in ("window:", "1,2,3", "5,5,1,1", "somewhere"):
+        with pytest.raises(ToolError):
+            RegionOfInterest.parse(spec)
+
+
+def test_regions_resolve_to_boxes_clipped_to_the_display(windows):
+    display = (1920, 1080)
+
+    assert RegionOfInterest(foreground=True).resolve(windows, display) == NOTEPAD.box
+    assert RegionOfInterest(title="EDGE").resolve(windows, display) == BROWSER.box
+    assert RegionOfInterest(title="Paint").resolve(windows, display) is None
+    assert RegionOfInterest(box=(1800, 1000, 2500, 1200)).resolve(windows, display) == (
+        1800,
+        1000,
+        1920,
+        1080,
+    )
+
+
+@pytest.mark.asyncio
+async def test_screenshots_and_clicks_cover_the_window(desktop, windows, gui, decode):
+    desktop.paint((200, 100, 209, 109), (255, 0, 0))
+    tool = make_tool(desktop, windows, "window:notepad")
+
+    result = await tool(action="screenshot")
+
+    # the 800x600 window is small enough to be sent as it is
+    assert tool.to_params()["display_width_px"] == 800
+    image = decode(result)
+    assert image.size == (800, 600)
+    assert image.getpixel((0, 0)) == (255, 0, 0)
+
+    await tool(action="mouse_move", coordinate=[400, 300])
+    gui.moveTo.assert_called_with(600, 400)
+    assert tool.scale_coordinates(ScalingSource.COMPUTER, 600, 400) == (400, 300)
+
+
+@pytest.mark.asyncio
+async def test_coordinates_follow_the_window_when_it_moves(desktop, windows, gui):
+    tool = make_tool(desktop, windows, RegionOfInterest(foreground=True))
+
+    windows.windows_list = [Window(NOTEPAD.title, 300, 150, 1100, 750), BROWSER]
+    await tool(action="mouse_move", coordinate=[10, 10])
+
+    gui.moveTo.assert_called_with(310, 160)
+
+
+@pytest.mark.asyncio
+async def test_missing_window_falls_back_to_the_display(desktop, windows, gui, decode):
+    tool = make_tool(desktop, windows, "window:notepad")
+    assert tool.to_params()["display_width_px"] == 800
+
+    windows.windows_list = [BROWSER]
+    result = await tool(action="screenshot")
+
+    assert tool.to_params()["display_width_px"] == 1366
+    assert decode(result).size == (1366, 768)
+
+
+@pytest.mark.asyncio
+async def test_large_regions_are_scaled_like_the_display(desktop, windows, gui):
+    tool = make_tool(desktop, windows, "0,0,1920,1080")
+
+    await tool(action="mouse_move", coordinate=[683, 384])
+
+    gui.moveTo.assert_called_with(960, 540)
@@ -0,0 +1,59 @@
+import pytest
+
+from computer_use.tools.base import ToolError
+from computer_use.tools.capture import SyntheticBackend
+from computer_use.tools.computer import ComputerTool, ScalingSource, scaling_transform
+
+
+def test_scaling_transform_picks_target_by_aspect_ratio():
+    transform = scaling_transform(1920, 1080, True)
+
+    assert (transform.target_width, transform.target_height) == (1366, 768)
+    assert transform.to_api(1920, 1080) == (1366, 768)
+    assert transform.from_api(683, 384) == (960, 540)
+    with pytest.raises(ToolError):
+        transform.from_api(2000, 100)
+
+
+def test_unscaled_geometries_pass_coordinates_through():
+    # already small enough, an unknown aspect ratio, or scaling turned off
+    for transform in (
+        scaling_transform(1024, 768, True),
+        scaling_transform(1000, 1000, True),
+        scaling_transform(1920, 1080, False),
+    ):
+        assert not transform.scaled
+        assert transform.to_api(5000, 7) == (5000, 7)
+        assert transform.from_api(5000, 7) == (5000, 7)
+
+
+def test_transforms_are_computed_once_per_geometry():
+    assert scaling_transform(2560, 1600, True) is scaling_transform(2560, 1600, True)
+
+
+def test_tool_params_are_cached_until_the_display_changes():
+    tool = ComputerTool(capture_backend=SyntheticBackend((1920, 1080)))
+
+    params = tool.to_params()
+    assert tool.to_params() is params
+    assert tool.scale_coordinates(ScalingSource.COMPUTER, 1920, 1080) == (1366, 768)
+
+    tool.on_display_change(2560, 1600)
+
+    assert tool.to_params() is not params
+    assert tool.to_params()["display_width_px"] == 1280
+    assert tool.scale_coordinates(ScalingSource.API, 1280, 800) == (2560, 1600)
+
+
+@pytest.mark.asyncio
+async def test_screenshot_notices_a_new_resolution():
+    backend = SyntheticBackend((1920, 1080))
+    tool = ComputerTool(capture_backend=backend)
+    assert tool.to_params()["display_width_px"] == 1366
+
+    # the capture backend now reports frames of a different size
+    tool.capture_backend = SyntheticBackend((2560, 1600))
+    await tool.screenshot()
+
+    assert (tool.width, tool.height) == (2560, 1600)
+    assert tool.to_params()["display_width_px"] == 1280
@@ -0,0 +1,101 @@
+import pytest
+from PIL import Image
+
+from computer_use.tools.settle import SettleDetector, SettleResult, SettleStats
+
+
+class FakeDisplay:
+    """Returns a different frame for each of the first `changes` samples, then repeats."""
+
+    def __init__(self, changes: int, size=(64, 48)):
+        self.changes = changes
+        self.size = size
+        self.samples = 0
+
+    def sample(self) -> Image.Image:
+        self.samples += 1
+        shade = min(self.samples, self.changes) * 20 % 256
+        return Image.new("RGB", self.size, (shade, shade, shade))
+
+
+def detector(display, **kwargs) -> SettleDetector:
+    options = dict(stable_window=0.05, interval=0.01, timeout=1.0)
+    return SettleDetector(display.sample, **{**options, **kwargs})
+
+
+@pytest.mark.asyncio
+async def test_returns_once_frames_are_stable():
+    display = FakeDisplay(changes=5)
+
+    result = await detector(display).wait()
+
+    assert result.settled
+    assert result.frames == display.samples
+    # five changing frames, then enough stable ones to fill the window
+    assert display.samples >= 6
+    assert result.elapsed < 1.0
+
+
+@pytest.mark.asyncio
+async def test_already_stable_screen_settles_after_the_window():
+    result = await detector(FakeDisplay(changes=1)).wait()
+
+    assert result.settled
+    assert 0.05 <= result.elapsed < 0.5
+
+
+@pytest.mark.asyncio
+async def test_gives_up_at_the_timeout():
+    display = FakeDisplay(changes=10_000)
+
+    result = await detector(display, timeout=0.2).wait()
+
+    assert not result.settled
+    assert 0.2 <= result.elapsed < 0.5
+
+
+def test_small_changes_are_tolerated():
+    settle = SettleDetector(lambda: None, max_changed_fraction=0.01)
+    frame = Image.new("RGB", (100, 100))
+    caret = frame.copy()
+    caret.putpixel((10, 10), (255, 255, 255))
+    noisy = frame.point(lambda value: value + 4)
+    window = frame.copy()
+    window.paste((255, 255, 255), (0, 0, 50, 50))
+
+    assert not settle.changed(frame, caret)
+    assert not settle.changed(frame, noisy)
+    assert settle.changed(frame, window)
+    assert settle.changed(frame, frame.resize((50, 50)))
+
+
+@pytest.mark.asyncio
+async def test_wait_for_change_returns_on_the_first_different_frame():
+    display = FakeDisplay(changes=3)
+
+    result = await detector(display).wait_for_change()
+
+    assert result.changed
+    assert result.frames == display.samples == 2
+
+
+@pytest.mark.asyncio
+async def test_wait_for_change_gives_up_at_the_timeout():
+    display = FakeDisplay(changes=1)
+
+    result = await detector(display).wait_for_change(timeout=0.1)
+
+    assert not result.changed
+    assert result.frames == display.samples > 2
+    assert result.elapsed >= 0.1
+
+
+def test_settle_stats_summarize_waits():
+    stats = SettleStats.of(
+        [
+            SettleResult(settled=True, elapsed=0.1, frames=3),
+            SettleResult(settled=False, elapsed=0.5, frames=10),
+        ]
+    )
+    assert stats == SettleStats(waits=2, timeouts=1, mean=0.3, slowest=0.5)
+    assert SettleStats.of([]) == SettleStats()
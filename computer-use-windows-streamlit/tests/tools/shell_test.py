@@ -0,0 +1,337 @@
+import asyncio
+import os
+import re
+import sys
+import time
+
+import pytest
+import pytest_asyncio
+
+from computer_use.loop import _make_api_tool_result
+from computer_use.tools import bash
+from computer_use.tools.base import ToolError
+from computer_use.tools.bash import (
+    _OutputCapture,
+    _SentinelReader,
+    _UnixShellSession,
+    _WindowsShellSession,
+)
+
+# /bin/sh stands in for cmd.exe, with $? for %errorlevel%, ; for & and >&2 for 1>&2
+STAND_IN_SUFFIX = "\necho \"<<exit>>$?\"; echo '<<exit>>' >&2"
+
+
+class StandInWindowsSession(_WindowsShellSession):
+    """Process groups and Ctrl+Break are Windows only, the stand-in kills instead."""
+
+    def interrupt(self):
+        self.kill_children()
+
+    def _spawn_options(self) -> dict:
+        return {}
+
+
+@pytest_asyncio.fixture
+async def windows_session():
+    session = StandInWindowsSession(shell=("/bin/sh",), sentinel_suffix=STAND_IN_SUFFIX)
+    await session.start()
+    yield session
+    await session.close()
+
+
+@pytest_asyncio.fixture
+async def unix_session():
+    session = _UnixShellSession()
+    await session.start()
+    yield session
+    await session.close()
+
+
+@pytest.mark.asyncio
+async def test_sentinel_split_across_reads():
+    stream = asyncio.StreamReader()
+    reader = _SentinelReader(stream, b"<<exit>>")
+    for chunk in (b"first\nsecond <<ex", b"it>>\nnext", b" command<<exit>>\n"):
+        stream.feed_data(chunk)
+
+    first, second = _OutputCapture(), _OutputCapture()
+    await reader.read_until_sentinel(first)
+    await reader.read_until_sentinel(second)
+
+    assert first.getvalue() == b"first\nsecond "
+    assert second.getvalue() == b"next command"
+
+
+@pytest.mark.asyncio
+async def test_line_break_after_sentinel_in_a_later_read():
+    stream = asyncio.StreamReader()
+    reader = _SentinelReader(stream, b"<<exit>>")
+    stream.feed_data(b"one<<exit>>\r")
+    stream.feed_data(b"\ntwo<<exit>>\r\n")
+    await reader.read_until_sentinel(_OutputCapture())
+
+    capture = _OutputCapture()
+    await reader.read_until_sentinel(capture)
+    assert capture.getvalue() == b"two"
+
+
+@pytest.mark.asyncio
+async def test_reader_returns_the_rest_of_the_sentinel_line():
+    stream = asyncio.StreamReader()
+    reader = _SentinelReader(stream, b"<<exit>>")
+    stream.feed_data(b"output<<exit>>1")
+
+    pending = asyncio.ensure_future(reader.read_until_sentinel(_OutputCapture()))
+    await asyncio.sleep(0.01)
+    assert not pending.done()
+    stream.feed_data(b"27 \r\n")
+    assert await pending == b"127"
+
+
+@pytest.mark.asyncio
+async def test_reader_waits_for_data_and_reports_eof():
+    stream = asyncio.StreamReader()
+    reader = _SentinelReader(stream, b"<<exit>>")
+
+    capture = _OutputCapture()
+    pending = asyncio.ensure_future(reader.read_until_sentinel(capture))
+    await asyncio.sleep(0.01)
+    assert not pending.done()
+    stream.feed_data(b"done<<exit>>\n")
+    await pending
+    assert capture.getvalue() == b"done"
+
+    stream.feed_eof()
+    with pytest.raises(ToolError, match="exited"):
+        await reader.read_until_sentinel(_OutputCapture())
+
+
+def test_capture_keeps_everything_within_budget():
+    capture = _OutputCapture(head_size=4, tail_size=4)
+    capture.write(b"abc")
+    capture.write(b"defgh")
+
+    assert not capture.truncated
+    assert capture.getvalue() == b"abcdefgh"
+
+
+def test_capture_spills_to_file_past_budget():
+    capture = _OutputCapture(head_size=4, tail_size=4)
+    for chunk in (b"abcdef", b"ghij", b"klmnopq", b"rs"):
+        capture.write(chunk)
+    capture.close()
+
+    assert capture.truncated
+    assert (capture.head, capture.tail, capture.size) == (b"abcd", b"pqrs", 19)
+    with open(capture.path, "rb") as f:
+        assert f.read() == b"abcdefghijklmnopqrs"
+    os.remove(capture.path)
+
+
+@pytest.mark.asyncio
+async def test_windows_session_runs_commands(windows_session):
+    result = await windows_session.run("echo hello; echo oops >&2")
+    assert (result.output, result.error) == ("hello", "oops")
+
+    result = await windows_session.run("printf 'no newline'")
+    assert (result.output, result.error) == ("no newline", "")
+
+
+@pytest.mark.asyncio
+async def test_windows_session_returns_without_polling_delay(windows_session):
+    await windows_session.run("true")
+
+    start = time.perf_counter()
+    for _ in range(10):
+        await windows_session.run("echo quick")
+
+    # the old session slept 100ms per poll, so ten commands took over a second
+    assert time.perf_counter() - start < 0.5
+
+
+@pytest.mark.asyncio
+async def test_windows_session_reads_long_output_in_chunks(windows_session):
+    start = time.perf_counter()
+    result = await windows_session.run("seq 1 2000")
+
+    assert result.output.splitlines() == [str(n) for n in range(1, 2001)]
+    assert time.perf_counter() - start < 2
+
+
+@pytest.mark.asyncio
+async def test_windows_session_interrupts_on_timeout(windows_session):
+    windows_session._timeout = 0.1
+
+    result = await windows_session.run("echo before; sleep 5")
+    assert result.output == "before"
+    assert result.stats.interrupted_after == 0.1
+    assert result.stats.wall_time < 2
+
+    result = await windows_session.run("echo again")
+    assert result.output == "again"
+
+
+@pytest.mark.asyncio
+async def test_windows_session_reports_an_exited_shell(windows_session):
+    with pytest.raises(ToolError, match="exited"):
+        await windows_session.run("exit 3")
+
+    result = await windows_session.run("echo again")
+    assert result.error == "shell has exited with returncode 3"
+
+
+@pytest.mark.asyncio
+async def test_unix_session_runs_commands(unix_session):
+    result = await unix_session.run("echo hello; echo oops >&2")
+    assert (result.output, result.error) == ("hello", "oops")
+
+    # only the stderr of the command that wrote it
+    result = await unix_session.run("cd /; pwd")
+    assert (result.output, result.error) == ("/", "")
+
+
+@pytest.mark.asyncio
+async def test_unix_session_returns_without_polling_delay(unix_session):
+    await unix_session.run("true")
+
+    start = time.perf_counter()
+    for _ in range(10):
+        await unix_session.run("echo quick")
+
+    # the old session slept 200ms before looking at the output
+    assert time.perf_counter() - start < 0.5
+
+
+@pytest.mark.asyncio
+async def test_unix_session_reads_output_larger_than_the_stream_limit(unix_session):
+    # the old session never read the pipe, so output past the StreamReader's
+    # buffer limit stalled until the timeout
+    result = await unix_session.run("head -c 1000000 /dev/zero | tr '\\0' x")
+
+    assert "; 1,000,000 bytes of output" in result.system
+    os.remove(re.search(r"the full output is in (\S+)", result.system).group(1))
+
+
+@pytest.mark.asyncio
+async def test_session_reports_sizes_and_time(unix_session):
+    result = await unix_session.run("echo hello; echo oops >&2")
+
+    assert re.fullmatch(
+        r"exit code 0, \d+\.\d\ds, \d+\.\d\ds CPU(, peak RSS [\d.]+ MiB)?; "
+        r"6 bytes of output and 5 bytes of errors",
+        result.system,
+    )
+    assert result.stats.exit_code == 0
+
+
+@pytest.mark.asyncio
+async def test_session_spills_long_output(unix_session):
+    result = await unix_session.run("seq 1 100000")
+
+    path = re.search(r"the full output is in (\S+)", result.system).group(1)
+    try:
+        with open(path) as f:
+            assert f.read().splitlines() == [str(n) for n in range(1, 100001)]
+    finally:
+        os.remove(path)
+    assert result.output.startswith("1\n2\n3\n")
+    assert result.output.endswith("99999\n100000")
+    assert f"bytes omitted, the full stream is in {path}>" in result.output
+    assert len(result.output) < 20_000
+
+
+@pytest.mark.asyncio
+async def test_session_removes_its_spilled_output_when_closed():
+    session = _UnixShellSession()
+    await session.start()
+    result = await session.run("seq 1 100000")
+    path = re.search(r"the full output is in (\S+)", result.system).group(1)
+    assert os.path.exists(path)
+
+    await session.close()
+    assert not os.path.exists(os.path.dirname(path))
+
+
+@pytest.mark.asyncio
+async def test_session_reports_exit_codes(unix_session, windows_session):
+    for session in (unix_session, windows_session):
+        result = await session.run("false")
+        assert result.stats.exit_code == 1
+        assert result.system.startswith("exit code 1, ")
+
+        result = await session.run("sh -c 'exit 42'")
+        assert result.stats.exit_code == 42
+
+        result = await session.run("true")
+        assert result.stats.exit_code == 0
+
+
+@pytest.mark.asyncio
+async def test_silent_failure_reaches_the_model(unix_session):
+    result = await unix_session.run("mkdir /proc/x 2>/dev/null")
+    assert not result.output and not result.error
+
+    tool_result = _make_api_tool_result(result, "1")
+
+    assert tool_result["is_error"]
+    [block] = tool_result["content"]
+    assert block["text"].startswith("<system>exit code 1, ")
+
+    ok = _make_api_tool_result(await unix_session.run("true"), "2")
+    assert not ok["is_error"]
+    assert ok["content"][0]["text"].startswith("<system>exit code 0, ")
+
+
+@pytest.mark.asyncio
+async def test_session_measures_the_processes_a_command_starts(unix_session):
+    script = (
+        "import time; data = bytearray(64 * 2**20); end = time.process_time() + 0.3\n"
+        "while time.process_time() < end: pass"
+    )
+    result = await unix_session.run(f"{sys.executable} -c '{script}'")
+
+    assert result.stats.exit_code == 0
+    assert result.stats.cpu_time >= 0.3
+    assert result.stats.wall_time >= result.stats.cpu_time * 0.9
+    assert result.stats.peak_rss > 64 * 2**20
+
+
+@pytest.mark.asyncio
+async def test_unix_session_interrupts_only_the_foreground_command(unix_session):
+    await unix_session.run("cd /tmp; export GREETING=hello; sleep 30 &")
+    background = (await unix_session.run("echo $!")).output
+
+    start = time.perf_counter()
+    result = await unix_session.run("echo started; sleep 30", timeout=0.2)
+
+    assert time.perf_counter() - start < 1
+    assert result.output == "started"
+    assert result.stats.exit_code == 130
+    assert result.system.startswith("interrupted after 0.2s, exit code 130, ")
+
+    # the same shell, with its directory, variables and background jobs
+    result = await unix_session.run("pwd; echo $GREETING")
+    assert result.output == "/tmp\nhello"
+    assert (await unix_session.run(f"kill -0 {background}")).stats.exit_code == 0
+    await unix_session.run(f"kill {background}")
+
+
+@pytest.mark.asyncio
+async def test_unix_session_kills_what_ignores_the_interrupt(unix_session, monkeypatch):
+    monkeypatch.setattr(bash, "INTERRUPT_GRACE_PERIOD", 0.2)
+
+    result = await unix_session.run("sh -c 'trap \"\" INT; sleep 30'", timeout=0.1)
+
+    assert result.stats.exit_code == 137
+    assert (await unix_session.run("echo still here")).output == "still here"
+
+
+@pytest.mark.asyncio
+async def test_unix_session_gives_up_on_a_stuck_shell(unix_session, monkeypatch):
+    monkeypatch.setattr(bash, "INTERRUPT_GRACE_PERIOD", 0.1)
+
+    # a loop of builtins runs in the shell itself, which survives the interrupt
+    with pytest.raises(ToolError, match="timed out"):
+        await unix_session.run("while :; do :; done", timeout=0.1)
+    with pytest.raises(ToolError, match="must be restarted"):
+        await unix_session.run("echo again")
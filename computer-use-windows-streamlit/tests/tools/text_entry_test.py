@@ -0,0 +1,111 @@
+from unittest import mock
+
+import pytest
+
+from computer_use.tools.capture import SyntheticBackend
+from computer_use.tools.computer import ComputerTool
+from computer_use.tools.text_entry import (
+    PASTE_CHORD,
+    KeystrokeTyping,
+    PasteTyping,
+    TypingStats,
+)
+
+
+class FakeClipboard:
+    def __init__(self, text=""):
+        self.text = text
+        self.history = []
+
+    def paste(self):
+        return self.text
+
+    def copy(self, text):
+        self.text = text
+        self.history.append(text)
+
+
+class BrokenClipboard:
+    def paste(self):
+        raise RuntimeError("clipboard is locked by another application")
+
+
+@pytest.fixture
+def keyboard():
+    return mock.Mock()
+
+
+@pytest.fixture
+def computer_tool(keyboard):
+    with mock.patch("computer_use.tools.computer.pyautogui", keyboard):
+        tool = ComputerTool(capture_backend=SyntheticBackend((1024, 768)))
+        tool.paste_typing.restore_delay = 0
+        yield tool
+
+
+@pytest.mark.asyncio
+async def test_paste_restores_the_previous_clipboard(keyboard):
+    clipboard = FakeClipboard("copied earlier")
+    engine = PasteTyping(keyboard, clipboard, restore_delay=0)
+
+    await engine.type("x" * 2000)
+
+    keyboard.hotkey.assert_called_once_with(*PASTE_CHORD)
+    assert clipboard.history == ["x" * 2000, "copied earlier"]
+    assert engine.stats.characters == 2000
+
+
+@pytest.mark.asyncio
+async def test_keystrokes_type_in_groups(keyboard):
+    engine = KeystrokeTyping(keyboard, group_size=50, delay_ms=12)
+
+    await engine.type("y" * 120)
+
+    assert [call.args[0] for call in keyboard.write.call_args_list] == [
+        "y" * 50,
+        "y" * 50,
+        "y" * 20,
+    ]
+    assert keyboard.write.call_args.kwargs == {"interval": 0.012}
+    assert engine.stats.characters == 120
+
+
+def test_stats_report_characters_per_second():
+    assert TypingStats(characters=2000, seconds=0.5).chars_per_second == 4000
+    assert TypingStats().chars_per_second == 0
+
+
+@pytest.mark.asyncio
+async def test_long_text_is_pasted_and_short_text_typed(computer_tool, keyboard):
+    computer_tool.paste_typing.clipboard = FakeClipboard()
+    computer_tool.screenshot = mock.AsyncMock()
+
+    await computer_tool(action="type", text="a" * 500)
+    await computer_tool(action="type", text="short")
+
+    assert computer_tool.paste_typing.stats.characters == 500
+    assert computer_tool.keystroke_typing.stats.characters == 5
+    keyboard.write.assert_called_once_with("short", interval=0.012)
+
+
+@pytest.mark.asyncio
+async def test_paste_can_be_turned_off_per_call(computer_tool, keyboard):
+    computer_tool.paste_typing.clipboard = FakeClipboard()
+    computer_tool.screenshot = mock.AsyncMock()
+
+    await computer_tool(action="type", text="a" * 500, paste=False)
+    await computer_tool(action="type", text="abc", paste=True)
+
+    assert computer_tool.keystroke_typing.stats.characters == 500
+    assert computer_tool.paste_typing.stats.characters == 3
+
+
+@pytest.mark.asyncio
+async def test_unavailable_clipboard_falls_back_to_keystrokes(computer_tool, keyboard):
+    computer_tool.paste_typing.clipboard = BrokenClipboard()
+    computer_tool.screenshot = mock.AsyncMock()
+
+    await computer_tool(action="type", text="a" * 500)
+
+    keyboard.hotkey.assert_not_called()
+    assert computer_tool.keystroke_typing.stats.characters == 500
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from computer_use.tools.base import ToolError
+
+
+@pytest.fixture
+def tool(tool):
+    tool._wait_interval = 0.01
+    tool._wait_stable_window = 0.1
+    return tool
+
+
+async def paint_later(desktop, box, delay):
+    await asyncio.sleep(delay)
+    desktop.paint(box, (255, 255, 255))
+
+
+@pytest.mark.asyncio
+async def test_wait_for_change_returns_once_the_screen_changes(tool, desktop):
+    painting = asyncio.create_task(paint_later(desktop, (0, 0, 400, 300), 0.1))
+
+    result = await tool(action="wait_for_change", timeout=5)
+    await painting
+
+    assert result.output.startswith("The screen changed after 0.")
+    assert "frames sampled" in result.output
+    assert result.base64_image
+
+
+@pytest.mark.asyncio
+async def test_wait_for_change_only_watches_the_region(tool, desktop):
+    # the progress bar is at the bottom, a change elsewhere does not count
+    painting = asyncio.create_task(paint_later(desktop, (0, 0, 400, 300), 0.05))
+
+    result = await tool(action="wait_for_change", region=[0, 700, 400, 760], timeout=0.3)
+    await painting
+
+    assert result.output.startswith("Region (0, 700, 400, 760) did not change after 0.3")
+    assert result.base64_image
+
+
+@pytest.mark.asyncio
+async def test_wait_until_stable_waits_out_changes(tool, desktop):
+    async def animate():
+        for step in range(5):
+            desktop.paint((0, 0, 100, 100), (step * 50, 0, 0))
+            await asyncio.sleep(0.03)
+
+    animation = asyncio.create_task(animate())
+    result = await tool(action="wait_until_stable", timeout=5)
+    await animation
+
+    assert result.output.startswith("The screen is stable after")
+    frames = int(result.output.split("(")[1].split()[0])
+    assert frames > 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("timeout", [0, -1, 61, "soon", True])
+async def test_wait_timeout_is_bounded(tool, timeout):
+    with pytest.raises(ToolError):
+        await tool(action="wait_for_change", timeout=timeout)
@@ -0,0 +1,46 @@
+import pytest
+
+from computer_use.tools.base import ToolError
+from computer_use.tools.computer import ComputerTool, ScalingSource
+
+
+@pytest.mark.asyncio
+async def test_zoom_shows_a_region_at_native_resolution(tool, desktop, decode):
+    # a 4x4 pixel icon that a 1366x768 screenshot would blur away
+    desktop.paint((960, 540, 963, 543), (255, 0, 0))
+
+    result = await tool(action="zoom", region=[683, 384, 783, 434])
+
+    image = decode(result)
+    assert image.size == (141, 70)
+    assert image.getpixel((0, 0)) == (255, 0, 0)
+    assert image.getpixel((4, 4)) != (255, 0, 0)
+    assert result.output.startswith("Region (683, 384, 783, 434) at 1.41x")
+
+
+@pytest.mark.asyncio
+async def test_zoom_of_a_large_region_is_scaled_to_fit(tool, decode):
+    result = await tool(action="zoom", region=[0, 0, 1366, 768])
+
+    assert decode(result).size == (1366, 768)
+    assert "at 1.00x" in result.output
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "region", [None, [0, 0, 10], [10, 0, 5, 5], [0, 0, 1367, 10], [0, -1, 5, 5]]
+)
+async def test_zoom_rejects_invalid_regions(tool, region):
+    with pytest.raises(ToolError):
+        await tool(action="zoom", region=region)
+
+
+def test_screenshot_scale_lowers_the_resolution_the_api_sees(desktop):
+    tool = ComputerTool(capture_backend=desktop, screenshot_scale=0.75)
+
+    assert tool.to_params()["display_width_px"] == 1024
+    assert tool.to_params()["display_height_px"] == 576
+    assert tool.scale_coordinates(ScalingSource.API, 512, 288) == (960, 540)
+
+    with pytest.raises(ToolError):
+        ComputerTool(capture_backend=desktop, screenshot_scale=1.5)